@@ -0,0 +1,281 @@
+"""
+Benchmarks of every metric and of a full /calcul request on synthetic health data.
+
+    python -m benchmarks.run                  # compare with benchmarks/baseline.json
+    python -m benchmarks.run --update         # record a new baseline
+    python -m benchmarks.run --only data_similarity --sizes 20000,200000
+
+Each case is timed (best of --repeat runs) and its peak traced memory measured at
+two dataset sizes. The scaling exponent log(t2 / t1) / log(n2 / n1) is compared with
+the baseline's: 1.0 is linear, and an exponent that grows means some code path went
+superlinear. Times and memory are also compared with the baseline (times only mean
+something on the machine that recorded it). Any regression exits with status 1.
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_health_dataset
+from src.utils.adversary_success import AdversarySuccessMetrics
+from src.utils.algorithmic_attribute_classification import AttributeClassification, QID_SEARCH_K
+from src.utils.data_similarity import DataSimilarity
+from src.utils.equivalence_classes import EquivalenceClassIndex
+from src.utils.info_gain_loss import InformationGainLoss
+from src.utils.pipeline import evaluate_dataframe
+from src.utils.uncentainty import Uncertainty
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+BASELINE_FORMAT = 1
+SIZES = (10_000, 100_000)
+DATASET = {"columns": 12, "cardinality": 20, "skew": 1.0, "qids": 4, "sas": 2, "seed": 0}
+
+# allowed regressions against the baseline
+EXPONENT_TOLERANCE = 0.3
+TIME_TOLERANCE = 3.0
+MEMORY_TOLERANCE = 1.5
+# cases faster than this at the larger size are too noisy for the scaling check
+MIN_SECONDS = 0.02
+
+
+class Dataset:
+    """A synthetic dataset with its attribute classification, shared by the cases."""
+    def __init__(self, rows, population_rows=None):
+        self.rows = rows
+        self.df = synthetic_health_dataset(rows, **DATASET)
+        classifier = AttributeClassification(self.df, "synthetic.csv")
+        classifier.classify_attributes()
+        self.qids, self.sas = classifier.qids, classifier.sas
+        # the published records plus as many others, for delta presence against a population
+        others = synthetic_health_dataset(population_rows or rows, **dict(DATASET, seed=DATASET["seed"] + 1))
+        self.population = pd.concat([self.df, others], ignore_index=True)
+        self.csv = self.df.to_csv(index=False).encode()
+
+    def index(self):
+        return EquivalenceClassIndex(self.df, self.qids, self.sas)
+
+
+def _similarity(method):
+    def setup(data):
+        similarity = DataSimilarity(data.df, data.qids, data.sas[0], index=data.index())
+        return getattr(similarity, method)
+    return setup
+
+
+def _information_gain(method):
+    def setup(data):
+        info_gain = InformationGainLoss(data.df, data.qids, data.sas, index=data.index())
+        return getattr(info_gain, method)
+    return setup
+
+
+def _uncertainty(method):
+    def setup(data):
+        uncertainty = Uncertainty(data.df, data.sas, index=data.index())
+        if method == "uncertainty_calculate_all":
+            return uncertainty.uncertainty_calculate_all
+        return lambda: getattr(uncertainty, method)(data.df[data.sas[0]])
+    return setup
+
+
+def _adversary(method):
+    def setup(data):
+        adversary = AdversarySuccessMetrics(data.df, data.qids, index=data.index())
+        if method == "delta_presence":
+            return lambda: adversary.delta_presence(data.df)
+        if method == "delta_presence_population":
+            return lambda: adversary.delta_presence_population(data.population)
+        return getattr(adversary, method)
+    return setup
+
+
+def _qid_search(data):
+    classifier = AttributeClassification(data.df, "synthetic.csv")
+    classifier.classify_attributes()
+    return lambda: classifier.identify_optimal_qid_dimension(k=QID_SEARCH_K)
+
+
+def _calcul(data):
+    from fastapi.testclient import TestClient
+    from src.main import RESULT_CACHE, app
+
+    # every run evaluates from scratch
+    RESULT_CACHE.clear()
+    client = TestClient(app)
+
+    def run():
+        response = client.post("/calcul", files={"file": ("synthetic.csv", data.csv, "text/csv")})
+        response.raise_for_status()
+        if "error" in response.json():
+            raise RuntimeError(response.json()["error"])
+    return run
+
+
+# name -> setup(Dataset) returning the callable that is measured; setup itself is not
+CASES = {
+    "attribute_classification": lambda data: AttributeClassification(data.df, "synthetic.csv").classify_attributes,
+    "identify_optimal_qid_dimension": _qid_search,
+    "equivalence_classes": lambda data: data.index,
+    "data_similarity.k_anonymity": _similarity("k_anonymity"),
+    "data_similarity.alpha_k_anonymity": _similarity("alpha_k_anonymity"),
+    "data_similarity.l_diversity": _similarity("l_diversity"),
+    "data_similarity.t_closeness": _similarity("t_closeness"),
+    "information_gain.calculate_mutual_information": _information_gain("calculate_mutual_information"),
+    "information_gain.mutual_information_matrix": _information_gain("mutual_information_matrix"),
+    "information_gain.joint_mutual_information": _information_gain("joint_mutual_information"),
+    "information_gain.calculate_privacy_score": _information_gain("calculate_privacy_score"),
+    "uncertainty.entropy": _uncertainty("entropy"),
+    "uncertainty.min_entropy": _uncertainty("min_entropy"),
+    "uncertainty.normalized_entropy": _uncertainty("normalized_entropy"),
+    "uncertainty.uncertainty_calculate_all": _uncertainty("uncertainty_calculate_all"),
+    "adversary_success.adversary_success_rate": _adversary("adversary_success_rate"),
+    "adversary_success.delta_presence": _adversary("delta_presence"),
+    "adversary_success.delta_presence_population": _adversary("delta_presence_population"),
+    "pipeline.evaluate_dataframe": lambda data: lambda: evaluate_dataframe(data.df, "synthetic.csv"),
+    "api.calcul": _calcul,
+}
+
+
+def measure(setup, data, repeat):
+    """(best wall time in seconds, peak traced memory in MiB) of the callable `setup` returns."""
+    # the metrics print their progress; it is dropped here
+    with contextlib.redirect_stdout(io.StringIO()):
+        return _measure(setup, data, repeat)
+
+
+def _measure(setup, data, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        run = setup(data)
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    # measured apart, tracing slows the run down
+    run = setup(data)
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak / 2 ** 20
+
+
+def scaling_exponent(sizes, seconds):
+    small, large = sizes
+    if seconds[0] <= 0 or seconds[1] <= 0:
+        return None
+    return math.log(seconds[1] / seconds[0]) / math.log(large / small)
+
+
+def run_cases(names, sizes, repeat):
+    results = {}
+    datasets = {}
+    for rows in sizes:
+        print(f"Generating {rows} rows...", file=sys.stderr)
+        datasets[rows] = Dataset(rows)
+    for name in names:
+        seconds, memory = [], []
+        for rows in sizes:
+            elapsed, peak = measure(CASES[name], datasets[rows], repeat)
+            seconds.append(elapsed)
+            memory.append(peak)
+        exponent = scaling_exponent(sizes, seconds)
+        results[name] = {
+            "seconds": [round(s, 6) for s in seconds],
+            "peak_mib": [round(m, 3) for m in memory],
+            "scaling": None if exponent is None else round(exponent, 3),
+        }
+        print(f"{name:50s} {seconds[0]:9.4f}s {seconds[1]:9.4f}s  n^{results[name]['scaling']}  "
+              f"{memory[1]:8.1f} MiB")
+    return results
+
+
+def regressions(results, baseline, time_tolerance=TIME_TOLERANCE):
+    """Messages of every result worse than its baseline beyond the tolerances."""
+    problems = []
+    for name, result in results.items():
+        base = baseline["cases"].get(name)
+        if base is None:
+            print(f"{name}: no baseline", file=sys.stderr)
+            continue
+        if (result["scaling"] is not None and base["scaling"] is not None and result["seconds"][1] >= MIN_SECONDS
+                and result["scaling"] > base["scaling"] + EXPONENT_TOLERANCE):
+            problems.append(f"{name}: scales as n^{result['scaling']} (baseline n^{base['scaling']})")
+        if time_tolerance and result["seconds"][1] > max(base["seconds"][1], MIN_SECONDS) * time_tolerance:
+            problems.append(f"{name}: {result['seconds'][1]:.4f}s at {baseline['sizes'][1]} rows "
+                            f"(baseline {base['seconds'][1]:.4f}s)")
+        if result["peak_mib"][1] > base["peak_mib"][1] * MEMORY_TOLERANCE + 1:
+            problems.append(f"{name}: peak {result['peak_mib'][1]:.1f} MiB at {baseline['sizes'][1]} rows "
+                            f"(baseline {base['peak_mib'][1]:.1f} MiB)")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the privacy metrics on synthetic data.")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--only", help="run the cases whose name contains this text")
+    parser.add_argument("--sizes", help="two row counts, e.g. 10000,100000 (default: the baseline's)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--time-tolerance", type=float, default=TIME_TOLERANCE,
+                        help="allowed slowdown factor against the baseline; 0 skips the time check")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("format") != BASELINE_FORMAT or baseline.get("dataset") != DATASET:
+            print("Baseline was recorded with another format or dataset; not comparing.", file=sys.stderr)
+            baseline = None
+
+    if args.sizes:
+        sizes = tuple(int(rows) for rows in args.sizes.split(","))
+    else:
+        sizes = tuple(baseline["sizes"]) if baseline else SIZES
+    if len(sizes) != 2 or sizes[0] >= sizes[1]:
+        parser.error("--sizes takes two increasing row counts")
+    if baseline and list(sizes) != baseline["sizes"]:
+        print("Sizes differ from the baseline's; not comparing.", file=sys.stderr)
+        baseline = None
+
+    names = [name for name in CASES if not args.only or args.only in name]
+    results = run_cases(names, sizes, args.repeat)
+
+    if args.update:
+        cases = dict(baseline["cases"]) if baseline else {}
+        cases.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "format": BASELINE_FORMAT,
+                "dataset": DATASET,
+                "sizes": list(sizes),
+                "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                            "processor": platform.processor() or platform.machine(), "cpus": os.cpu_count()},
+                "cases": cases,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+        return 0
+
+    if baseline is None:
+        return 0
+    problems = regressions(results, baseline, args.time_tolerance)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    if not problems:
+        print(f"{len(results)} cases within the baseline.")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
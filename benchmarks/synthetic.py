@@ -0,0 +1,75 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+from src.utils.algorithmic_attribute_classification import QID_SEARCH_K
+
+# distinct values per row of the generated QID and SA columns, inside the classification's
+# QID (0.3-0.8) and SA (0.8-1.0) g-distinct risk bands
+QID_DISTINCT = 0.32
+SA_DISTINCT = 0.9
+
+QID_COLUMNS = ("Age", "Zip Code", "Admission Date", "Doctor", "Hospital")
+SA_COLUMNS = ("Medical Condition", "Billing Amount")
+OTHER_COLUMNS = ("Gender", "Blood Type", "Insurance Provider", "Admission Type", "Test Results", "Medication")
+
+
+def draw_codes(rng, rows, distinct, skew, min_count=0):
+    """
+    `rows` codes over `distinct` values: every value `min_count` times, the other rows
+    drawn from a Zipf-like distribution of exponent `skew` (0 is uniform), shuffled.
+    """
+    distinct = max(1, min(distinct, rows))
+    min_count = min(min_count, rows // distinct)
+    p = 1 / np.arange(1, distinct + 1) ** skew
+    base = np.repeat(np.arange(distinct), min_count)
+    codes = np.concatenate([base, rng.choice(distinct, size=rows - len(base), p=p / p.sum())])
+    rng.shuffle(codes)
+    return codes
+
+
+def _labels(name, codes):
+    """Values of a generated column, shaped after its name."""
+    if name == "Age":
+        return 18 + codes
+    if name == "Zip Code":
+        return pd.Series(codes + 10000).map("{:05d}".format).to_numpy()
+    if name == "Admission Date":
+        return (pd.Timestamp("2000-01-01") + pd.to_timedelta(codes, unit="D")).strftime("%Y-%m-%d").to_numpy()
+    if name == "Billing Amount":
+        return np.round(100 + codes * 1.37, 2)
+    return pd.Series(codes).map(f"{name} {{}}".format).to_numpy()
+
+
+def synthetic_health_dataset(rows=10_000, columns=12, cardinality=20, skew=1.0, qids=4, sas=2, seed=0):
+    """
+    Synthetic health records with `columns` columns: `qids` quasi-identifiers
+    (QID_DISTINCT distinct values per row, each value at least QID_SEARCH_K times so
+    single QIDs are k-anonymous), `sas` sensitive attributes (SA_DISTINCT distinct values
+    per row) and low-cardinality attributes of `cardinality` values. Values are drawn with
+    a Zipf-like `skew`; the same arguments always give the same data.
+    """
+    if qids + sas > columns:
+        raise ValueError(f"{qids} QIDs and {sas} SAs do not fit in {columns} columns.")
+    rng = np.random.default_rng(seed)
+
+    def names(template, count, generic):
+        return list(template[:count]) + [f"{generic} {i}" for i in range(len(template), count)]
+
+    data = {}
+    for name in names(QID_COLUMNS, qids, "QID"):
+        data[name] = _labels(name, draw_codes(rng, rows, int(rows * QID_DISTINCT), skew, min_count=QID_SEARCH_K))
+    for name in names(SA_COLUMNS, sas, "Sensitive"):
+        data[name] = _labels(name, draw_codes(rng, rows, int(rows * SA_DISTINCT), skew, min_count=1))
+    for name in names(OTHER_COLUMNS, columns - qids - sas, "Attribute"):
+        data[name] = _labels(name, draw_codes(rng, rows, cardinality, skew))
+    return pd.DataFrame(data)
+
+
+if __name__ == "__main__":
+    # python -m benchmarks.synthetic out.csv [rows]  (e.g. data/test/healthcare_dataset.csv for the __main__ blocks)
+    out_path = sys.argv[1]
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    synthetic_health_dataset(rows).to_csv(out_path, index=False)
+    print(f"Wrote {rows} rows to {out_path}")
@@ -1,13 +1,45 @@
-from fastapi import FastAPI, File, UploadFile
-import pandas as pd
-from src.utils.algorithmic_attribute_classification import AttributeClassification
-from src.utils.adversary_success import AdversarySuccessMetrics
-from src.utils.data_similarity import DataSimilarity
-from src.utils.info_gain_loss import InformationGainLoss
-from src.utils.uncentainty import Uncertainty
-import tempfile
-
-app = FastAPI()
+import asyncio
+import hashlib
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from src.utils.ingest import read_csv_uploads
+from src.utils.instrumentation import (
+    DURATION_BUCKETS, MetricsRegistry, SamplingProfiler, StageTrace, enable_memory_tracing, max_rss_bytes,
+)
+from src.utils.llm_attribute_classification import (
+    ColumnClassCache, GeminiBackend, LLMAttributeClassifier, StubBackend,
+)
+from src.utils.jobs import JobManager, QueueFullError
+from src.utils.generalization import parse_hierarchies
+from src.utils.pipeline import (
+    encode_dataframe, evaluate_dataframe, evaluate_generalizations, evaluation_options, record_risk_export,
+)
+from src.utils.record_risk import EXPORT_FORMATS
+from src.utils.risk_chart import CHART_DIR, ChartCache
+from src.utils.algorithmic_attribute_classification import QID_RISK_BAND, SA_RISK_BAND
+from src.utils.result_cache import ResultCache
+from src.utils.sessions import DRIFT_THRESHOLD, SessionStore
+
+# Evaluation jobs run in worker processes: JOB_WORKERS at a time, JOB_QUEUE_DEPTH more waiting
+JOBS = JobManager(
+    max_workers=int(os.getenv("JOB_WORKERS", "0")) or None,
+    max_queued=int(os.getenv("JOB_QUEUE_DEPTH", "16")),
+)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # the worker pool and its manager spawn processes; not on the first job's request
+    await run_in_threadpool(JOBS.start)
+    yield
+    JOBS.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 from fastapi.middleware.cors import CORSMiddleware
 app.add_middleware(
     CORSMiddleware,
@@ -17,49 +49,359 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.post("/calcul")
-async def calculate_privacy_metrics(file: UploadFile = File(...)):
-    try:
-        # Save uploaded file to a temp location
-        temp = tempfile.NamedTemporaryFile(delete=False, suffix=".csv")
-        contents = await file.read()
-        temp.write(contents)
-        temp.close()
+# Results of repeated uploads are served from here; RESULT_CACHE_DIR keeps them across restarts
+RESULT_CACHE = ResultCache(
+    max_entries=int(os.getenv("RESULT_CACHE_SIZE", "128")),
+    ttl_seconds=float(os.getenv("RESULT_CACHE_TTL")) if os.getenv("RESULT_CACHE_TTL") else None,
+    directory=os.getenv("RESULT_CACHE_DIR") or None,
+)
+
+UPLOAD_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {
+                "file": {"type": "string", "format": "binary"},
+                # optional population dataset for delta presence
+                "population": {"type": "string", "format": "binary"},
+            },
+            "required": ["file"],
+        }}},
+    }
+}
+
+
+# Risk charts are rendered only when requested, from cached results; CHART_CACHE_SIZE bounds the files kept
+CHARTS = ChartCache(
+    directory=os.getenv("CHART_CACHE_DIR") or os.path.join(CHART_DIR, "cache"),
+    max_files=int(os.getenv("CHART_CACHE_SIZE", "64")),
+)
+
+# LLM column classification: cached per column name (LLM_CACHE_PATH keeps the cache), batched across
+# requests, at most LLM_MAX_CONCURRENCY prompts in flight; LLM_BACKEND=stub answers locally
+LLM_CLASSIFIER = LLMAttributeClassifier(
+    backend=StubBackend() if os.getenv("LLM_BACKEND") == "stub" else GeminiBackend(),
+    cache=ColumnClassCache(max_entries=int(os.getenv("LLM_CACHE_SIZE", "10000")),
+                           path=os.getenv("LLM_CACHE_PATH") or None),
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+    timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+)
+
+# Append-only dataset sessions; SESSION_DIR keeps their count state across restarts, SESSION_CACHE_SIZE
+# bounds the sessions held in memory and SESSION_TTL expires sessions without appends
+SESSIONS = SessionStore(
+    directory=os.getenv("SESSION_DIR") or None,
+    max_sessions=int(os.getenv("SESSION_CACHE_SIZE", "64")),
+    ttl_seconds=float(os.getenv("SESSION_TTL")) if os.getenv("SESSION_TTL") else None,
+)
+
+
+# Stage timings and request durations, exported on /metrics; INSTRUMENT_MEMORY=1 also traces the peak
+# memory of every stage (evaluations then run about twice as slow)
+METRICS = MetricsRegistry()
+if os.getenv("INSTRUMENT_MEMORY", "").lower() in ("1", "true", "yes"):
+    enable_memory_tracing()
+# Sampling period of /calcul?profile=true
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
 
-        df = pd.read_csv(temp.name)
+
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    METRICS.observe(
+        "request_duration_seconds", "Time to the response headers of each endpoint.", time.perf_counter() - start,
+        DURATION_BUCKETS, method=request.method, path=getattr(route, "path", "unmatched"),
+        status=str(response.status_code),
+    )
+    return response
+
+
+# Server-side population datasets for delta presence, chosen with ?population_ref=<file name>
+POPULATION_DIR = os.getenv("POPULATION_DIR")
+
+
+class UploadedRequest:
+    """An evaluation request read from the upload: data, options and result cache key."""
+    def __init__(self, df, filename, approximate, population, population_option, digest):
+        self.df = df
+        self.filename = filename
+        self.approximate = approximate
+        self.population = population
+        self.digest = digest
+        self.key = RESULT_CACHE.key(digest, evaluation_options(approximate, population_option))
+
+    def evaluate(self, trace=None, profile=False):
+        """(result, profile report or None); stages are recorded in `trace` and the last one closed here."""
+        profiler = SamplingProfiler(interval=PROFILE_INTERVAL).start() if profile else None
+        try:
+            result = evaluate_dataframe(
+                self.df, self.filename, approximate=self.approximate,
+                artifacts=RESULT_CACHE.artifacts(self.digest), population=self.population, progress=trace,
+            )
+        finally:
+            if trace is not None:
+                trace.stop()
+            if profiler is not None:
+                profiler.stop()
+        return result, profiler.report() if profiler is not None else None
+
+
+def _population_reference(name):
+    """Path and cache identity of a server-side population file."""
+    if not POPULATION_DIR:
+        raise ValueError("No POPULATION_DIR is configured for population references.")
+    path = os.path.join(POPULATION_DIR, os.path.basename(name))
+    if not os.path.isfile(path):
+        raise ValueError(f"Unknown population reference: {name}")
+    stat = os.stat(path)
+    return path, {"reference": os.path.basename(name), "size": stat.st_size, "modified": stat.st_mtime}
+
+
+async def _read_request(request, approximate, population_ref, cpu_seconds=None):
+    digests = {"file": hashlib.sha256(), "population": hashlib.sha256()}
+    # Parsed chunk by chunk while the upload streams in; nothing is written to disk
+    uploads = await read_csv_uploads(request, ("file", "population"), digests=digests, cpu_seconds=cpu_seconds)
+    df, filename = uploads["file"]
+    population, population_option = None, None
+    if "population" in uploads:
+        population = uploads["population"][0]
+        population_option = {"upload": digests["population"].hexdigest()}
+    elif population_ref:
+        population, population_option = _population_reference(population_ref)
+    return UploadedRequest(df, filename, approximate, population, population_option, digests["file"].hexdigest())
+
+
+@app.post("/calcul", openapi_extra=UPLOAD_SCHEMA)
+async def calculate_privacy_metrics(request: Request, approximate: bool = False, population_ref: str | None = None,
+                                    timing: bool = False, profile: bool = False):
+    """
+    `timing=true` adds the wall time, CPU time and memory of every stage under "timing";
+    `profile=true` also samples the evaluation's stacks (nothing to sample for cached results).
+    """
+    trace = StageTrace(METRICS)
+    try:
+        # parsing runs in worker threads while this one serves other requests: only their CPU time counts
+        with trace.stage("parse", thread_cpu=False):
+            parse_cpu = {}
+            upload = await _read_request(request, approximate, population_ref, parse_cpu)
+            trace.add_cpu(sum(parse_cpu.values()))
+            trace.note(rows=len(upload.df))
     except Exception as e:
         return {"error": f"Failed to read uploaded file: {e}"}
 
-    attributes = AttributeClassification(df, file.filename).run_on_csv()
-    QIDs = attributes.get("QIDs", [])
-    SAs = attributes.get("SAs", [])
+    # ?approximate=true scores columns from fixed-memory sketches, with error bounds
+    result, report = RESULT_CACHE.get(upload.key), None
+    cached = result is not None
+    if result is None:
+        # off the event loop, so other requests are served meanwhile
+        result, report = await run_in_threadpool(upload.evaluate, trace, profile)
+        RESULT_CACHE.put(upload.key, result)
+    METRICS.inc("evaluations_total", "Evaluation requests, by whether the result was cached.",
+                cached=str(cached).lower())
+    result["chart"] = f"/charts/{upload.key}.png"
+    if timing or profile:
+        result["timing"] = dict(trace.summary(), cached=cached)
+        if profile:
+            result["timing"]["profile"] = report
+    return result
 
-    result = {"attribute_classification": attributes}
 
-    if not QIDs or not SAs:
-        result["error"] = "Insufficient QIDs or SAs for full metric computation."
-        return result
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Stage and request metrics in the Prometheus text format."""
+    return PlainTextResponse(METRICS.render([
+        ("result_cache_hits_total", "counter", "Results served from the result cache.", RESULT_CACHE.hits),
+        ("result_cache_misses_total", "counter", "Results not found in the result cache.", RESULT_CACHE.misses),
+        ("max_rss_bytes", "gauge", "High-water mark of the server's resident memory.", max_rss_bytes()),
+    ]), media_type="text/plain; version=0.0.4; charset=utf-8")
 
-    adversary = AdversarySuccessMetrics(df, QIDs)
-    result["adversary_success_rate"] = adversary.adversary_success_rate()
-    result["delta_presence"] = adversary.delta_presence(df)
 
-    data_similarity = DataSimilarity(df, QIDs, SAs[0])
-    result["k_anonymity"] = int(data_similarity.k_anonymity())
-    alpha, k = data_similarity.alpha_k_anonymity()
-    result["alpha_k_anonymity"] = {"alpha": round(float(alpha), 4), "k": int(k)}
-    result["l_diversity"] = float(data_similarity.l_diversity())
+def _render_chart(key, result):
+    # traced on the rendering thread so its CPU time is the chart's
+    with StageTrace(METRICS).stage("chart"):
+        return CHARTS.render(key, result["attribute_classification"]["Rrisk"], QID_RISK_BAND, SA_RISK_BAND)
 
-    info_gain = InformationGainLoss(df, QIDs, SAs)
-    result["mutual_information"] = float(round(info_gain.calculate_mutual_information(), 4))
-    result["privacy_score_entropy"] = float(round(info_gain.calculate_privacy_score(), 4))
 
-    uncertainty = Uncertainty(df, SAs)
-    entropy, min_entropy, norm_entropy = uncertainty.uncertainty_calculate_all()
-    result["uncertainty_metrics"] = {
-        "avg_entropy": float(round(entropy, 4)),
-        "avg_min_entropy": float(round(min_entropy, 4)),
-        "avg_normalized_entropy": float(round(norm_entropy, 4))
-    }
+@app.get("/charts/{key}.png")
+async def risk_chart(key: str):
+    """Risk chart of a cached /calcul result, rendered on first request."""
+    path = CHARTS.cached(key) if ChartCache.valid_key(key) else None
+    if path is None:
+        result = RESULT_CACHE.get(key) if ChartCache.valid_key(key) else None
+        if result is None:
+            raise HTTPException(status_code=404, detail="No cached result for this chart; evaluate the file again.")
+        path = await run_in_threadpool(_render_chart, key, result)
+    return FileResponse(path, media_type="image/png")
 
-    return result
+
+@app.post("/whatif", openapi_extra=UPLOAD_SCHEMA)
+async def generalization_what_if(request: Request, hierarchies: str = "{}", k: int = 3, qids: str | None = None,
+                                 max_nodes: int | None = None):
+    """
+    Minimal-loss QID generalizations reaching k-anonymity. `hierarchies` is a JSON
+    object of per-column specs, e.g. {"age": {"type": "interval", "widths": [5, 10]}}.
+    """
+    try:
+        levels = parse_hierarchies(hierarchies)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid hierarchies: {e}")
+    try:
+        uploads = await read_csv_uploads(request, ("file",))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to read uploaded file: {e}")
+    df, filename = uploads["file"]
+    columns = qids.split(",") if qids else None
+    try:
+        return await run_in_threadpool(evaluate_generalizations, df, filename, levels, k, columns, max_nodes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/llm/classify")
+async def llm_classify(columns: list[str]):
+    """Classify column names as personal identifiers, QIDs, SAs or neither with the language model."""
+    try:
+        return await LLM_CLASSIFIER.classify(columns)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="The language model did not answer in time.")
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Language model classification failed: {e}")
+
+
+@app.post("/records/risk", openapi_extra=UPLOAD_SCHEMA)
+async def export_record_risk(request: Request, format: str = "ndjson", qids: str | None = None,
+                             id_column: str | None = None, chunk_rows: int = 100_000):
+    """
+    Stream every record's re-identification risk (1 / class size) and, for unique
+    records, the QIDs that make them unique, as NDJSON, CSV or Parquet.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown export format: {format}")
+    digest = hashlib.sha256()
+    try:
+        uploads = await read_csv_uploads(request, ("file",), digests={"file": digest})
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to read uploaded file: {e}")
+    df, filename = uploads["file"]
+    try:
+        export = await run_in_threadpool(
+            record_risk_export, df, filename, qids.split(",") if qids else None, id_column,
+            RESULT_CACHE.artifacts(digest.hexdigest()),
+        )
+        body = export.stream(format, max(chunk_rows, 1))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    name = os.path.splitext(os.path.basename(filename))[0]
+    return StreamingResponse(body, media_type=EXPORT_FORMATS[format], headers={
+        "Content-Disposition": f'attachment; filename="{name}_risk.{format}"',
+    })
+
+
+@app.post("/jobs", openapi_extra=UPLOAD_SCHEMA, status_code=202)
+async def submit_job(request: Request, approximate: bool = False, population_ref: str | None = None):
+    """Queue the /calcul evaluation of an upload; poll /jobs/{job_id} for progress."""
+    try:
+        upload = await _read_request(request, approximate, population_ref)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to read uploaded file: {e}")
+
+    result = RESULT_CACHE.get(upload.key)
+    if result is not None:
+        return JOBS.completed(upload.filename, result).to_dict()
+    def submit():
+        # the encoding is shared with /calcul and /records/risk requests on the same file
+        encoded = encode_dataframe(upload.df, RESULT_CACHE.artifacts(upload.digest))
+        return JOBS.submit(
+            upload.df, upload.filename, approximate=approximate, population=upload.population,
+            on_result=lambda result: RESULT_CACHE.put(upload.key, result), encoded=encoded,
+        )
+
+    try:
+        # encoding and copying into shared memory run off the event loop
+        job = await run_in_threadpool(submit)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return job.to_dict()
+
+
+def _job_or_404(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    return _job_or_404(job_id).to_dict()
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    job = _job_or_404(job_id)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=job.to_dict())
+    return job.result
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    _job_or_404(job_id)
+    return JOBS.cancel(job_id).to_dict()
+
+
+def _session_or_404(session_id):
+    session = SESSIONS.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Unknown session: {session_id}")
+    return session
+
+
+async def _read_batch(request):
+    try:
+        uploads = await read_csv_uploads(request, ("file",))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to read uploaded file: {e}")
+    return uploads["file"]
+
+
+async def _append_batch(session, batch):
+    try:
+        return await run_in_threadpool(SESSIONS.append, session, batch)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/sessions", openapi_extra=UPLOAD_SCHEMA, status_code=201)
+async def create_session(request: Request, drift_threshold: float = DRIFT_THRESHOLD):
+    """Start an append-only dataset session with its first records."""
+    batch, filename = await _read_batch(request)
+    session = SESSIONS.create(filename, drift_threshold)
+    try:
+        return await _append_batch(session, batch)
+    except HTTPException:
+        SESSIONS.delete(session.id)
+        raise
+
+
+@app.post("/sessions/{session_id}/append", openapi_extra=UPLOAD_SCHEMA)
+async def append_session(session_id: str, request: Request):
+    """Add new records to a session; metrics are refreshed from its count state."""
+    session = _session_or_404(session_id)
+    batch, _ = await _read_batch(request)
+    return await _append_batch(session, batch)
+
+
+@app.get("/sessions/{session_id}")
+async def session_metrics(session_id: str):
+    return _session_or_404(session_id).result
+
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    _session_or_404(session_id)
+    SESSIONS.delete(session_id)
+    return {"session_id": session_id, "deleted": True}
@@ -1,31 +1,116 @@
+import numpy as np
 import pandas as pd
 from src.utils.algorithmic_attribute_classification import AttributeClassification
+from src.utils.equivalence_classes import EquivalenceClassIndex, row_fingerprints
+
+
+def fingerprint_counts(frame, weights=None):
+    """Records per distinct row fingerprint of `frame` (rows count `weights` times when given)."""
+    fingerprints = row_fingerprints(frame).to_numpy()
+    if weights is None:
+        return pd.Series(fingerprints).value_counts()
+    return pd.Series(weights, dtype=np.int64).groupby(fingerprints).sum()
+
+
+def population_chunks(population, columns, chunk_rows=100_000):
+    """`columns` of a population DataFrame or CSV path, `chunk_rows` rows at a time."""
+    if isinstance(population, pd.DataFrame):
+        missing = [col for col in columns if col not in population.columns]
+        if missing:
+            raise ValueError(f"Population dataset lacks the QID columns {missing}.")
+        for start in range(0, len(population), chunk_rows):
+            yield population[columns].iloc[start:start + chunk_rows]
+    else:
+        for chunk in pd.read_csv(population, chunksize=chunk_rows, usecols=columns):
+            yield chunk[columns]
 
 
 class AdversarySuccessMetrics:
-    def __init__(self, df, quasi_identifiers):
+    def __init__(self, df, quasi_identifiers, index=None):
         self.df = df
         self.qi = quasi_identifiers
+        self.index = index if index is not None else EquivalenceClassIndex(df, quasi_identifiers)
 
     def adversary_success_rate(self):
-        grouped = self.df.groupby(self.qi)
-        rates = [1 / len(g) for _, g in grouped if len(g) > 0]
+        sizes = self.index.sizes
+        rates = 1 / sizes[sizes > 0]
         return {
-            "average_success_rate": round(sum(rates) / len(rates), 4) if rates else 0,
-            "max_success_rate": round(max(rates), 4) if rates else 0,
-            "min_success_rate": round(min(rates), 4) if rates else 0,
+            "average_success_rate": round(float(rates.mean()), 4) if len(rates) else 0,
+            "max_success_rate": round(float(rates.max()), 4) if len(rates) else 0,
+            "min_success_rate": round(float(rates.min()), 4) if len(rates) else 0,
             "num_equivalence_classes": len(rates)
         }
 
     def delta_presence(self, original_df):
-        intersection = pd.merge(self.df, original_df, how='inner')
-        delta = len(intersection) / len(self.df) if len(self.df) > 0 else 0
+        """
+        Rows of the inner join of the published and original frames on their shared
+        columns, per published row. The join is counted from row fingerprints
+        (matches of a fingerprint multiply), never materialized.
+        """
+        columns = [col for col in self.df.columns if col in original_df.columns]
+        published = fingerprint_counts(self.df[columns])
+        original = published if original_df is self.df else fingerprint_counts(original_df[columns])
+        matched = published.index.intersection(original.index)
+        shared = int((published[matched].astype(np.int64) * original[matched].astype(np.int64)).sum())
+        delta = shared / len(self.df) if len(self.df) > 0 else 0
         return {
             "delta_presence": round(delta, 4),
-            "shared_records": len(intersection),
+            "shared_records": shared,
             "published_records": len(self.df)
         }
 
+    def delta_presence_population(self, population, chunk_rows=100_000):
+        """
+        delta-presence of the published records within a separate population
+        (DataFrame or CSV path, read `chunk_rows` rows at a time).
+        For each QID class E, delta_E = |published in E| / |population in E|, the
+        probability that a population member of E is in the published data; the
+        bounds are taken over the classes found in the population.
+        Only the published classes' QID fingerprints are held, as a sorted array, and
+        the population is streamed. This side is held even when the population is
+        smaller: the published records are in memory already (the index is built on
+        them), while the population may be a file larger than memory.
+        """
+        published = fingerprint_counts(self.df[self.qi], weights=self.index.weights).sort_index()
+        keys = published.index.to_numpy(dtype=np.uint64)
+        in_population = np.zeros(len(keys), dtype=np.int64)
+        population_records = 0
+
+        for chunk in population_chunks(population, self.qi, chunk_rows):
+            fingerprints = row_fingerprints(chunk).to_numpy()
+            population_records += len(fingerprints)
+            pos = np.minimum(np.searchsorted(keys, fingerprints), max(len(keys) - 1, 0))
+            hit = keys[pos] == fingerprints if len(keys) else np.zeros(len(fingerprints), dtype=bool)
+            in_population += np.bincount(pos[hit], minlength=len(keys))
+
+        published_counts = published.to_numpy(dtype=np.int64)
+        found = in_population > 0
+        deltas = published_counts[found] / in_population[found]
+        published_records = int(published_counts.sum())
+        shared = int(published_counts[found].sum())
+        return {
+            "delta_presence": round(shared / published_records, 4) if published_records else 0,
+            "delta_min": round(float(deltas.min()), 4) if len(deltas) else 0,
+            "delta_max": round(float(deltas.max()), 4) if len(deltas) else 0,
+            "delta_mean": round(float(deltas.mean()), 4) if len(deltas) else 0,
+            "shared_records": shared,
+            "published_records": published_records,
+            "population_records": population_records,
+            "equivalence_classes": len(keys),
+            "classes_missing_from_population": int((~found).sum()),
+        }
+
+    def delta_presence_from_counts(self, row_counts):
+        """Same figure as delta_presence(self.df) from the multiplicity of each distinct record."""
+        published = int(row_counts.sum())
+        shared = int((row_counts.astype(np.int64) ** 2).sum())
+        delta = shared / published if published > 0 else 0
+        return {
+            "delta_presence": round(delta, 4),
+            "shared_records": shared,
+            "published_records": published
+        }
+
 
 if __name__ == "__main__":
 
@@ -1,11 +1,15 @@
 import pandas as pd
-from collections import defaultdict
-import matplotlib.pyplot as plt
 import os
 import uuid
-from itertools import combinations
-from pycanon import anonymity 
 import numpy as np
+from src.utils.column_profile import DatasetProfile
+from src.utils.qid_lattice import QIDLatticeSearch
+from src.utils.risk_chart import CHART_DIR, render_risk_chart
+
+# risk bands of the QID (beta) and SA (alpha) classes, and the k of the QID search
+QID_RISK_BAND = (0.3, 0.8)
+SA_RISK_BAND = (0.8, 1.0)
+QID_SEARCH_K = 3
 
 class AttributeClassification:
     """
@@ -13,38 +17,52 @@ class AttributeClassification:
     QIDs: Quasi-Identifiers
     SAs: Sensitive Attributes
     NSs: Non-Sensitive Attributes
+    Risk scores and column entropies come from one DatasetProfile of the columns
+    (`profiles`, built on first use). In chunked mode `value_counts` ({column: counts
+    incl. NaN}) replaces the raw frame for profiling, and `use_class_counts` supplies
+    the rows for the QID search. With `approximate` the profile is estimated from
+    fixed-size sketches, and the bounds of every risk score are reported under "Rrisk_bounds".
     """
-    def __init__(self, dataframe: pd.DataFrame, filename: str,  beta=(0.3, 0.8), alpha=(0.8, 1.0)):
+    def __init__(self, dataframe: pd.DataFrame, filename: str,  beta=QID_RISK_BAND, alpha=SA_RISK_BAND, value_counts=None,
+                 approximate=False, profiles=None):
         self.df = dataframe
         self.filename = filename
-        self.columns = dataframe.columns
+        self.value_counts = value_counts
+        self.columns = dataframe.columns if value_counts is None else list(value_counts)
+        self.weights = None
         self.beta = beta
         self.alpha = alpha
         self.qids = []
         self.sas = []
         self.nss = []
         self.risk_scores = {}
-
-    def compute_g_distinct_matrix(self):
-        """Compute g-distinct for all attributes (1 / freq of value)."""
-        attr_dg_matrix = defaultdict(list)
-
-        for attr in self.columns:
-            value_counts = self.df[attr].value_counts().to_dict()
-
-            for val in self.df[attr]:
-                freq = value_counts.get(val, 1)
-                g_value = 1.0 / freq
-                attr_dg_matrix[attr].append(g_value)
-
-        return attr_dg_matrix
-
-    def compute_reidentification_risk(self, attr_dg_matrix):
-        """Compute risk for each attribute as sum of its g-distinct values."""
-        risk_scores = {}
-        for attr, g_values in attr_dg_matrix.items():
-            risk_scores[attr] = sum(g_values) / len(g_values)  # Normalize
-        return risk_scores
+        self.approximate = approximate
+        self.profiles = profiles
+        self.risk_bounds = {}
+
+    def column_profiles(self, n_jobs=None):
+        """Profile of every column, computed once (columns in parallel)."""
+        if self.profiles is None:
+            if self.value_counts is not None:
+                self.profiles = DatasetProfile.from_value_counts(self.value_counts)
+            else:
+                self.profiles = DatasetProfile.from_frame(self.df, approximate=self.approximate, n_jobs=n_jobs)
+        return self.profiles
+
+    def compute_g_distinct_risk(self, attr):
+        """
+        Mean g-distinct value (1 / freq of value) over the cells of one attribute.
+        Every distinct value contributes freq * (1 / freq) = 1 and every missing cell 1,
+        so the mean is (distinct values + missing cells) / rows.
+        """
+        return self.column_profiles()[attr].g_distinct_risk
+
+    def compute_reidentification_risk(self, n_jobs=None):
+        """Compute risk for each attribute from the column profiles."""
+        profiles = self.column_profiles(n_jobs)
+        if self.approximate:
+            self.risk_bounds = {col: profiles[col].bounds["g_distinct_risk"] for col in self.columns}
+        return {col: profiles[col].g_distinct_risk for col in self.columns}
 
     def classify_by_thresholds(self, risk_scores):
         """Classify each attribute based on risk."""
@@ -57,20 +75,22 @@ class AttributeClassification:
                 self.nss.append(attr)
 
     def classify_attributes(self):
-        dg_matrix = self.compute_g_distinct_matrix()
-        self.risk_scores = self.compute_reidentification_risk(dg_matrix)
+        self.risk_scores = self.compute_reidentification_risk()
         self.classify_by_thresholds(self.risk_scores)
 
     def get_classification(self):
-        return {
+        result = {
             "QIDs": self.qids,
             "SAs": self.sas,
             "NSs": self.nss,
             "Rrisk": self.risk_scores
         }
+        if self.approximate:
+            result["Rrisk_bounds"] = {attr: list(bounds) for attr, bounds in self.risk_bounds.items()}
+        return result
     
 
-    def run_on_csv(self, beta=(0.5, 0.8), alpha=(0.85, 1.0), visualize=True):
+    def run_on_csv(self, beta=(0.5, 0.8), alpha=(0.85, 1.0), visualize=False, progress=None):
         df = self.df
         print(f"Loaded {df.shape[0]} rows and {df.shape[1]} columns.")
         self.classify_attributes()
@@ -82,46 +102,43 @@ class AttributeClassification:
         print("SAs:", result["SAs"])
         print("NSs:", result["NSs"])
 
+        # the API renders charts on demand (GET /charts/...); this is for command-line runs
         if visualize:
             print("\n--- Risk Scores ---")
             
             for attr, score in result["Rrisk"].items():
                 print(f"{attr}: {score:.3f}")
 
-            chart_dir = "src/charts"
-            os.makedirs(chart_dir, exist_ok=True)
-
             # Generate UUID-based filename
             name = os.path.splitext(os.path.basename(self.filename))[0]
-            out_path = os.path.join(chart_dir, f"{name}_{uuid.uuid4().hex[:8]}.png")
-
-            # Plot and save
-            plt.figure(figsize=(10, 5))
-            plt.bar(result["Rrisk"].keys(), result["Rrisk"].values(), color='skyblue')
-            plt.axhline(beta[0], color='orange', linestyle='--', label='QID threshold min')
-            plt.axhline(beta[1], color='orange', linestyle='--', label='QID threshold max')
-            plt.axhline(alpha[0], color='red', linestyle='--', label='SA threshold min')
-            plt.axhline(alpha[1], color='red', linestyle='--', label='SA threshold max')
-            plt.xticks(rotation=45)
-            plt.ylabel("Re-identification Risk Score")
-            plt.title("Privacy Risk Scores per Attribute")
-            plt.legend()
-            plt.tight_layout()
-            plt.savefig(out_path)
-            plt.close()
+            out_path = os.path.join(CHART_DIR, f"{name}_{uuid.uuid4().hex[:8]}.png")
+            render_risk_chart(result["Rrisk"], out_path, beta, alpha)
 
             print(f"📊 Chart saved to: {out_path}")
 
-        QID_optimal= self.identify_optimal_qid_dimension(k=3)
+        if progress is not None:
+            progress("qid_search")
+        QID_optimal= self.identify_optimal_qid_dimension(k=QID_SEARCH_K)
         result["QIDs"]= QID_optimal
 
         return result
     
+    def use_class_counts(self, table, weights):
+        """Run the QID search on a class-count table (one row per distinct QID/SA combination)."""
+        self.df = table
+        self.weights = weights
+
     def compute_uniqueness(self, df, cols):
         return (df[cols].duplicated(keep=False) == False).sum() / len(df)
 
+    def column_entropy(self, col):
+        """Shannon entropy of a column from its profile, so lattice subsets never recount it."""
+        return self.column_profiles()[col].entropy
+
     def compute_nue(self, df, cols):
         """Compute Non-Uniform Uniqueness Entropy (NUE) for the given columns."""
+        if df is self.df or self.value_counts is not None:
+            return sum(self.column_entropy(col) for col in cols) / len(cols)
         nue = 0
         for col in cols:
             counts = df[col].value_counts(normalize=True)
@@ -135,36 +152,26 @@ class AttributeClassification:
 
 
 
-    def identify_optimal_qid_dimension(self, k=3):
+    def identify_optimal_qid_dimension(self, k=3, max_seconds=None, max_subsets=None, n_jobs=1):
+        """
+        Best k-anonymous QID subset by PG and NUE.
+        max_seconds / max_subsets bound the lattice search; when either is hit the
+        best subset found so far is returned. n_jobs > 1 searches subtrees in worker processes,
+        which share both limits (one evaluation counter, one deadline).
+        """
         if not self.qids or len(self.qids) == 1:
             print("Not enough QIDs to evaluate combinations.")
             return self.qids
 
-        original_uniqueness = self.compute_uniqueness(self.df, self.qids)
-        best_pg = -np.inf
-        best_nue = -np.inf
-        best_combination = None
-
-        for i in range(1, len(self.qids) + 1):
-            for subset in combinations(self.qids, i):
-                subset = list(subset)
-                try:
-                    k_val = anonymity.k_anonymity(self.df, subset)
-                except Exception as e:
-                    print(f"Error checking k-anonymity for {subset}: {e}")
-                    continue
-
-                if k_val < k:
-                    continue  # skip if doesn't meet desired anonymity
-
-                anon_uniqueness = self.compute_uniqueness(self.df, subset)
-                nue = self.compute_nue(self.df, subset)
-                pg = self.compute_pg(original_uniqueness, anon_uniqueness)
-
-                if pg > best_pg and nue > best_nue:
-                    best_pg = pg
-                    best_nue = nue
-                    best_combination = subset
+        entropies = {col: self.column_entropy(col) for col in self.qids}
+        search = QIDLatticeSearch(
+            self.df, self.qids, entropies, k=k,
+            max_seconds=max_seconds, max_subsets=max_subsets, n_jobs=n_jobs, weights=self.weights,
+        )
+        best_combination, best_pg, best_nue = search.run()
+        print(f"QID lattice: {search.evaluated} subsets evaluated, {search.pruned} pruned.")
+        if search.exhausted:
+            print("QID lattice search budget exhausted; returning the best subset found so far.")
 
         if best_combination:
             print(f"Best QID dimension found: {best_combination} with PG={best_pg:.3f}, NUE={best_nue:.3f}")
@@ -187,6 +194,6 @@ if __name__ == "__main__":
     attribute_classifier = AttributeClassification(df, filename)
 
     #retrurn reslt as a dict in run_on_csv {}
-    result = attribute_classifier.run_on_csv()
+    result = attribute_classifier.run_on_csv(visualize=True)
     
     print("final ", result)
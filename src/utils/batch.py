@@ -0,0 +1,167 @@
+"""
+Score many datasets with the /calcul engine across a process pool, one JSONL line each.
+
+    python -m src.utils.batch data/ --output results.jsonl --workers 8
+    python -m src.utils.batch manifest.jsonl --qids Age,Gender --sas Diagnosis
+
+The input is a directory (every dataset file inside, recursively) or a manifest:
+one path per line, or one JSON object per line such as
+{"path": "a.parquet", "qids": ["Age"], "sas": ["Diagnosis"]}. Relative manifest
+paths are read from the manifest's directory. CSV (also .gz, .bz2, .xz, .zip, .zst),
+Parquet and Arrow/Feather files are read; Parquet and Arrow need pyarrow.
+Datasets with known QIDs and SAs skip the attribute classification and only read
+those columns.
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from src.utils.encoded import EncodedDataset
+from src.utils.instrumentation import StageTrace
+from src.utils.pipeline import compute_privacy_metrics, evaluate_dataframe
+
+CSV_SUFFIXES = (".csv", ".csv.gz", ".csv.bz2", ".csv.xz", ".csv.zip", ".csv.zst")
+PARQUET_SUFFIXES = (".parquet", ".pq")
+ARROW_SUFFIXES = (".arrow", ".feather", ".ipc")
+DATASET_SUFFIXES = CSV_SUFFIXES + PARQUET_SUFFIXES + ARROW_SUFFIXES
+
+
+def read_dataset(path, columns=None):
+    """DataFrame of a CSV, Parquet or Arrow file; only `columns` are read when given."""
+    name = path.lower()
+    if name.endswith(CSV_SUFFIXES):
+        # compression is inferred from the suffix
+        return pd.read_csv(path, usecols=columns)
+    if name.endswith(PARQUET_SUFFIXES):
+        return pd.read_parquet(path, columns=columns)
+    if name.endswith(ARROW_SUFFIXES):
+        return pd.read_feather(path, columns=columns)
+    raise ValueError(f"Unknown dataset format: {path}")
+
+
+def dataset_tasks(source):
+    """One {"path", "qids", "sas"} task per dataset of a directory or manifest."""
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(DATASET_SUFFIXES):
+                    yield {"path": os.path.join(root, name)}
+        return
+    base = os.path.dirname(source)
+    with open(source) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            task = json.loads(line) if line.startswith("{") else {"path": line}
+            task["path"] = os.path.join(base, task["path"])
+            yield task
+
+
+def score_dataset(task, approximate=False):
+    """The JSONL record of one dataset: its /calcul result, or the error that stopped it."""
+    path, qids, sas = task["path"], task.get("qids"), task.get("sas")
+    record = {"path": path}
+    trace = StageTrace()
+    try:
+        # the metrics print their progress; stdout carries the JSONL output
+        with contextlib.redirect_stdout(sys.stderr):
+            with trace.stage("read"):
+                columns = list(dict.fromkeys(qids + sas)) if qids and sas else None
+                df = read_dataset(path, columns)
+                trace.note(rows=len(df))
+            if columns:
+                attributes = {"QIDs": list(qids), "SAs": list(sas)}
+                result = compute_privacy_metrics(df, attributes, approximate=approximate, progress=trace,
+                                                 encoded=EncodedDataset.from_frame(df))
+            else:
+                result = evaluate_dataframe(df, os.path.basename(path), approximate=approximate, progress=trace)
+            trace.stop()
+    except Exception as e:
+        trace.stop()
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+    else:
+        record.update(status="ok", rows=len(df), result=result)
+    record["timing"] = trace.summary()
+    return record
+
+
+def _json_value(value):
+    # numpy scalars and arrays
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def run_batch(tasks, output, workers=None, approximate=False, max_pending=None):
+    """
+    Score every task on a pool of `workers` processes and write one JSON line per
+    dataset to `output` as each finishes. At most `max_pending` datasets are queued
+    at once, so a long manifest is never held in memory. Returns (ok, failed).
+    """
+    workers = workers or multiprocessing.cpu_count()
+    max_pending = max_pending or 2 * workers
+    tasks = iter(tasks)
+    ok = failed = 0
+    pending = set()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        while True:
+            for task in tasks:
+                pending.add(executor.submit(score_dataset, task, approximate))
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                output.write(json.dumps(record, default=_json_value) + "\n")
+                output.flush()
+                if record["status"] == "ok":
+                    ok += 1
+                else:
+                    failed += 1
+                    print(f"Failed: {record['path']}: {record['error']}", file=sys.stderr)
+    return ok, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a directory or manifest of datasets.")
+    parser.add_argument("source", help="directory of datasets, or manifest (paths or JSON objects, one per line)")
+    parser.add_argument("--output", "-o", default="-", help="JSONL output file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--qids", help="comma-separated QIDs of every dataset (with --sas: no classification)")
+    parser.add_argument("--sas", help="comma-separated SAs of every dataset")
+    parser.add_argument("--approximate", action="store_true", help="sketch-based column statistics")
+    args = parser.parse_args(argv)
+    if bool(args.qids) != bool(args.sas):
+        parser.error("--qids and --sas go together")
+
+    def tasks():
+        for task in dataset_tasks(args.source):
+            if args.qids and "qids" not in task:
+                task.update(qids=args.qids.split(","), sas=args.sas.split(","))
+            yield task
+
+    started = time.time()
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        ok, failed = run_batch(tasks(), output, workers=args.workers, approximate=args.approximate)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"Scored {ok} datasets, {failed} failed, in {time.time() - started:.1f}s.", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+
+from src.utils.algorithmic_attribute_classification import AttributeClassification, QID_SEARCH_K
+from src.utils.equivalence_classes import row_fingerprints
+from src.utils.pipeline import compute_privacy_metrics
+
+
+COUNT = "__records__"
+STATE_FORMAT = 1
+
+
+def merge_counts(parts):
+    """Sum value-count Series that share the same key layout."""
+    parts = [part for part in parts if part is not None and len(part)]
+    if not parts:
+        return None
+    if len(parts) == 1:
+        return parts[0]
+    return pd.concat(parts).groupby(level=0, dropna=False, sort=False).sum()
+
+
+def merge_count_frames(parts):
+    """Sum count tables (key columns plus COUNT) over their key columns."""
+    parts = [part for part in parts if part is not None and len(part)]
+    if not parts:
+        return None
+    if len(parts) == 1:
+        return parts[0]
+    merged = pd.concat(parts, ignore_index=True)
+    keys = [col for col in merged.columns if col != COUNT]
+    return merged.groupby(keys, dropna=False, sort=False, observed=True)[COUNT].sum().reset_index()
+
+
+class CountState:
+    """
+    Count state accumulated chunk by chunk; the chunked mode keeps nothing else in memory.
+    value_counts: per-column value counts (missing values included)
+    class_counts: records per distinct combination of the QID candidate and SA columns
+                  (a frame of those columns plus COUNT)
+    row_counts: records per distinct row fingerprint (for delta presence)
+    Partial counts are merged once they outgrow the merged state, so each chunk is
+    only regrouped a logarithmic number of times. States of different shards merge
+    associatively and serialize with to_bytes / from_bytes.
+    """
+    def __init__(self):
+        self.n_rows = 0
+        self.value_counts = {}
+        self.class_columns = []
+        self.class_counts = None
+        self.row_counts = None
+        self._pending = {"values": [], "classes": [], "rows": []}
+
+    def add_column_counts(self, chunk):
+        self.n_rows += len(chunk)
+        self._pending["values"].append({col: chunk[col].value_counts(dropna=False) for col in chunk.columns})
+        self._pending["rows"].append(row_fingerprints(chunk).value_counts())
+        self._compact()
+
+    def add_class_counts(self, chunk, columns):
+        self.class_columns = list(columns)
+        counts = chunk.groupby(self.class_columns, dropna=False, sort=False, observed=True).size()
+        self._pending["classes"].append(counts.rename(COUNT).reset_index())
+        self._compact()
+
+    def _pending_rows(self, key):
+        if key == "values":
+            return sum(len(counts) for part in self._pending[key] for counts in part.values())
+        return sum(len(part) for part in self._pending[key])
+
+    def _compact(self, force=False):
+        if self._pending["values"] and (force or self._pending_rows("values") > self._state_rows("values")):
+            columns = self._pending["values"][0].keys()
+            self.value_counts = {
+                col: merge_counts([self.value_counts.get(col)] + [part[col] for part in self._pending["values"]])
+                for col in columns
+            }
+            self._pending["values"] = []
+        if self._pending["rows"] and (force or self._pending_rows("rows") > self._state_rows("rows")):
+            self.row_counts = merge_counts([self.row_counts] + self._pending["rows"])
+            self._pending["rows"] = []
+        if self._pending["classes"] and (force or self._pending_rows("classes") > self._state_rows("classes")):
+            self.class_counts = merge_count_frames([self.class_counts] + self._pending["classes"])
+            self._pending["classes"] = []
+
+    def _state_rows(self, key):
+        if key == "values":
+            return sum(len(counts) for counts in self.value_counts.values())
+        state = self.row_counts if key == "rows" else self.class_counts
+        return 0 if state is None else len(state)
+
+    def finalize(self):
+        """Merge every pending partial count into the state."""
+        self._compact(force=True)
+        return self
+
+    def merge(self, other):
+        """Fold another shard's state into this one; merge order does not matter."""
+        self.finalize()
+        other.finalize()
+        if self.class_columns and other.class_columns and self.class_columns != other.class_columns:
+            raise ValueError("Cannot merge class counts over different columns.")
+        self.n_rows += other.n_rows
+        for col, counts in other.value_counts.items():
+            self.value_counts[col] = merge_counts([self.value_counts.get(col), counts])
+        self.row_counts = merge_counts([self.row_counts, other.row_counts])
+        self.class_columns = self.class_columns or other.class_columns
+        self.class_counts = merge_count_frames([self.class_counts, other.class_counts])
+        return self
+
+    def to_bytes(self):
+        self.finalize()
+        return pickle.dumps({
+            "format": STATE_FORMAT,
+            "n_rows": self.n_rows,
+            "value_counts": self.value_counts,
+            "class_columns": self.class_columns,
+            "class_counts": self.class_counts,
+            "row_counts": self.row_counts,
+        }, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def from_bytes(cls, data):
+        payload = pickle.loads(data)
+        if payload.get("format") != STATE_FORMAT:
+            raise ValueError(f"Unsupported count state format: {payload.get('format')}")
+        state = cls()
+        state.n_rows = payload["n_rows"]
+        state.value_counts = payload["value_counts"]
+        state.class_columns = payload["class_columns"]
+        state.class_counts = payload["class_counts"]
+        state.row_counts = payload["row_counts"]
+        return state
+
+    def class_table(self):
+        """(one row per distinct QID/SA combination, records per row)."""
+        if self.class_counts is None:
+            return pd.DataFrame(columns=self.class_columns), np.zeros(0, dtype=np.int64)
+        return self.class_counts[self.class_columns], self.class_counts[COUNT].to_numpy(dtype=np.int64)
+
+
+def count_columns(path, chunk_rows=100_000, state=None):
+    """Pass 1: per-column value counts and row fingerprints of a CSV."""
+    state = state if state is not None else CountState()
+    for chunk in pd.read_csv(path, chunksize=chunk_rows):
+        state.add_column_counts(chunk)
+    return state.finalize()
+
+
+def count_classes(path, columns, chunk_rows=100_000, state=None):
+    """Pass 2: class counts over `columns`, reading only those columns."""
+    state = state if state is not None else CountState()
+    for chunk in pd.read_csv(path, chunksize=chunk_rows, usecols=columns):
+        state.add_class_counts(chunk[columns], columns)
+    return state.finalize()
+
+
+def classify_state(state, filename):
+    """Attribute classification from the column counts of a state."""
+    classifier = AttributeClassification(None, filename, value_counts=state.value_counts)
+    classifier.classify_attributes()
+    return classifier, classifier.get_classification()
+
+
+def class_columns(classifier):
+    return list(dict.fromkeys(classifier.qids + classifier.sas))
+
+
+def metrics_from_state(state, classifier, attributes):
+    """Finish the QID search and every metric from a state holding class counts."""
+    table, weights = state.class_table()
+    if classifier.qids:
+        classifier.use_class_counts(table, weights)
+        attributes["QIDs"] = classifier.identify_optimal_qid_dimension(k=QID_SEARCH_K)
+    return compute_privacy_metrics(table, attributes, weights=weights, row_counts=state.row_counts,
+                                   profiles=classifier.column_profiles())
+
+
+def evaluate_csv_chunked(path, chunk_rows=100_000, filename=None):
+    """
+    Same result as the in-memory /calcul pipeline, reading the CSV `chunk_rows` rows at a time.
+    Pass 1 counts every column (classification, uncertainty, delta presence);
+    pass 2 reads only the QID candidate and SA columns into class counts.
+    """
+    state = count_columns(path, chunk_rows)
+    print(f"Counted {state.n_rows} rows and {len(state.value_counts)} columns in chunks of {chunk_rows}.")
+
+    classifier, attributes = classify_state(state, filename or os.path.basename(path))
+    columns = class_columns(classifier)
+    if columns:
+        count_classes(path, columns, chunk_rows, state=state)
+    return metrics_from_state(state, classifier, attributes)
+
+
+if __name__ == "__main__":
+    FILE_PATH = sys.argv[1] if len(sys.argv) > 1 else "./data/test/healthcare_dataset.csv"
+    CHUNK_ROWS = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+
+    print(evaluate_csv_chunked(FILE_PATH, chunk_rows=CHUNK_ROWS))
@@ -0,0 +1,113 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.utils.sketches import ColumnSketch
+
+
+class ColumnProfile:
+    """
+    Univariate statistics of one column, all derived from a single count of its values.
+    rows / missing: records, and records with a missing value
+    distinct: number of distinct non-missing values
+    entropy, min_entropy, max_entropy (bits) and normalized_entropy over non-missing values
+    g_distinct_risk: mean of 1 / freq over the cells, (distinct + missing) / rows
+    bounds: {statistic: (low, high)} when the profile was estimated from a sketch, else None
+    """
+    def __init__(self, name, counts, missing=0, bounds=None):
+        counts = np.asarray(counts, dtype=float)
+        counts = counts[counts > 0]
+        present = counts.sum()
+        p = counts / present if present else counts
+
+        self.name = name
+        self.missing = int(missing)
+        self.rows = int(present) + self.missing
+        self.distinct = len(counts)
+        self.entropy = float(-np.sum(p * np.log2(p)))
+        self.min_entropy = float(-np.log2(p.max())) if len(p) else 0.0
+        self.max_entropy = float(np.log2(self.distinct)) if self.distinct else 0.0
+        self.normalized_entropy = self.entropy / self.max_entropy if self.max_entropy else 0.0
+        self.g_distinct_risk = (self.distinct + self.missing) / self.rows if self.rows else 0.0
+        self.bounds = bounds
+
+    @classmethod
+    def from_codes(cls, name, codes, weights=None):
+        """Profile from dictionary codes (-1 marks a missing value)."""
+        missing = codes < 0
+        counts = np.bincount(codes[~missing], weights=None if weights is None else weights[~missing])
+        return cls(name, counts, missing.sum() if weights is None else weights[missing].sum())
+
+    @classmethod
+    def from_series(cls, series, weights=None):
+        codes, _ = pd.factorize(series)
+        return cls.from_codes(series.name, codes, weights)
+
+    @classmethod
+    def from_value_counts(cls, name, counts):
+        """Profile from value counts that include missing values (value_counts(dropna=False))."""
+        missing = counts.index.isna()
+        return cls(name, counts[~missing].to_numpy(), counts[missing].sum())
+
+    @classmethod
+    def from_sketch(cls, name, sketch):
+        """Estimated profile from a ColumnSketch, with the bounds of every estimate."""
+        profile = cls(name, [], sketch.nulls)
+        profile.rows = sketch.n
+        estimates = {
+            "distinct": sketch.distinct(),
+            "entropy": sketch.entropy(),
+            "min_entropy": sketch.min_entropy(),
+            "max_entropy": sketch.max_entropy(),
+            "g_distinct_risk": sketch.g_distinct_risk(),
+        }
+        for statistic, (estimate, _, _) in estimates.items():
+            setattr(profile, statistic, estimate)
+        profile.normalized_entropy = profile.entropy / profile.max_entropy if profile.max_entropy else 0.0
+        profile.bounds = {statistic: (low, high) for statistic, (_, low, high) in estimates.items()}
+        return profile
+
+
+class DatasetProfile:
+    """
+    Column profiles of a dataset, computed once (in parallel across columns) and
+    shared by attribute classification, the QID search and the uncertainty metrics.
+    """
+    def __init__(self, profiles):
+        self.profiles = dict(profiles)
+
+    @classmethod
+    def from_frame(cls, df, columns=None, weights=None, approximate=False, n_jobs=None):
+        """Profile `columns` of `df`; `approximate` estimates them from fixed-memory sketches."""
+        columns = list(df.columns if columns is None else columns)
+        weights = None if weights is None else np.asarray(weights)
+
+        def profile(col):
+            if approximate:
+                return ColumnProfile.from_sketch(col, ColumnSketch.from_series(df[col]))
+            return ColumnProfile.from_series(df[col], weights)
+
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            return cls(zip(columns, executor.map(profile, columns)))
+
+    @classmethod
+    def from_encoded(cls, encoded, columns=None, weights=None):
+        """Exact profiles from the codes of an EncodedDataset, without touching the values."""
+        columns = list(encoded.columns if columns is None else columns)
+        weights = None if weights is None else np.asarray(weights)
+        return cls((col, ColumnProfile.from_codes(col, encoded.codes[col], weights)) for col in columns)
+
+    @classmethod
+    def from_value_counts(cls, value_counts):
+        """Profiles from per-column value counts (chunked mode)."""
+        return cls((col, ColumnProfile.from_value_counts(col, counts)) for col, counts in value_counts.items())
+
+    def __getitem__(self, col):
+        return self.profiles[col]
+
+    def __contains__(self, col):
+        return col in self.profiles
+
+    def __iter__(self):
+        return iter(self.profiles)
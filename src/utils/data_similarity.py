@@ -1,23 +1,26 @@
 import pandas as pd
 from src.utils.algorithmic_attribute_classification import AttributeClassification
+from src.utils.equivalence_classes import EquivalenceClassIndex
 import numpy as np
-from concurrent.futures import ProcessPoolExecutor
 
 class DataSimilarity:
-    def __init__(self, DATA, QI, SA):
+    def __init__(self, DATA, QI, SA, index=None):
         self.DATA = DATA
         self.QI = QI
         self.SA = SA
+        if index is None and QI:
+            index = EquivalenceClassIndex(DATA, QI, [SA])
+        self.index = index
 
     def k_anonymity(self):
         if not self.QI:
             return 1 #worst case
-        return self.DATA.groupby(self.QI).size().min()
+        return self.index.sizes.min()
 
     def alpha_k_anonymity(self):
         if not self.QI:
             return 1,1
-        group_sizes = self.DATA.groupby(self.QI).size()
+        group_sizes = self.index.sizes
         alpha = group_sizes.mean()
         k = group_sizes.min()
         return alpha, k
@@ -25,52 +28,75 @@ class DataSimilarity:
     def l_diversity(self):
 
         if not self.QI:
-            return len(self.DATA[self.SA].nunique())
-        
-        grouped = self.DATA.groupby(self.QI)
-        
-        entropies = []
-        for _, group in grouped:
-            counts = group[self.SA].value_counts(normalize=True).values
-            nonzero_counts = counts[counts > 0]
-            entropy = -np.sum(nonzero_counts * np.log2(nonzero_counts))
-            entropies.append(entropy)
-        
-        return np.mean(entropies) if entropies else 0
-
-
-
-    def compute_group_t_distance(group_df, sa_col, global_values, global_array):
-        group_counts = group_df[sa_col].value_counts(normalize=True)
-        
-        group_dist = pd.Series(0, index=global_values)
-        group_dist.update(group_counts)
-        
-        t_distance = np.abs(global_array - group_dist.values).max()
-        return t_distance
-
-
-    def t_closeness_parallel(self, num_workers=4):
-        global_dist = self.DATA[self.SA].value_counts(normalize=True)
-        global_values = global_dist.index.tolist()
-        global_array = global_dist.values
-        
-        grouped = list(self.DATA.groupby(self.QI))  # materialize groups
-        
-        with ProcessPoolExecutor(max_workers=num_workers) as executor:
-            futures = [
-                executor.submit(
-                    self.compute_group_t_distance,
-                    group,
-                    self.SA,
-                    global_values,
-                    global_array
-                )
-                for _, group in grouped
-            ]
-            t_distances = [f.result() for f in futures]
-        
-        return max(t_distances)
+            return self.DATA[self.SA].nunique()
+
+        entropies = self.index.contingency(self.SA).class_entropy()
+        return entropies.mean() if len(entropies) else 0
+
+
+
+    def global_distribution(self):
+        """Distribution of the SA over the whole dataset, aligned with the index codes."""
+        codes = self.index.codes[self.SA]
+        valid = codes >= 0
+        weights = None if self.index.weights is None else self.index.weights[valid]
+        counts = np.bincount(codes[valid], weights=weights, minlength=len(self.index.uniques[self.SA]))
+        return counts / counts.sum() if counts.sum() else counts
+
+    def t_closeness(self):
+        """
+        Max distance between a class SA distribution and the global one.
+        Numeric SAs use the ordered EMD, categorical SAs the variational distance.
+        """
+        if not self.QI:
+            return 0
+        table = self.index.contingency(self.SA)
+        if not len(table.count):
+            return 0
+        global_p = self.global_distribution()
+        q = table.class_probabilities()
+        observed = table.class_totals > 0
+
+        if pd.api.types.is_numeric_dtype(self.index.uniques[self.SA]):
+            distances = self._ordered_emd(table, q, global_p)
+        else:
+            # 0.5 * (sum over values seen in the class of |q - p| + mass of values it never sees)
+            seen_diff = np.bincount(table.group, weights=np.abs(q - global_p[table.value]), minlength=table.n_classes)
+            seen_mass = np.bincount(table.group, weights=global_p[table.value], minlength=table.n_classes)
+            distances = 0.5 * (seen_diff + 1 - seen_mass)
+
+        return distances[observed].max()
+
+    def _ordered_emd(self, table, q, global_p):
+        """
+        EMD over sorted SA values without densifying the class x value table.
+        Between two values seen in a class its CDF is constant, so each segment's
+        sum of |CDF_class - CDF_global| comes from prefix sums of the global CDF.
+        """
+        m = table.n_values
+        if m < 2:
+            return np.zeros(table.n_classes)
+        cdf = np.cumsum(global_p)
+        cdf_prefix = np.concatenate(([0.0], np.cumsum(cdf)))
+
+        order = np.lexsort((table.value, table.group))
+        groups, values, probs = table.group[order], table.value[order], q[order]
+        starts = np.r_[True, groups[1:] != groups[:-1]]
+        class_cdf = np.cumsum(probs)
+        class_cdf -= np.repeat(class_cdf[starts] - probs[starts], np.diff(np.r_[np.flatnonzero(starts), len(probs)]))
+        seg_end = np.r_[values[1:], m]
+        seg_end[np.r_[starts[1:], True]] = m
+
+        def segment_sums(c, a, b):
+            t = np.clip(np.searchsorted(cdf, c, side="left"), a, b)
+            return c * (t - a) - (cdf_prefix[t] - cdf_prefix[a]) + (cdf_prefix[b] - cdf_prefix[t]) - c * (b - t)
+
+        totals = segment_sums(class_cdf, values, seg_end)
+        # leading segment before the first value seen in each class, where its CDF is 0
+        leading = cdf_prefix[values[starts]]
+        distances = np.bincount(groups, weights=totals, minlength=table.n_classes)
+        distances[groups[starts]] += leading
+        return distances / (m - 1)
 
 if __name__ == "__main__":
     # FILE_PATH = "./data/test/COVID-19_Treatments_20250222.csv"
@@ -89,4 +115,4 @@ if __name__ == "__main__":
     alpha, k = data_similarity.alpha_k_anonymity()
     print(f"alpha-k-anonymity: (alpha={float(alpha):.4f}, k={int(k)})")
     print("l-diversity: ", data_similarity.l_diversity())
-    # print("t-closeness: ", data_similarity.t_closeness()) # ! takes alot of time
+    print("t-closeness: ", data_similarity.t_closeness())
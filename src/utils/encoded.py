@@ -0,0 +1,119 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+
+def narrow_codes(codes, n_values):
+    """Codes in the narrowest signed integer type holding -1 .. n_values - 1."""
+    dtype = np.result_type(np.min_scalar_type(-1), np.min_scalar_type(max(n_values - 1, 0)))
+    return codes.astype(dtype, copy=False)
+
+
+class EncodedDataset:
+    """
+    Dictionary-encoded dataset: per column, integer codes of the narrowest width
+    (-1 marks a missing value) and the dictionary of its values.
+    Categorical columns keep their own codes and the categories in use; other columns
+    are factorized with sorted dictionaries, so numeric values keep their order.
+    """
+    def __init__(self, codes, dictionaries, n_rows):
+        self.codes = codes
+        self.dictionaries = dictionaries
+        self.n_rows = n_rows
+        self.columns = list(codes)
+
+    @classmethod
+    def from_frame(cls, df):
+        codes, dictionaries = {}, {}
+        for col in df.columns:
+            values = df[col]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                # unused categories would count as values (and empty classes) downstream
+                values = values.cat.remove_unused_categories()
+                codes[col] = values.cat.codes.to_numpy()
+                dictionaries[col] = values.cat.categories
+            else:
+                column_codes, uniques = pd.factorize(values, sort=True)
+                codes[col] = narrow_codes(column_codes, len(uniques))
+                dictionaries[col] = pd.Index(uniques)
+        return cls(codes, dictionaries, len(df))
+
+    @property
+    def nbytes(self):
+        return sum(codes.nbytes for codes in self.codes.values())
+
+    def column(self, col):
+        """Pandas view of a column: categorical over the codes, or decoded numbers."""
+        codes, dictionary = self.codes[col], self.dictionaries[col]
+        if not pd.api.types.is_numeric_dtype(dictionary.dtype):
+            # codes come from encoding, so they are not re-validated (which would copy them)
+            categorical = pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(dictionary), validate=False)
+            return pd.Series(categorical, name=col)
+        values = dictionary.to_numpy()[codes]
+        if (codes < 0).any():
+            values = np.where(codes >= 0, values, np.nan)
+        return pd.Series(values, name=col)
+
+    def frame(self):
+        return pd.DataFrame({col: self.column(col) for col in self.columns}, copy=False)
+
+    def share(self):
+        """Copy the codes into one shared-memory block; returns its picklable handle."""
+        layout, offset = [], 0
+        for col in self.columns:
+            codes = self.codes[col]
+            layout.append((col, codes.dtype.str, offset, len(codes)))
+            offset += codes.nbytes
+        block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for col, dtype, start, length in layout:
+            np.ndarray(length, dtype=dtype, buffer=block.buf, offset=start)[:] = self.codes[col]
+        return SharedDataset(block, layout, self.dictionaries, self.n_rows)
+
+
+class SharedDataset:
+    """
+    Handle of an EncodedDataset whose codes live in shared memory. Pickling it sends
+    only the block name, the layout and the dictionaries; `attach` in another process
+    maps the codes without copying them. The creating process calls `release`.
+    """
+    def __init__(self, block, layout, dictionaries, n_rows):
+        self.block = block
+        self.name = block.name
+        self.layout = layout
+        self.dictionaries = dictionaries
+        self.n_rows = n_rows
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["block"] = None
+        return state
+
+    def attach(self):
+        """EncodedDataset over the shared codes; keep it alive while the codes are in use."""
+        if self.block is None:
+            self.block = shared_memory.SharedMemory(name=self.name)
+        codes = {
+            col: np.ndarray(length, dtype=dtype, buffer=self.block.buf, offset=start)
+            for col, dtype, start, length in self.layout
+        }
+        return EncodedDataset(codes, self.dictionaries, self.n_rows)
+
+    def detach(self):
+        """Unmap the block in this process (views of it must be gone)."""
+        if self.block is not None:
+            try:
+                self.block.close()
+            except BufferError:
+                pass  # a view is still referenced; the mapping goes with the process
+            self.block = None
+
+    def release(self):
+        """Free the block; called once by the creating process when workers are done."""
+        block = self.block
+        self.detach()
+        try:
+            shared_memory.SharedMemory(name=self.name).unlink()
+        except FileNotFoundError:
+            pass
+        del block
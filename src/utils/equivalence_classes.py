@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+
+
+def encode_column(values):
+    """Dictionary-encode a column into dense integer codes (-1 marks a missing value)."""
+    codes, uniques = pd.factorize(values, sort=True)
+    return codes.astype(np.int64, copy=False), uniques
+
+
+def combine_codes(left, right, right_size):
+    """Combine two code arrays into dense codes of their joint values (-1 propagates)."""
+    valid = (left >= 0) & (right >= 0)
+    joint = left[valid].astype(np.int64) * right_size + right[valid]
+    dense, uniques = pd.factorize(joint)
+    codes = np.full(len(left), -1, dtype=np.int64)
+    codes[valid] = dense
+    return codes, len(uniques)
+
+
+def row_fingerprints(frame):
+    """
+    64-bit hash of every row; numbers are hashed as float64 so chunk dtypes agree,
+    and categorical columns hash like their values.
+    """
+    frame = frame.apply(lambda col: col.astype("float64") if pd.api.types.is_numeric_dtype(col) else col)
+    return pd.util.hash_pandas_object(frame, index=False)
+
+
+class SAContingency:
+    """
+    Sparse class x SA-value count table.
+    Each entry (group[i], value[i]) holds count[i] records; missing SA values are not counted.
+    `class_totals` (records with an SA value per class) is summed from the entries when not given.
+    """
+    def __init__(self, group, value, count, n_classes, n_values, class_totals=None):
+        self.group = group
+        self.value = value
+        self.count = count
+        self.n_classes = n_classes
+        self.n_values = n_values
+        if class_totals is None:
+            class_totals = np.bincount(group, weights=count, minlength=n_classes)
+        self.class_totals = class_totals
+
+    def class_probabilities(self):
+        """P(value | class) for every non-zero entry of the table."""
+        return self.count / self.class_totals[self.group]
+
+    def class_entropy(self, eps=0.0):
+        """Shannon entropy (bits) of the SA distribution inside each class."""
+        p = self.class_probabilities()
+        terms = -p * np.log2(p + eps)
+        return np.bincount(self.group, weights=terms, minlength=self.n_classes)
+
+
+class EquivalenceClassIndex:
+    """
+    Equivalence classes of a dataset over its QIDs, built once per request
+    and shared by every QID-based metric.
+    group: dense class id per row (-1 when a QID is missing, as groupby drops those rows)
+    sizes: number of records in each class
+    contingency(sa): class x value counts for a sensitive attribute; the tables of
+                     all indexed SAs come from one grouped pass over the rows
+    With an `encoded` dataset (EncodedDataset) the codes of its columns are used
+    as they are instead of hashing the values again; `df` may then be None when
+    `encoded` holds every column and `weights` are given.
+    """
+    def __init__(self, df: pd.DataFrame, qids, sas=(), weights=None, encoded=None):
+        self.qids = list(qids)
+        self.sas = list(sas)
+        self.weights = None if weights is None else np.asarray(weights, dtype=np.int64)
+        self.n_rows = int(self.weights.sum()) if self.weights is not None else len(df)
+
+        self.codes = {}
+        self.uniques = {}
+        for col in dict.fromkeys(self.qids + self.sas):
+            if encoded is not None and col in encoded.codes:
+                self.codes[col] = encoded.codes[col].astype(np.int64)
+                self.uniques[col] = encoded.dictionaries[col]
+            else:
+                self.codes[col], self.uniques[col] = encode_column(df[col])
+
+        self.group, self.n_classes = self._build_groups()
+        valid = self.group >= 0
+        row_weights = None if self.weights is None else self.weights[valid]
+        self.sizes = np.bincount(
+            self.group[valid], weights=row_weights, minlength=self.n_classes
+        ).astype(np.int64)
+        self._contingency = {}
+
+    def _build_groups(self):
+        if not self.qids:
+            n = len(self.weights) if self.weights is not None else self.n_rows
+            return np.zeros(n, dtype=np.int64), 1
+
+        group, n_groups = self._compact(self.codes[self.qids[0]], len(self.uniques[self.qids[0]]))
+        for col in self.qids[1:]:
+            group, n_groups = combine_codes(group, self.codes[col], len(self.uniques[col]))
+        return group, n_groups
+
+    @staticmethod
+    def _compact(codes, n_values):
+        """Codes renumbered over the values that occur, so no class is empty (order kept)."""
+        used = np.bincount(codes[codes >= 0], minlength=n_values) > 0
+        if used.all():
+            return codes, n_values
+        renumbered = np.cumsum(used) - 1
+        return np.where(codes >= 0, renumbered[np.maximum(codes, 0)], -1), int(used.sum())
+
+    def _class_sa_combinations(self):
+        """
+        One pass over the rows: (class, SA values) combinations of every row with a
+        class, as per-column codes of one representative row each plus record counts.
+        """
+        valid = np.flatnonzero(self.group >= 0)
+        columns = [self.group[valid]] + [self.codes[sa][valid] + 1 for sa in self.sas]  # missing SA -> 0
+        sizes = [self.n_classes] + [len(self.uniques[sa]) + 1 for sa in self.sas]
+        if np.prod(np.array(sizes, dtype=float)) < 2 ** 62:
+            key = np.zeros(len(valid), dtype=np.int64)
+            for codes, size in zip(columns, sizes):
+                key = key * size + codes
+            combination, _ = pd.factorize(key)
+            n_combinations = combination.max() + 1 if len(combination) else 0
+        else:
+            combination, n_combinations = columns[0], sizes[0]
+            for codes, size in zip(columns[1:], sizes[1:]):
+                combination, n_combinations = combine_codes(combination, codes, size)
+        row_weights = None if self.weights is None else self.weights[valid]
+        counts = np.bincount(combination, weights=row_weights, minlength=n_combinations).astype(np.int64)
+        representative = np.empty(n_combinations, dtype=np.int64)
+        representative[combination] = np.arange(len(combination))
+        return [codes[representative] for codes in columns], counts
+
+    def contingency(self, sa):
+        """Class x value counts for `sa`, computed with every other SA on first use and cached."""
+        if sa not in self.codes or sa not in self.sas:
+            raise KeyError(f"SA '{sa}' was not indexed; pass it in `sas` when building the index.")
+        if not self._contingency:
+            columns, counts = self._class_sa_combinations()
+            group = columns[0]
+            for col, sa_codes in zip(self.sas, columns[1:]):
+                n_values = len(self.uniques[col])
+                seen = sa_codes > 0
+                keys = group[seen] * max(n_values, 1) + sa_codes[seen] - 1
+                inverse, pair_keys = pd.factorize(keys)
+                pair_counts = np.bincount(inverse, weights=counts[seen], minlength=len(pair_keys)).astype(np.int64)
+                self._contingency[col] = SAContingency(
+                    pair_keys // max(n_values, 1), pair_keys % max(n_values, 1), pair_counts,
+                    self.n_classes, n_values,
+                )
+        return self._contingency[sa]
@@ -0,0 +1,225 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from src.utils.adversary_success import AdversarySuccessMetrics
+from src.utils.data_similarity import DataSimilarity
+from src.utils.encoded import EncodedDataset
+from src.utils.equivalence_classes import EquivalenceClassIndex, combine_codes, encode_column
+
+SUPPRESSED = "*"
+DATE_FORMATS = {"day": "%Y-%m-%d", "month": "%Y-%m", "year": "%Y"}
+
+
+def interval_level(width):
+    """Numbers banded into [lo, lo + width); other values are kept."""
+    def generalize(values):
+        numbers = pd.to_numeric(pd.Series(values), errors="coerce")
+        low = np.floor(numbers / width) * width
+        labels = [f"[{lo:g}, {lo + width:g})" for lo in low.fillna(0)]
+        return np.where(numbers.notna(), labels, pd.Series(values).astype(str))
+    return generalize
+
+
+def prefix_level(keep):
+    """Text truncated to its first `keep` characters, the rest masked (ZIP codes)."""
+    def generalize(values):
+        text = pd.Series(values).astype(str)
+        return (text.str[:keep] + text.str.len().sub(keep).clip(lower=0).map(lambda n: SUPPRESSED * n)).to_numpy()
+    return generalize
+
+
+def date_level(unit):
+    """Dates coarsened to a day, month, year or decade; unparseable values are kept."""
+    def generalize(values):
+        dates = pd.to_datetime(pd.Series(values), errors="coerce", format="mixed")
+        if unit == "decade":
+            labels = (dates.dt.year // 10 * 10).astype("Int64").astype(str) + "s"
+        else:
+            labels = dates.dt.strftime(DATE_FORMATS[unit])
+        return np.where(dates.notna(), labels, pd.Series(values).astype(str))
+    return generalize
+
+
+def mapping_level(mapping):
+    """Values replaced through an explicit mapping; unmapped values are kept."""
+    def generalize(values):
+        return np.array([mapping.get(str(value), str(value)) for value in values], dtype=object)
+    return generalize
+
+
+LEVEL_TYPES = {
+    "interval": ("widths", interval_level),
+    "prefix": ("keep", prefix_level),
+    "date": ("levels", date_level),
+    "map": ("levels", mapping_level),
+}
+
+
+class Hierarchy:
+    """
+    Generalization hierarchy of one QID. Level 0 keeps the values, each further
+    level applies one generalization to the original values, and the top level
+    suppresses them all ('*'). Missing values stay missing at every level.
+    """
+    def __init__(self, column, levels=(), suppress=True):
+        self.column = column
+        self.levels = [None] + list(levels) + ([lambda values: np.full(len(values), SUPPRESSED, dtype=object)]
+                                               if suppress else [])
+
+    @property
+    def height(self):
+        return len(self.levels) - 1
+
+    def generalize(self, values, level):
+        """Generalized label of each value at `level`."""
+        if level == 0:
+            return np.asarray(values)
+        return self.levels[level](values)
+
+    @classmethod
+    def from_spec(cls, column, spec):
+        """
+        Hierarchy from a JSON-style spec, e.g. {"type": "interval", "widths": [5, 10, 20]},
+        {"type": "prefix", "keep": [4, 3]}, {"type": "date", "levels": ["month", "year"]}
+        or {"type": "map", "levels": [{"Paris": "Ile-de-France"}]}.
+        """
+        if spec.get("type") not in LEVEL_TYPES:
+            raise ValueError(f"Unknown hierarchy type for '{column}': {spec.get('type')}")
+        key, level = LEVEL_TYPES[spec["type"]]
+        return cls(column, [level(argument) for argument in spec.get(key, [])], spec.get("suppress", True))
+
+
+def parse_hierarchies(text):
+    """{column: Hierarchy} from a JSON object of hierarchy specs."""
+    specs = json.loads(text) if text else {}
+    if not isinstance(specs, dict):
+        raise ValueError("Hierarchies must be a JSON object keyed by column.")
+    return {column: Hierarchy.from_spec(column, spec) for column, spec in specs.items()}
+
+
+class GeneralizationWhatIf:
+    """
+    What-if evaluation of QID generalizations without regrouping the records.
+    The QID/SA count table (one row per distinct combination, with its records) is
+    built once. A vector of hierarchy levels is evaluated by generalizing each QID's
+    distinct values, mapping the table's codes through that, and indexing the rolled-up
+    table: k-anonymity, l-diversity and t-closeness come from DataSimilarity and the
+    adversary success from AdversarySuccessMetrics, as for the raw data.
+    QIDs without a hierarchy can only be kept or suppressed.
+    """
+    def __init__(self, df, qids, sas, hierarchies=None, weights=None):
+        self.qids = list(qids)
+        self.sas = list(sas)
+        hierarchies = hierarchies or {}
+        self.hierarchies = {col: hierarchies.get(col) or Hierarchy(col) for col in self.qids}
+
+        codes, self.uniques = {}, {}
+        columns = list(dict.fromkeys(self.qids + self.sas))
+        for col in columns:
+            codes[col], self.uniques[col] = encode_column(df[col])
+        self.codes, self.weights = self._count_table(codes, columns, weights)
+        self._generalized = {}
+        self.evaluated = 0
+        self.truncated = False
+
+    @staticmethod
+    def _count_table(codes, columns, weights):
+        """Codes of one row per distinct combination of `columns`, and its records."""
+        shifted = [codes[col] + 1 for col in columns]  # missing values are kept as code 0
+        combination, n_combinations = shifted[0], int(shifted[0].max()) + 1 if len(shifted[0]) else 0
+        for col_codes in shifted[1:]:
+            combination, n_combinations = combine_codes(combination, col_codes, int(col_codes.max()) + 1)
+        counts = np.bincount(combination, weights=weights, minlength=n_combinations).astype(np.int64)
+        representative = np.empty(n_combinations, dtype=np.int64)
+        representative[combination] = np.arange(len(combination))
+        return {col: codes[col][representative] for col in columns}, counts
+
+    def _level_codes(self, col, level):
+        """(table codes of `col` generalized to `level`, dictionary of the generalized values)."""
+        key = (col, level)
+        if key not in self._generalized:
+            labels = self.hierarchies[col].generalize(self.uniques[col], level)
+            value_codes, dictionary = encode_column(labels) if level else (np.arange(len(labels)), self.uniques[col])
+            table_codes = self.codes[col]
+            mapped = np.where(table_codes >= 0, value_codes[table_codes] if len(value_codes) else -1, -1)
+            self._generalized[key] = (mapped, pd.Index(dictionary))
+        return self._generalized[key]
+
+    def loss(self, levels):
+        """Generalization loss: mean height fraction of the QIDs (0 raw, 1 all suppressed)."""
+        return float(np.mean([level / max(self.hierarchies[col].height, 1) for col, level in levels.items()]))
+
+    def index(self, levels):
+        """Equivalence classes of the count table with the QIDs at `levels`."""
+        codes, dictionaries = {}, {}
+        for col in self.qids:
+            codes[col], dictionaries[col] = self._level_codes(col, levels[col])
+        for col in self.sas:
+            if col not in codes:
+                codes[col], dictionaries[col] = self.codes[col], pd.Index(self.uniques[col])
+        encoded = EncodedDataset(codes, dictionaries, len(self.weights))
+        return EquivalenceClassIndex(None, self.qids, self.sas, weights=self.weights, encoded=encoded)
+
+    def evaluate(self, levels):
+        """Privacy metrics of the data with each QID generalized to `levels` ({QID: level})."""
+        self.evaluated += 1
+        index = self.index(levels)
+        result = {
+            "levels": dict(levels),
+            "loss": round(self.loss(levels), 4),
+            "k_anonymity": int(index.sizes.min()) if len(index.sizes) else 0,
+            "equivalence_classes": int(index.n_classes),
+            "discernibility": int(np.sum(index.sizes.astype(np.float64) ** 2)),
+            "adversary_success_rate": AdversarySuccessMetrics(None, self.qids, index=index).adversary_success_rate(),
+        }
+        result["per_sa_metrics"] = {}
+        for sa in self.sas:
+            similarity = DataSimilarity(None, self.qids, sa, index=index)
+            result["per_sa_metrics"][sa] = {
+                "l_diversity": float(similarity.l_diversity()),
+                "t_closeness": float(round(similarity.t_closeness(), 4)),
+            }
+        return result
+
+    def minimal_levels(self, k, max_nodes=None):
+        """
+        Minimal level vectors reaching k-anonymity, lowest loss first.
+        Generalizing a QID only merges classes, so every vector above a k-anonymous
+        one is k-anonymous too. The lattice is walked by total height, one level at a
+        time: a vector is evaluated only when each vector one step below it was
+        evaluated and is not k-anonymous, so only the open vectors of the last level
+        are kept. `max_nodes` bounds the evaluations; `truncated` tells whether it
+        stopped the walk before the lattice was covered.
+        """
+        heights = [self.hierarchies[col].height for col in self.qids]
+        self.truncated = False
+        frontier = []
+        level = [tuple(0 for _ in heights)]
+        while level:
+            open_nodes = set()
+            for node in level:
+                if max_nodes is not None and self.evaluated >= max_nodes:
+                    self.truncated = True
+                    break
+                result = self.evaluate(dict(zip(self.qids, node)))
+                if result["k_anonymity"] >= k:
+                    frontier.append(result)
+                else:
+                    open_nodes.add(node)
+            if self.truncated:
+                break
+            level = sorted(self._successors(open_nodes, heights))
+        return sorted(frontier, key=lambda result: (result["loss"], result["discernibility"]))
+
+    @staticmethod
+    def _successors(open_nodes, heights):
+        """Vectors one step above `open_nodes` whose every vector one step below is open."""
+        successors = set()
+        for node in open_nodes:
+            for i, height in enumerate(heights):
+                if node[i] < height:
+                    successors.add(node[:i] + (node[i] + 1,) + node[i + 1:])
+        return [node for node in successors
+                if all(node[:i] + (node[i] - 1,) + node[i + 1:] in open_nodes for i in range(len(node)) if node[i])]
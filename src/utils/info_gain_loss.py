@@ -1,33 +1,105 @@
-from sklearn.metrics import mutual_info_score
-from sklearn.preprocessing import OrdinalEncoder
 import numpy as np
 import pandas as pd
 from src.utils.algorithmic_attribute_classification import AttributeClassification
+from src.utils.equivalence_classes import EquivalenceClassIndex, combine_codes
 
 
-class InformationGainLoss:
+def entropy_from_counts(counts):
+    """Shannon entropy (nats, as sklearn's mutual_info_score) of a count vector."""
+    counts = counts[counts > 0]
+    if not len(counts):
+        return 0.0
+    p = counts / counts.sum()
+    return float(-np.sum(p * np.log(p)))
+
 
-    def __init__(self, data, QIs, SAs):
+class InformationGainLoss:
+    """
+    Information leaked about the SAs by the QIDs.
+    Every column is encoded once by the EquivalenceClassIndex; column entropies are
+    computed once and each QI x SA mutual information is H(QI) + H(SA) - H(QI, SA),
+    one bincount over the combined codes per pair.
+    """
+
+    def __init__(self, data, QIs, SAs, index=None):
         self.DATA = data
         self.QIs = QIs
         self.SAs = SAs
+        if index is None and QIs and SAs:
+            index = EquivalenceClassIndex(data, QIs, SAs)
+        self.index = index
+        self._entropies = {}
+        self._matrix = None
+
+    def column_entropy(self, col):
+        if col not in self._entropies:
+            counts = np.bincount(self.index.codes[col], weights=self.index.weights, minlength=len(self.index.uniques[col]))
+            self._entropies[col] = entropy_from_counts(counts)
+        return self._entropies[col]
+
+    def joint_entropy(self, a, b):
+        """Entropy of the joint values of two indexed columns without missing values."""
+        size_b = len(self.index.uniques[b])
+        n_joint = len(self.index.uniques[a]) * size_b
+        if n_joint <= 4 * len(self.index.codes[a]):
+            joint = self.index.codes[a] * size_b + self.index.codes[b]
+        else:
+            # sparse pairs of high-cardinality columns: dense codes of the observed pairs only
+            joint, n_joint = combine_codes(self.index.codes[a], self.index.codes[b], size_b)
+        return entropy_from_counts(np.bincount(joint, weights=self.index.weights, minlength=n_joint))
+
+    def mutual_information_matrix(self):
+        """
+        ({QI: {SA: MI}}, {QI: {SA: normalized MI}}) over every pair; pairs with
+        missing values are None. Normalized MI is 2 * MI / (H(QI) + H(SA)).
+        """
+        if self._matrix is None:
+            mi, nmi = {}, {}
+            for qi in self.QIs:
+                mi[qi], nmi[qi] = {}, {}
+                for sa in self.SAs:
+                    if (self.index.codes[qi] < 0).any() or (self.index.codes[sa] < 0).any():
+                        mi[qi][sa] = nmi[qi][sa] = None
+                        continue
+                    h_qi, h_sa = self.column_entropy(qi), self.column_entropy(sa)
+                    value = max(h_qi + h_sa - self.joint_entropy(qi, sa), 0.0)
+                    mi[qi][sa] = value
+                    nmi[qi][sa] = 2 * value / (h_qi + h_sa) if h_qi + h_sa > 0 else 1.0
+            self._matrix = mi, nmi
+        return self._matrix
+
+    def joint_mutual_information(self):
+        """
+        {SA: (I(QIDs; SA), I(QIDs; SA) / H(SA))}: information the full QID combination
+        (the equivalence class) carries about each SA, over rows without missing values.
+        """
+        joint = {}
+        for sa in self.SAs:
+            table = self.index.contingency(sa)
+            n = table.count.sum()
+            if n == 0:
+                joint[sa] = (0.0, 0.0)
+                continue
+            h_class = entropy_from_counts(np.bincount(table.group, weights=table.count, minlength=table.n_classes))
+            h_sa = entropy_from_counts(np.bincount(table.value, weights=table.count, minlength=table.n_values))
+            value = max(h_class + h_sa - entropy_from_counts(table.count.astype(float)), 0.0)
+            joint[sa] = (value, value / h_sa if h_sa > 0 else 0.0)
+        return joint
 
     def calculate_mutual_information(self):
         if not self.QIs or not self.SAs:
             print("No QIs or SAs provided. Returning MI = 0.")
             return 0
 
-        encoder = OrdinalEncoder()
         mi_values = []
+        matrix, _ = self.mutual_information_matrix()
 
         for qi in self.QIs:
             for sa in self.SAs:
-                try:
-                    encoded = encoder.fit_transform(self.DATA[[qi, sa]])
-                    mi = mutual_info_score(encoded[:, 0], encoded[:, 1])
-                    mi_values.append(mi)
-                except Exception as e:
-                    print(f"Skipping MI({qi}, {sa}) due to error: {e}")
+                if matrix[qi][sa] is None:
+                    print(f"Skipping MI({qi}, {sa}) due to error: Input contains NaN.")
+                    continue
+                mi_values.append(matrix[qi][sa])
 
         return np.mean(mi_values) if mi_values else 0
 
@@ -36,23 +108,14 @@ class InformationGainLoss:
             print("No QIs or SAs provided. Returning Privacy Score = 0.")
             return 0
 
-        entropy_values = []
-
-        for sa in self.SAs:
-            grouped = self.DATA.groupby(self.QIs)
-            total_records = len(self.DATA)
-            weighted_entropy = 0
-
-            for _, group in grouped:
-                group_weight = len(group) / total_records
-                counts = group[sa].value_counts(normalize=True)
-                entropy = -np.sum(counts * np.log2(counts + 1e-10))  
-                weighted_entropy += group_weight * entropy
-
-            entropy_values.append(weighted_entropy)
-
+        entropy_values = [self.conditional_entropy(sa) for sa in self.SAs]
         return np.mean(entropy_values) if entropy_values else 0
 
+    def conditional_entropy(self, sa):
+        """H(SA | QIDs) in bits: class entropies weighted by class size."""
+        group_weights = self.index.sizes / self.index.n_rows
+        return float(np.dot(group_weights, self.index.contingency(sa).class_entropy(eps=1e-10)))
+
 
 if __name__ == "__main__":
     
@@ -70,5 +133,7 @@ if __name__ == "__main__":
     info_gain_loss = InformationGainLoss(DATA, QI, SA)
 
     print("Mutual Information: ", info_gain_loss.calculate_mutual_information())
+    print("Mutual Information per pair: ", info_gain_loss.mutual_information_matrix()[0])
+    print("Joint QID mutual information: ", info_gain_loss.joint_mutual_information())
     print("Relative entropy: ", info_gain_loss.calculate_privacy_score())
 
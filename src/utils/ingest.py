@@ -0,0 +1,213 @@
+import asyncio
+import io
+import queue
+import threading
+import time
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+
+class StreamingCSVIngestor(io.RawIOBase):
+    """
+    Readable byte stream fed chunk by chunk from the request, parsed by pandas in
+    a worker thread while the upload is still being received.
+    The queue is bounded, so at most `max_buffered` network chunks wait in memory,
+    and each parsed CSV chunk is dictionary-encoded before the next one is read.
+    `cpu_seconds` is the CPU time the parsing thread spent in `parse`.
+    """
+    def __init__(self, chunk_rows=100_000, max_buffered=32):
+        self.chunk_rows = chunk_rows
+        self._queue = queue.Queue(maxsize=max_buffered)
+        self._current = memoryview(b"")
+        self._eof = False
+        self.finished = False
+        self.failed = threading.Event()
+        self.cpu_seconds = 0.0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not len(self._current):
+            if self._eof:
+                return 0
+            data = self._queue.get()
+            if data is None:
+                self._eof = True
+                return 0
+            self._current = memoryview(data)
+        n = min(len(buffer), len(self._current))
+        buffer[:n] = self._current[:n]
+        self._current = self._current[n:]
+        return n
+
+    def try_feed(self, data):
+        """Queue bytes without blocking; False when the buffer is full."""
+        try:
+            self._queue.put_nowait(data)
+        except queue.Full:
+            return False
+        self.finished = data is None
+        return True
+
+    def feed(self, data):
+        """Queue bytes for the parser, blocking while the buffer is full."""
+        while True:
+            if self.failed.is_set():
+                raise ValueError("CSV parsing stopped before the upload finished.")
+            try:
+                self._queue.put(data, timeout=0.1)
+            except queue.Full:
+                continue
+            self.finished = data is None
+            return
+
+    def finish(self):
+        self.feed(None)
+
+    def parse(self):
+        """Read the stream in chunks of `chunk_rows` rows into an encoded DataFrame."""
+        start = time.thread_time()
+        try:
+            chunks = pd.read_csv(io.BufferedReader(self), chunksize=self.chunk_rows)
+            return concat_encoded([encode_chunk(chunk) for chunk in chunks])
+        except Exception:
+            self.failed.set()
+            raise
+        finally:
+            self.cpu_seconds = time.thread_time() - start
+
+
+def encode_chunk(chunk):
+    """Dictionary-encode the text columns of a parsed chunk."""
+    for col in chunk.columns:
+        if chunk[col].dtype == object:
+            chunk[col] = chunk[col].astype("category")
+    return chunk
+
+
+def concat_encoded(chunks):
+    """Concatenate encoded chunks, merging the per-chunk dictionaries of each column."""
+    if not chunks:
+        raise ValueError("The uploaded file contains no rows.")
+    if len(chunks) == 1:
+        return chunks[0]
+
+    columns = {}
+    for col in chunks[0].columns:
+        parts = [chunk[col] for chunk in chunks]
+        if not any(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            columns[col] = pd.concat(parts, ignore_index=True)
+            continue
+        # a column parsed as text in one chunk and as numbers in another is text overall
+        parts = [
+            part if isinstance(part.dtype, pd.CategoricalDtype)
+            else part.astype(str).where(part.notna()).astype("category")
+            for part in parts
+        ]
+        parts = [part.cat.set_categories(part.cat.categories.astype(object)) for part in parts]
+        columns[col] = pd.Series(union_categoricals(parts))
+    return pd.DataFrame(columns)
+
+
+async def read_csv_upload(request, field="file", chunk_rows=100_000, digest=None):
+    """
+    Parse the CSV sent as multipart field `field` straight from the request stream.
+    Returns (DataFrame, filename). A hashlib object passed as `digest` is updated
+    with the file's bytes as they arrive.
+    """
+    digests = None if digest is None else {field: digest}
+    uploads = await read_csv_uploads(request, (field,), chunk_rows=chunk_rows, digests=digests)
+    return uploads[field]
+
+
+async def read_csv_uploads(request, fields, chunk_rows=100_000, digests=None, cpu_seconds=None):
+    """
+    Parse the CSV files of several multipart fields while the request streams in.
+    Returns {field: (DataFrame, filename)} for the fields present; the first of
+    `fields` is required. Each file gets its own ingestor, and the hashlib object
+    `digests[field]` (when given) is updated with that file's bytes. The parsing
+    runs in worker threads; a `cpu_seconds` dict receives each field's parsing CPU time.
+    """
+    digests = digests or {}
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise ValueError("Expected a multipart/form-data upload.")
+
+    loop = asyncio.get_running_loop()
+    part = {"headers": {}, "header": b"", "value": b"", "pending": []}
+    active = {"field": None}
+    uploads = {}  # field -> (ingestor, parse task, filename)
+
+    def on_part_begin():
+        part["headers"] = {}
+
+    def on_header_field(data, start, end):
+        part["header"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part["value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["header"].lower()] = part["value"]
+        part["header"], part["value"] = b"", b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("latin-1")
+        active["field"] = None
+        if name in fields and name not in uploads:
+            active["field"] = name
+            ingestor = StreamingCSVIngestor(chunk_rows=chunk_rows)
+            filename = options.get(b"filename", b"upload.csv").decode("latin-1")
+            uploads[name] = (ingestor, loop.run_in_executor(None, ingestor.parse), filename)
+
+    def on_part_data(data, start, end):
+        if active["field"] is not None:
+            piece = bytes(data[start:end])
+            part["pending"].append((uploads[active["field"]][0], piece))
+            if active["field"] in digests:
+                digests[active["field"]].update(piece)
+
+    def on_part_end():
+        if active["field"] is not None:
+            part["pending"].append((uploads[active["field"]][0], None))
+        active["field"] = None
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    try:
+        async for data in request.stream():
+            parser.write(data)
+            pending, part["pending"] = part["pending"], []
+            for ingestor, piece in pending:
+                if not ingestor.try_feed(piece):
+                    await loop.run_in_executor(None, ingestor.feed, piece)
+        parser.finalize()
+    except ValueError:
+        for ingestor, task, _ in uploads.values():
+            if ingestor.failed.is_set():
+                await task  # surfaces the CSV parser's own error
+        raise
+    finally:
+        for ingestor, _, _ in uploads.values():
+            if not ingestor.failed.is_set() and not ingestor.finished:
+                await loop.run_in_executor(None, ingestor.finish)
+
+    if fields[0] not in uploads:
+        await asyncio.gather(*(task for _, task, _ in uploads.values()), return_exceptions=True)
+        raise ValueError(f"No '{fields[0]}' file field in the upload.")
+    parsed = {name: (await task, filename) for name, (_, task, filename) in uploads.items()}
+    if cpu_seconds is not None:
+        cpu_seconds.update({name: ingestor.cpu_seconds for name, (ingestor, _, _) in uploads.items()})
+    return parsed
@@ -0,0 +1,259 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+MEMORY_BUCKETS = tuple(2 ** 20 * 4 ** i for i in range(8))  # 1 MiB to 16 GiB
+
+
+def max_rss_bytes():
+    """High-water mark of the process's resident memory, or None where unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def enable_memory_tracing():
+    """Trace Python and numpy allocations so every stage reports its peak; about doubles metric times."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+class StageTrace:
+    """
+    Wall time, CPU time and memory of the stages of one request.
+    A trace is a progress callback: each call with a stage name closes the running
+    stage and opens the next; `note` adds counts (rows, equivalence classes) to the
+    running stage and the ones after it. Every closed stage is reported to `registry`.
+    CPU time is the running thread's, so a stage must stop on the thread it started on;
+    a stage whose work runs on other threads starts with `thread_cpu=False` and gets
+    their CPU time from `add_cpu` (the starting thread may be running other work).
+    Memory is the process's RSS high-water mark at the end of the stage and, while
+    allocations are traced (enable_memory_tracing), the traced peak during the stage;
+    the traced peak is process-wide, so concurrent requests share it.
+    """
+    def __init__(self, registry=None, **counts):
+        self.registry = registry
+        self.counts = counts
+        self.stages = []
+        self._running = None
+
+    def __call__(self, stage):
+        self.start(stage)
+
+    def start(self, stage, thread_cpu=True):
+        self.stop()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self._running = {"stage": stage, "wall": time.perf_counter(),
+                         "cpu": time.thread_time() if thread_cpu else None, "other_cpu": 0.0,
+                         "counts": dict(self.counts)}
+
+    def add_cpu(self, seconds):
+        """CPU time spent for the running stage on other threads."""
+        if self._running is not None:
+            self._running["other_cpu"] += seconds
+
+    def note(self, **counts):
+        self.counts.update(counts)
+        if self._running is not None:
+            self._running["counts"].update(counts)
+
+    def stop(self):
+        running, self._running = self._running, None
+        if running is None:
+            return None
+        record = {
+            "stage": running["stage"],
+            "wall_seconds": round(time.perf_counter() - running["wall"], 6),
+            "cpu_seconds": round((time.thread_time() - running["cpu"] if running["cpu"] is not None else 0.0)
+                                 + running["other_cpu"], 6),
+            "max_rss_bytes": max_rss_bytes(),
+        }
+        if tracemalloc.is_tracing():
+            record["peak_traced_bytes"] = tracemalloc.get_traced_memory()[1]
+        record.update(running["counts"])
+        self.stages.append(record)
+        if self.registry is not None:
+            self.registry.observe_stage(record)
+        return record
+
+    @contextmanager
+    def stage(self, stage, thread_cpu=True):
+        self.start(stage, thread_cpu)
+        try:
+            yield self
+        finally:
+            self.stop()
+
+    def summary(self):
+        """The timing section of a response."""
+        return {
+            "stages": list(self.stages),
+            "wall_seconds": round(sum(stage["wall_seconds"] for stage in self.stages), 6),
+            "cpu_seconds": round(sum(stage["cpu_seconds"] for stage in self.stages), 6),
+        }
+
+
+def _number(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(round(value, 9))
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class MetricsRegistry:
+    """Counters and histograms of the server's stages and requests, in the Prometheus text format."""
+    def __init__(self, prefix="privacy_engine"):
+        self.prefix = prefix
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def _name(self, name, kind, description):
+        name = f"{self.prefix}_{name}"
+        self._help.setdefault(name, (kind, description))
+        return name
+
+    def inc(self, name, description, value=1, **labels):
+        name = self._name(name, "counter", description)
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, description, value, buckets, **labels):
+        name = self._name(name, "histogram", description)
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets),
+                                                     "sum": 0.0, "count": 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram["counts"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def observe_stage(self, record):
+        stage = record["stage"]
+        self.observe("stage_duration_seconds", "Wall time of each stage.", record["wall_seconds"],
+                     DURATION_BUCKETS, stage=stage)
+        self.inc("stage_cpu_seconds_total", "CPU time spent in each stage.", record["cpu_seconds"], stage=stage)
+        if record.get("rows") is not None:
+            self.inc("stage_rows_total", "Rows processed by each stage.", record["rows"], stage=stage)
+        if record.get("peak_traced_bytes") is not None:
+            self.observe("stage_peak_traced_bytes", "Peak traced memory of each stage.", record["peak_traced_bytes"],
+                         MEMORY_BUCKETS, stage=stage)
+
+    def render(self, samples=()):
+        """Exposition text; `samples` adds (name, type, description, value) read at scrape time."""
+        lines = []
+        described = set()
+
+        def describe(name, kind, description):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                describe(name, *self._help[name])
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                describe(name, *self._help[name])
+                for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {count}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(histogram['sum'])}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram['count']}")
+        for name, kind, description, value in samples:
+            if value is None:
+                continue
+            name = f"{self.prefix}_{name}"
+            describe(name, kind, description)
+            lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler of one thread (the creating thread by default): a background
+    thread records its Python stack every `interval` seconds. Stacks are counted in
+    collapsed form (outermost;...;innermost), as flame graph tools read them.
+    """
+    def __init__(self, thread_id=None, interval=0.005, max_depth=64):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _label(code):
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        if stack:
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def report(self, top=20):
+        """The most sampled functions (own and cumulative samples) and stacks."""
+        own, cumulative = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for function in set(frames):
+                cumulative[function] += count
+        return {
+            "interval_seconds": self.interval,
+            "samples": self.samples,
+            "functions": [{"function": function, "own_samples": own[function], "samples": count}
+                          for function, count in cumulative.most_common(top)],
+            "own_time": [{"function": function, "samples": count} for function, count in own.most_common(top)],
+            "stacks": [{"stack": stack, "samples": count} for stack, count in self.stacks.most_common(top)],
+        }
@@ -0,0 +1,188 @@
+import gc
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from src.utils.encoded import EncodedDataset
+from src.utils.pipeline import STAGES, evaluate_dataframe
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at its depth limit."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a worker when its job was cancelled while running."""
+
+
+class Job:
+    def __init__(self, filename):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.status = "queued"
+        self.stage = None
+        self.created = time.time()
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.future = None
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def to_dict(self):
+        completed = STAGES.index(self.stage) if self.stage in STAGES else 0
+        if self.status == "done":
+            completed = len(STAGES)
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "progress": {"stage": self.stage, "completed_stages": completed, "total_stages": len(STAGES)},
+            "created": self.created,
+            "finished": self.finished,
+            "error": self.error,
+        }
+
+
+def _run_job(job_id, shared, filename, approximate, population, progress, cancelled):
+    """
+    Worker side: evaluate a dataset whose codes are attached from shared memory,
+    publishing each stage and honouring cancellation.
+    """
+    def report(stage):
+        if cancelled.get(job_id):
+            raise JobCancelled()
+        progress[job_id] = stage
+
+    encoded = shared.attach()
+    try:
+        return evaluate_dataframe(encoded.frame(), filename, approximate=approximate, progress=report,
+                                  population=population, encoded=encoded)
+    finally:
+        del encoded
+        gc.collect()
+        shared.detach()
+
+
+class JobManager:
+    """
+    Runs evaluations as jobs on a bounded process pool, so requests only enqueue work.
+    At most `max_workers` jobs run at once and `max_queued` more may wait; beyond that
+    submit raises QueueFullError. Workers publish their current stage through a
+    multiprocessing manager, which also carries cancellation of running jobs (checked
+    at each stage). Datasets reach the workers dictionary-encoded in shared memory,
+    so only their dictionaries are pickled. The last `max_finished` finished jobs are kept for their results.
+    The pool starts on first use, or ahead of time with `start`.
+    """
+    def __init__(self, max_workers=None, max_queued=16, max_finished=256):
+        self.max_workers = max_workers or multiprocessing.cpu_count()
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._manager = None
+
+    def start(self):
+        """Start the progress manager and the worker pool (both spawn processes)."""
+        with self._lock:
+            if self._executor is None:
+                context = multiprocessing.get_context("spawn")
+                self._manager = context.Manager()
+                self._progress = self._manager.dict()
+                self._cancelled = self._manager.dict()
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+
+    def _active(self):
+        return sum(1 for job in self.jobs.values() if not job.done)
+
+    def _check_queue(self):
+        if self._active() >= self.max_workers + self.max_queued:
+            raise QueueFullError(f"Job queue is full ({self.max_queued} waiting).")
+
+    def _add(self, job):
+        self.jobs[job.id] = job
+        finished = [job_id for job_id, old in self.jobs.items() if old.done]
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self.jobs[job_id]
+
+    def submit(self, df, filename, approximate=False, population=None, on_result=None, encoded=None):
+        """
+        Queue an evaluation; `on_result(result)` runs when it succeeds. `encoded` is the
+        EncodedDataset of `df` when the caller has it. Encoding and copying the dataset
+        into shared memory take time in the caller's thread, so call this off the event loop.
+        """
+        self.start()
+        with self._lock:
+            self._check_queue()
+        shared = (encoded if encoded is not None else EncodedDataset.from_frame(df)).share()
+        with self._lock:
+            try:
+                self._check_queue()
+            except QueueFullError:
+                shared.release()
+                raise
+            job = Job(filename)
+            self._add(job)
+            job.future = self._executor.submit(
+                _run_job, job.id, shared, filename, approximate, population, self._progress, self._cancelled,
+            )
+        job.future.add_done_callback(lambda future: self._finish(job, future, on_result, shared))
+        return job
+
+    def completed(self, filename, result):
+        """Record a job whose result is already known (e.g. from the result cache)."""
+        with self._lock:
+            job = Job(filename)
+            job.status, job.stage, job.result, job.finished = "done", STAGES[-1], result, time.time()
+            self._add(job)
+        return job
+
+    def _finish(self, job, future, on_result, shared):
+        shared.release()
+        with self._lock:
+            job.finished = time.time()
+            if future.cancelled():
+                job.status = "cancelled"
+            elif isinstance(future.exception(), JobCancelled):
+                job.status = "cancelled"
+            elif future.exception() is not None:
+                job.status, job.error = "failed", str(future.exception())
+            else:
+                job.status, job.result = "done", future.result()
+            job.stage = self._progress.pop(job.id, job.stage)
+            self._cancelled.pop(job.id, None)
+        if job.status == "done" and on_result is not None:
+            on_result(job.result)
+
+    def get(self, job_id):
+        """The job with its latest stage, or None."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is not None and not job.done:
+                job.stage = self._progress.get(job_id, job.stage)
+                if job.stage is not None and job.status == "queued":
+                    job.status = "running"
+            return job
+
+    def cancel(self, job_id):
+        """Cancel a queued job at once, or a running one at its next stage."""
+        job = self.get(job_id)
+        if job is None or job.done:
+            return job
+        if not job.future.cancel():
+            with self._lock:
+                self._cancelled[job_id] = True
+                job.status = "cancelling"
+        return job
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._manager.shutdown()
+            self._executor = self._manager = None
@@ -1,48 +1,68 @@
-import google.generativeai as genai
-from dotenv import load_dotenv
-import os
-import json
+import asyncio
 import ast
+import json
+import os
 import re
+import threading
+import weakref
+from collections import OrderedDict
+
 import pandas as pd
 
-load_dotenv()
+CLASSES = ("personal_identifiers", "quasi_identifiers", "sensitive_attributes", "neither")
 
-class DetectIdentifiers:
 
-    def __init__(self):
-        GEMINI_PRO_API_KEY = os.getenv('GEMINI_PRO_API_KEY')
+def build_prompt(column_names):
+    return (
+        "You are an expert in data classification and privacy protection. Given a list of dataset column names, "
+        "categorize each into one of the following classes: \n"
+        "1. Personal Identifiers (Directly identify an individual, e.g., full name, phone number, SSN, passport number)\n"
+        "2. Quasi-Identifiers (Do not directly identify an individual but can be used in combination to do so, e.g., age, gender, zip code, job title, IP address)\n"
+        "3. Sensitive Attributes (Highly confidential data that can cause harm or discrimination if exposed, e.g., medical history, financial data, criminal record, political views)\n"
+        "4. Neither (Columns that do not fall into any of the above categories)\n"
+        "Return the output as a valid JSON object with double quotes, formatted as follows: \n"
+        "{ \"personal_identifiers\": [...], \"quasi_identifiers\": [...], \"sensitive_attributes\": [...], \"neither\": [...] }\n"
+        "DO NOT INVENT COLUMN NAMES. Only classify the provided column names."
+        f"Column names: {column_names}"
+    )
 
-        if not GEMINI_PRO_API_KEY:
-            raise ValueError("GEMINI_PRO_API_KEY is missing from environment variables.")
-        genai.configure(api_key=GEMINI_PRO_API_KEY)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
 
-    def clean_json_string(self, json_string):
-        pattern = r'^```json\s*(.*?)\s*```$'
-        cleaned_string = re.sub(pattern, r'\1', json_string, flags=re.DOTALL)
-        return cleaned_string.strip()
+def clean_json_string(json_string):
+    pattern = r'^```json\s*(.*?)\s*```$'
+    cleaned_string = re.sub(pattern, r'\1', json_string, flags=re.DOTALL)
+    return cleaned_string.strip()
 
 
-    def detect_identifiers(self, column_names):
+def parse_response(text):
+    """{class: [column names]} from the model's answer."""
+    try:
+        return json.loads(clean_json_string(text))
+    except json.JSONDecodeError:
+        # Fallback: Use ast.literal_eval() for improperly formatted JSON
+        return ast.literal_eval(text)
 
-        if not column_names:
-            return {"error": "No column names provided."}
 
-        prompt = (
-            "You are an expert in data classification and privacy protection. Given a list of dataset column names, "
-            "categorize each into one of the following classes: \n"
-            "1. Personal Identifiers (Directly identify an individual, e.g., full name, phone number, SSN, passport number)\n"
-            "2. Quasi-Identifiers (Do not directly identify an individual but can be used in combination to do so, e.g., age, gender, zip code, job title, IP address)\n"
-            "3. Sensitive Attributes (Highly confidential data that can cause harm or discrimination if exposed, e.g., medical history, financial data, criminal record, political views)\n"
-            "4. Neither (Columns that do not fall into any of the above categories)\n"
-            "Return the output as a valid JSON object with double quotes, formatted as follows: \n"
-            "{ \"personal_identifiers\": [...], \"quasi_identifiers\": [...], \"sensitive_attributes\": [...], \"neither\": [...] }\n"
-            "DO NOT INVENT COLUMN NAMES. Only classify the provided column names."
-            f"Column names: {column_names}"
-        )
+class GeminiBackend:
+    """Gemini model; the client library and the API key are only loaded on first use."""
+    def __init__(self, model_name='gemini-2.0-flash'):
+        self.model_name = model_name
+        self.model = None
+
+    def _load(self):
+        import google.generativeai as genai
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        GEMINI_PRO_API_KEY = os.getenv('GEMINI_PRO_API_KEY')
+        if not GEMINI_PRO_API_KEY:
+            raise ValueError("GEMINI_PRO_API_KEY is missing from environment variables.")
+        genai.configure(api_key=GEMINI_PRO_API_KEY)
+        self.model = genai.GenerativeModel(self.model_name)
 
-        response = self.model.generate_content(
+    async def complete(self, prompt):
+        if self.model is None:
+            self._load()
+        response = await self.model.generate_content_async(
             prompt,
             generation_config={
                 "temperature": 0.3,
@@ -51,28 +71,207 @@ class DetectIdentifiers:
                 "max_output_tokens": 500,
             }
         )
+        return response.text
+
+
+class StubBackend:
+    """
+    Local stand-in for the model, classifying column names by keywords; `calls`
+    counts the prompts it answered.
+    """
+    KEYWORDS = {
+        "personal_identifiers": ("name", "phone", "email", "ssn", "passport", "address"),
+        "quasi_identifiers": ("age", "gender", "sex", "zip", "postcode", "dob", "birth", "job", "ip", "city"),
+        "sensitive_attributes": ("diagnosis", "disease", "medical", "salary", "income", "religion", "criminal"),
+    }
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    async def complete(self, prompt):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        column_names = ast.literal_eval(prompt[prompt.rindex("Column names: ") + len("Column names: "):])
+        result = {cls: [] for cls in CLASSES}
+        for name in column_names:
+            cls = next((cls for cls, words in self.KEYWORDS.items() if any(w in name.lower() for w in words)), "neither")
+            result[cls].append(name)
+        return json.dumps(result)
+
+
+class ColumnClassCache:
+    """
+    Column name -> class, least recently used evicted beyond `max_entries`; with a
+    `path` the cache is kept in that JSON file across restarts (see `save`).
+    """
+    def __init__(self, max_entries=10_000, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self._entries.update(json.load(f))
+
+    @staticmethod
+    def key(name):
+        return str(name).strip().lower()
+
+    def get(self, name):
+        with self._lock:
+            cls = self._entries.get(self.key(name))
+            if cls is not None:
+                self._entries.move_to_end(self.key(name))
+            return cls
+
+    def update(self, classes, save=True):
+        """Cache {column name: class}; with `save` the file is written too."""
+        with self._lock:
+            for name, cls in classes.items():
+                self._entries[self.key(name)] = cls
+                self._entries.move_to_end(self.key(name))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if save:
+            self.save()
+
+    def save(self):
+        """Write the cache to `path`; this blocks, so event loops run it in a thread."""
+        if not self.path:
+            return
+        # one writer at a time, each writing the entries as of its turn
+        with self._save_lock:
+            with self._lock:
+                entries = dict(self._entries)
+            # written to a temporary file first so a crash never leaves a partial cache
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp, self.path)
+
+
+class _LoopBatch:
+    """Names waiting for the next prompt, and the concurrency limit, of one event loop."""
+    def __init__(self, max_concurrency):
+        self.pending = {}
+        self.leader = None
+        self.sending = set()  # the event loop only keeps weak references to tasks
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+
+class LLMAttributeClassifier:
+    """
+    Column classification by a language model `backend` (an object with
+    `async complete(prompt) -> str`), behind a column-name cache.
+    Names already cached are answered without any call. Uncached names requested
+    within `batch_window` seconds, by any number of concurrent requests, go out
+    together in one prompt (at most `max_batch` names); at most `max_concurrency`
+    prompts run at once and each is abandoned after `timeout` seconds.
+    """
+    def __init__(self, backend=None, cache=None, max_concurrency=4, timeout=30.0, batch_window=0.05, max_batch=200):
+        self.backend = backend or GeminiBackend()
+        self.cache = cache or ColumnClassCache()
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._batches = weakref.WeakKeyDictionary()
+
+    def _batch(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._batches:
+            self._batches[loop] = _LoopBatch(self.max_concurrency)
+        return self._batches[loop]
+
+    async def classify(self, column_names):
+        """{class: [column names]} for `column_names`, in their order."""
+        classes = {name: self.cache.get(name) for name in column_names}
+        missing = [name for name, cls in classes.items() if cls is None]
+        if missing:
+            batch = self._batch()
+            loop = asyncio.get_running_loop()
+            futures = {}
+            for name in missing:
+                key = ColumnClassCache.key(name)
+                if key not in batch.pending:
+                    batch.pending[key] = (name, loop.create_future())
+                futures[name] = batch.pending[key][1]
+            if batch.leader is None:
+                batch.leader = asyncio.ensure_future(self._send(batch))
+                batch.sending.add(batch.leader)
+                batch.leader.add_done_callback(batch.sending.discard)
+            for name, future in futures.items():
+                classes[name] = await future
+
+        result = {cls: [] for cls in CLASSES}
+        for name in column_names:
+            result[classes[name]].append(name)
+        return result
+
+    async def _send(self, batch):
+        """Wait for the batch window, then send every pending name, `max_batch` per prompt."""
+        await asyncio.sleep(self.batch_window)
+        pending, batch.pending, batch.leader = batch.pending, {}, None
+        items = list(pending.values())
+        await asyncio.gather(*(self._prompt(batch, items[i:i + self.max_batch])
+                               for i in range(0, len(items), self.max_batch)))
+
+    async def _prompt(self, batch, items):
+        names = [name for name, _ in items]
+        try:
+            async with batch.semaphore:
+                text = await asyncio.wait_for(self.backend.complete(build_prompt(names)), self.timeout)
+            answer = parse_response(text)
+            classes = {ColumnClassCache.key(name): cls for cls in CLASSES for name in answer.get(cls, [])}
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        # names the model left out are reported as "neither" but not cached
+        self.cache.update({name: classes[ColumnClassCache.key(name)] for name in names
+                           if ColumnClassCache.key(name) in classes}, save=False)
+        # written before answering so a caller's event loop never closes on a pending write
+        if self.cache.path:
+            await asyncio.to_thread(self.cache.save)
+        for name, future in items:
+            if not future.done():
+                future.set_result(classes.get(ColumnClassCache.key(name), "neither"))
+
+
+class DetectIdentifiers:
+    """Blocking front end of LLMAttributeClassifier, one call per dataset."""
+    def __init__(self, classifier=None):
+        self.classifier = classifier or LLMAttributeClassifier()
+
+    def clean_json_string(self, json_string):
+        return clean_json_string(json_string)
+
+    def detect_identifiers(self, column_names):
+
+        if not column_names:
+            return {"error": "No column names provided."}
 
         try:
-            cleaned=self.clean_json_string(response.text)
-            identifiers = json.loads(cleaned)
-            nb_personal_identifiers = len(identifiers.get("personal_identifiers", []))
-            nb_quasi_identifiers = len(identifiers.get("quasi_identifiers", []))
-            nb_sensitive_attributes = len(identifiers.get("sensitive_attributes", []))
-        except json.JSONDecodeError:
-            try:
-                # Fallback: Use ast.literal_eval() for improperly formatted JSON
-                identifiers = ast.literal_eval(response.text)
-                print(identifiers)
-            except Exception as e:
-                identifiers = {"error": f"Failed to parse response from AI: {str(e)}"}
+            identifiers = asyncio.run(self.classifier.classify(list(column_names)))
+        except asyncio.TimeoutError:
+            identifiers = {"error": "The language model did not answer in time."}
+        except Exception as e:
+            identifiers = {"error": f"Failed to parse response from AI: {str(e)}"}
 
+        nb_personal_identifiers = len(identifiers.get("personal_identifiers", []))
+        nb_quasi_identifiers = len(identifiers.get("quasi_identifiers", []))
+        nb_sensitive_attributes = len(identifiers.get("sensitive_attributes", []))
         return identifiers, nb_personal_identifiers, nb_quasi_identifiers, nb_sensitive_attributes
 
 
 if __name__ == "__main__":
-    
+
     detector = DetectIdentifiers()
-    
+
     script_dir = os.path.dirname(__file__)
     data_path = os.path.join(script_dir, '..', 'data', 'test', 'healthcare_dataset.csv')
 
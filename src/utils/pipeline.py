@@ -0,0 +1,226 @@
+from src.utils.algorithmic_attribute_classification import (
+    AttributeClassification, QID_RISK_BAND, QID_SEARCH_K, SA_RISK_BAND,
+)
+from src.utils.adversary_success import AdversarySuccessMetrics
+from src.utils.data_similarity import DataSimilarity
+from src.utils.info_gain_loss import InformationGainLoss
+from src.utils.uncentainty import Uncertainty
+from src.utils.equivalence_classes import EquivalenceClassIndex
+from src.utils.column_profile import DatasetProfile
+from src.utils.encoded import EncodedDataset
+from src.utils.generalization import GeneralizationWhatIf
+from src.utils.record_risk import RecordRiskExport
+
+
+# stages reported to `progress` callbacks, in order
+STAGES = ("classification", "qid_search", "equivalence_classes", "adversary_success", "data_similarity",
+          "information_gain", "uncertainty")
+
+
+def _report(progress, stage):
+    if progress is not None:
+        progress(stage)
+
+
+def _note(progress, **counts):
+    """Counts of the running stage, for progress callbacks that take them (StageTrace)."""
+    note = getattr(progress, "note", None)
+    if note is not None:
+        note(**counts)
+
+
+def _round_matrix(matrix):
+    return {row: {col: None if value is None else round(value, 4) for col, value in cells.items()}
+            for row, cells in matrix.items()}
+
+
+def compute_privacy_metrics(data, attributes, weights=None, row_counts=None, approximate=False, indexes=None,
+                            progress=None, population=None, profiles=None, encoded=None):
+    """
+    Every /calcul metric for an attribute classification.
+    `data` holds raw records, or one row per distinct QID/SA combination with
+    `weights` records each; `row_counts` (records per distinct row) then stands
+    in for the raw frame in delta presence.
+    `approximate` estimates the SA uncertainty from sketches and reports the bounds.
+    `indexes` ({(QIDs, SAs): EquivalenceClassIndex}) reuses indexes built on the same data.
+    `progress` is called with the name of each stage (see STAGES) as it starts.
+    `population` (DataFrame or CSV path) switches delta presence to the published
+    records' presence in that population, with per-class bounds.
+    `profiles` (DatasetProfile) shares the column profiles of classification.
+    `encoded` (EncodedDataset of `data`) supplies the class index with ready codes.
+    """
+    QIDs = attributes.get("QIDs", [])
+    SAs = attributes.get("SAs", [])
+
+    result = {"attribute_classification": attributes}
+
+    if not QIDs or not SAs:
+        result["error"] = "Insufficient QIDs or SAs for full metric computation."
+        return result
+
+    # QID hashing happens once here; every QID-based metric reads these classes
+    _report(progress, "equivalence_classes")
+    index_key = (tuple(QIDs), tuple(SAs))
+    index = indexes.get(index_key) if indexes is not None else None
+    if index is None:
+        index = EquivalenceClassIndex(data, QIDs, SAs, weights=weights, encoded=encoded)
+        if indexes is not None:
+            indexes[index_key] = index
+    _note(progress, equivalence_classes=int(index.n_classes))
+
+    _report(progress, "adversary_success")
+    adversary = AdversarySuccessMetrics(data, QIDs, index=index)
+    result["adversary_success_rate"] = adversary.adversary_success_rate()
+    if population is not None:
+        result["delta_presence"] = adversary.delta_presence_population(population)
+    elif row_counts is None:
+        result["delta_presence"] = adversary.delta_presence(data)
+    else:
+        result["delta_presence"] = adversary.delta_presence_from_counts(row_counts)
+
+    _report(progress, "data_similarity")
+    # top-level k/l/t figures describe the first SA; per_sa_metrics covers every SA
+    similarities = {sa: DataSimilarity(data, QIDs, sa, index=index) for sa in SAs}
+    data_similarity = similarities[SAs[0]]
+    result["k_anonymity"] = int(data_similarity.k_anonymity())
+    alpha, k = data_similarity.alpha_k_anonymity()
+    result["alpha_k_anonymity"] = {"alpha": round(float(alpha), 4), "k": int(k)}
+    result["l_diversity"] = float(data_similarity.l_diversity())
+    result["t_closeness"] = float(round(data_similarity.t_closeness(), 4))
+
+    _report(progress, "information_gain")
+    info_gain = InformationGainLoss(data, QIDs, SAs, index=index)
+    result["mutual_information"] = float(round(info_gain.calculate_mutual_information(), 4))
+    mi_matrix, nmi_matrix = info_gain.mutual_information_matrix()
+    result["mutual_information_matrix"] = _round_matrix(mi_matrix)
+    result["normalized_mutual_information_matrix"] = _round_matrix(nmi_matrix)
+    result["joint_mutual_information"] = {
+        sa: {"mutual_information": round(mi, 4), "normalized": round(normalized, 4)}
+        for sa, (mi, normalized) in info_gain.joint_mutual_information().items()
+    }
+    result["privacy_score_entropy"] = float(round(info_gain.calculate_privacy_score(), 4))
+
+    _report(progress, "uncertainty")
+    uncertainty = Uncertainty(data, SAs, weights=weights, approximate=approximate, index=index, profiles=profiles)
+    entropy, min_entropy, norm_entropy = uncertainty.uncertainty_calculate_all()
+    result["uncertainty_metrics"] = {
+        "avg_entropy": float(round(entropy, 4)),
+        "avg_min_entropy": float(round(min_entropy, 4)),
+        "avg_normalized_entropy": float(round(norm_entropy, 4))
+    }
+
+    result["per_sa_metrics"] = {}
+    for sa, similarity in similarities.items():
+        sa_entropy, sa_min_entropy, sa_norm_entropy = uncertainty.measures(data[sa])
+        result["per_sa_metrics"][sa] = {
+            "l_diversity": float(similarity.l_diversity()),
+            "t_closeness": float(round(similarity.t_closeness(), 4)),
+            "conditional_entropy": round(info_gain.conditional_entropy(sa), 4),
+            "entropy": float(round(sa_entropy, 4)),
+            "min_entropy": float(round(sa_min_entropy, 4)),
+            "normalized_entropy": float(round(sa_norm_entropy, 4)),
+        }
+    if uncertainty.approximate:
+        result["uncertainty_bounds"] = uncertainty.error_bounds
+
+    return result
+
+
+def encode_dataframe(df, artifacts=None):
+    """EncodedDataset of `df`, reused from and kept in `artifacts` (see ResultCache.artifacts)."""
+    encoded = None if artifacts is None else artifacts.get("encoded")
+    if encoded is None:
+        encoded = EncodedDataset.from_frame(df)
+        if artifacts is not None:
+            artifacts["encoded"] = encoded
+    return encoded
+
+
+def evaluate_dataframe(df, filename, approximate=False, artifacts=None, progress=None, population=None,
+                       encoded=None):
+    """
+    Classify the attributes of an in-memory dataset and compute every metric.
+    `approximate` switches the per-column statistics (g-distinct risk, entropies)
+    to fixed-memory sketches; QID class metrics stay exact.
+    `artifacts` is a dict kept per file content (see ResultCache.artifacts); column
+    profiles, the encoded dataset and equivalence class indexes found there are
+    reused, new ones added.
+    `encoded` is the EncodedDataset of `df` when the caller already has it; the
+    dataset is otherwise encoded once here and every metric reads its codes. With
+    `approximate` the columns are sketched instead, so only the QID and SA columns
+    are encoded (by the class index), unless `artifacts` already holds the dataset.
+    """
+    _report(progress, "classification")
+    if encoded is None and artifacts is not None:
+        encoded = artifacts.get("encoded")
+    if encoded is None and not approximate:
+        encoded = encode_dataframe(df, artifacts)
+
+    profile_key = ("profiles", approximate)
+    profiles = None if artifacts is None else artifacts.get(profile_key)
+    if profiles is None and not approximate:
+        profiles = DatasetProfile.from_encoded(encoded)
+    classifier = AttributeClassification(df, filename, approximate=approximate, profiles=profiles)
+    attributes = classifier.run_on_csv(progress=progress)
+    if artifacts is not None:
+        artifacts[profile_key] = classifier.column_profiles()
+
+    indexes = None if artifacts is None else artifacts.setdefault("indexes", {})
+    return compute_privacy_metrics(df, attributes, approximate=approximate, indexes=indexes, progress=progress,
+                                   population=population, profiles=classifier.column_profiles(), encoded=encoded)
+
+
+def evaluation_options(approximate=False, population=None):
+    """Every setting that changes an evaluate_dataframe result, for cache keys."""
+    return {"approximate": approximate, "beta": QID_RISK_BAND, "alpha": SA_RISK_BAND, "k": QID_SEARCH_K,
+            "population": population}
+
+
+def evaluate_generalizations(df, filename, hierarchies, k=QID_SEARCH_K, qids=None, max_nodes=None):
+    """
+    What-if analysis of generalizing the QIDs with `hierarchies` ({column: Hierarchy}).
+    The QIDs are the classified QID candidates (or `qids`); the result holds the
+    minimal-loss generalizations reaching `k`-anonymity, next to the subset of those
+    QIDs the QID search keeps without generalizing anything. `truncated` tells
+    whether `max_nodes` stopped the search before it covered the lattice.
+    """
+    classifier = AttributeClassification(df, filename)
+    classifier.classify_attributes()
+    qids = list(qids) if qids else list(classifier.qids)
+    missing = [col for col in qids + list(hierarchies) if col not in df.columns]
+    if missing:
+        raise ValueError(f"Unknown columns: {missing}")
+    what_if = GeneralizationWhatIf(df, qids, classifier.sas, hierarchies)
+    frontier = what_if.minimal_levels(k, max_nodes=max_nodes)
+    # the QID search runs over the QIDs being generalized, not the classified ones
+    classifier.qids = qids
+    return {
+        "QIDs": qids,
+        "SAs": classifier.sas,
+        "k": k,
+        "heights": {col: what_if.hierarchies[col].height for col in qids},
+        "optimal_qid_dimension": classifier.identify_optimal_qid_dimension(k=k),
+        "evaluated": what_if.evaluated,
+        "truncated": what_if.truncated,
+        "best": frontier[0] if frontier else None,
+        "minimal_generalizations": frontier,
+    }
+
+
+def record_risk_export(df, filename, qids=None, id_column=None, artifacts=None):
+    """
+    Per-record risk export (RecordRiskExport) over the classified QIDs (after the QID
+    search) or over `qids`; `id_column` values are exported with each record.
+    `artifacts` shares the encoded dataset and column profiles of earlier evaluations.
+    """
+    encoded = encode_dataframe(df, artifacts)
+    if not qids:
+        profiles = None if artifacts is None else artifacts.get(("profiles", False))
+        classifier = AttributeClassification(df, filename, profiles=profiles or DatasetProfile.from_encoded(encoded))
+        classifier.classify_attributes()
+        qids = classifier.identify_optimal_qid_dimension(k=QID_SEARCH_K)
+    missing = [col for col in list(qids) + ([id_column] if id_column else []) if col not in df.columns]
+    if missing:
+        raise ValueError(f"Unknown columns: {missing}")
+    index = EquivalenceClassIndex(df, qids, encoded=encoded)
+    return RecordRiskExport(index, ids=df[id_column] if id_column else None)
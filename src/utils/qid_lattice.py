@@ -0,0 +1,196 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.utils.equivalence_classes import combine_codes
+
+
+class QIDLatticeSearch:
+    """
+    Search the lattice of QID subsets for the k-anonymous subset with the best
+    privacy gain (PG) and non-uniform entropy (NUE).
+
+    Subsets are walked depth-first, each set extended only with columns that come
+    before its lowest member, so every subset of a set is visited before the set.
+    Adding a column can only split equivalence classes, so a superset of a failing
+    set fails too and is pruned without being grouped. Rows with a missing QID are
+    dropped from the classes (as groupby / pycanon do), so the rule is only applied
+    through columns without missing values.
+    Group codes of a set are derived from its parent's codes by adding one column.
+    `weights` lets each row of `df` stand for several records (a class-count table).
+    max_subsets and max_seconds bound the whole search: with n_jobs > 1 the workers
+    draw evaluations from one shared counter and stop at one shared deadline, so at
+    most max_subsets sets are grouped in total (which ones depends on scheduling).
+    """
+    def __init__(self, df, qids, entropies, k=3, max_seconds=None, max_subsets=None, n_jobs=1, weights=None):
+        self.qids = list(qids)
+        self.entropies = entropies
+        self.k = k
+        self.max_seconds = max_seconds
+        self.max_subsets = max_subsets
+        self.n_jobs = n_jobs
+        self.weights = None if weights is None else np.asarray(weights, dtype=np.int64)
+        self.n_rows = len(df) if weights is None else int(self.weights.sum())
+
+        # missing values are kept as their own code (0) so uniqueness matches DataFrame.duplicated
+        self.codes, self.cards, self.nan_masks = [], [], []
+        for col in self.qids:
+            codes, uniques = pd.factorize(df[col])
+            nan = codes < 0
+            self.codes.append(codes.astype(np.int64) + 1)
+            self.cards.append(len(uniques) + 1)
+            self.nan_masks.append(nan if nan.any() else None)
+
+        self.status = {}
+        self.scores = {}
+        self.evaluated = 0
+        self.pruned = 0
+        self.exhausted = False
+        # evaluations of all workers against max_subsets (a multiprocessing.Value in workers)
+        self._shared_evaluated = None
+
+    def _out_of_budget(self):
+        if self._deadline is not None and time.time() >= self._deadline:
+            self.exhausted = True
+        return self.exhausted
+
+    def _claim(self):
+        """Count one evaluation against max_subsets; False once the budget is spent."""
+        if self.max_subsets is None:
+            return True
+        if self._shared_evaluated is None:
+            claimed = self.evaluated < self.max_subsets
+        else:
+            with self._shared_evaluated.get_lock():
+                claimed = self._shared_evaluated.value < self.max_subsets
+                if claimed:
+                    self._shared_evaluated.value += 1
+        if not claimed:
+            self.exhausted = True
+        return claimed
+
+    def _members(self, mask):
+        return tuple(i for i in range(len(self.qids)) if mask >> i & 1)
+
+    def _extend(self, base, mask):
+        """Group codes for `mask`, built from the nearest evaluated ancestor."""
+        codes, n_groups, nan_rows, base_mask = base
+        for i in self._members(mask & ~base_mask):
+            if codes is None:
+                codes, n_groups = self.codes[i], self.cards[i]
+            else:
+                codes, n_groups = combine_codes(codes, self.codes[i], self.cards[i])
+            if self.nan_masks[i] is not None:
+                nan_rows = self.nan_masks[i] if nan_rows is None else nan_rows | self.nan_masks[i]
+        return codes, n_groups, nan_rows, mask
+
+    def _class_stats(self, codes, n_groups, nan_rows):
+        """(k over classes without missing values, share of unique records)."""
+        sizes = np.bincount(codes, weights=self.weights, minlength=n_groups).astype(np.int64)
+        uniqueness = (sizes == 1).sum() / self.n_rows
+        if nan_rows is not None:
+            complete = np.ones(n_groups, dtype=bool)
+            complete[codes[nan_rows]] = False
+            sizes = sizes[complete]
+        sizes = sizes[sizes > 0]
+        return (sizes.min() if len(sizes) else None), uniqueness
+
+    def _is_pruned(self, mask):
+        for i in self._members(mask):
+            sub = mask & ~(1 << i)
+            if not sub or self.nan_masks[i] is not None:
+                continue
+            # subsets outside the part of the lattice searched by this process are unknown
+            if self.status.get(sub) is False:
+                return True
+        return False
+
+    def _visit(self, mask, lowest, base, descend=True):
+        if self._out_of_budget():
+            return
+        if self._is_pruned(mask):
+            self.status[mask] = False
+            self.pruned += 1
+            state = base
+            # children only escape pruning through columns with missing values
+            if all(self.nan_masks[j] is None for j in range(lowest)):
+                return
+        else:
+            if not self._claim():
+                return
+            state = self._extend(base, mask)
+            k_val, uniqueness = self._class_stats(*state[:3])
+            self.evaluated += 1
+            passes = bool(k_val is not None and k_val >= self.k)
+            self.status[mask] = passes
+            if passes:
+                members = self._members(mask)
+                nue = sum(self.entropies[self.qids[i]] for i in members) / len(members)
+                self.scores[members] = (self.original_uniqueness - uniqueness, nue)
+
+        if descend:
+            for j in range(lowest):
+                self._visit(mask | 1 << j, j, state)
+
+    def _tasks(self):
+        """Split the lattice into subtrees of at most ~1/(4 * n_jobs) of its sets."""
+        target = 2 ** len(self.qids) / (4 * self.n_jobs)
+        tasks, pending = [], [(1 << j, j) for j in range(len(self.qids))]
+        while pending:
+            mask, lowest = pending.pop()
+            if 2 ** lowest > target:
+                tasks.append((mask, lowest, False))
+                pending.extend((mask | 1 << j, j) for j in range(lowest))
+            else:
+                tasks.append((mask, lowest, True))
+        return tasks
+
+    def run(self):
+        """Return (best subset or None, PG, NUE)."""
+        self._deadline = None if self.max_seconds is None else time.time() + self.max_seconds
+        full = self._extend((None, 1, None, 0), (1 << len(self.qids)) - 1)
+        _, self.original_uniqueness = self._class_stats(*full[:3])
+
+        if self.n_jobs and self.n_jobs > 1:
+            # workers inherit the column codes once; only masks and scores cross processes
+            evaluated = multiprocessing.Value("q", 0)
+            with ProcessPoolExecutor(max_workers=self.n_jobs, initializer=_init_worker,
+                                     initargs=(self, evaluated)) as executor:
+                for scores, evaluated, pruned, exhausted in executor.map(_search_subtree, self._tasks()):
+                    self.scores.update(scores)
+                    self.evaluated += evaluated
+                    self.pruned += pruned
+                    self.exhausted |= exhausted
+        else:
+            for j in range(len(self.qids)):
+                self._visit(1 << j, j, (None, 1, None, 0))
+
+        # same pick as a level-by-level sweep over itertools.combinations
+        best_pg, best_nue, best = -np.inf, -np.inf, None
+        for members in sorted(self.scores, key=lambda m: (len(m), m)):
+            pg, nue = self.scores[members]
+            if pg > best_pg and nue > best_nue:
+                best_pg, best_nue, best = pg, nue, [self.qids[i] for i in members]
+        return best, best_pg, best_nue
+
+
+_WORKER_SEARCH = None
+
+
+def _init_worker(search, evaluated):
+    global _WORKER_SEARCH
+    search._shared_evaluated = evaluated
+    _WORKER_SEARCH = search
+
+
+def _search_subtree(task):
+    """Search one subtree of the lattice in a worker process."""
+    mask, lowest, descend = task
+    search = _WORKER_SEARCH
+    evaluated, pruned = search.evaluated, search.pruned
+    search.scores = {}
+    search._visit(mask, lowest, (None, 1, None, 0), descend=descend)
+    return search.scores, search.evaluated - evaluated, search.pruned - pruned, search.exhausted
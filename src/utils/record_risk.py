@@ -0,0 +1,131 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from src.utils.equivalence_classes import combine_codes
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only stream whose bytes are handed out as they are written, keeping its position."""
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+class RecordRiskExport:
+    """
+    Per-record re-identification risk, generated lazily from an EquivalenceClassIndex.
+    Each record gets its class size, risk 1 / class size, whether it is unique, and for
+    unique records the QIDs that make it so: those without which it would share its
+    values with another record. Only per-class arrays are precomputed; records are
+    produced `chunk_rows` at a time, so memory per chunk does not grow with the data.
+    Records with a missing QID belong to no class and get no risk.
+    """
+    def __init__(self, index, ids=None):
+        self.index = index
+        self.ids = ids
+        self.qids = list(index.qids)
+        self.identifying = self._identifying_masks()
+
+    def _identifying_masks(self):
+        """Per class, a bitmask of the QIDs whose removal makes its record non-unique."""
+        index = self.index
+        unique = index.sizes == 1
+        masks = np.zeros(index.n_classes, dtype=np.int64)
+        if not unique.any():
+            return masks
+        valid = index.group >= 0
+        representative = np.zeros(index.n_classes, dtype=np.int64)
+        representative[index.group[valid]] = np.flatnonzero(valid)
+        for bit, qid in enumerate(self.qids):
+            others = [col for col in self.qids if col != qid]
+            if others:
+                group = index.codes[others[0]]
+                for col in others[1:]:
+                    group, _ = combine_codes(group, index.codes[col], len(index.uniques[col]))
+            else:
+                group = np.zeros(len(index.group), dtype=np.int64)
+            present = group >= 0
+            weights = None if index.weights is None else index.weights[present]
+            sizes = np.bincount(group[present], weights=weights)
+            shared = sizes[group[representative]] > 1
+            masks[unique & shared] |= 1 << bit
+        return masks
+
+    def _names(self, masks):
+        """QID names of each bitmask, one lookup per distinct mask."""
+        distinct, inverse = np.unique(masks, return_inverse=True)
+        names = [[qid for bit, qid in enumerate(self.qids) if mask >> bit & 1] for mask in distinct]
+        return [names[i] for i in inverse]
+
+    def chunks(self, chunk_rows=100_000):
+        """Per-record risk frames of `chunk_rows` records, in record order."""
+        group = self.index.group
+        for start in range(0, len(group), chunk_rows):
+            classes = group[start:start + chunk_rows]
+            valid = classes >= 0
+            sizes = np.where(valid, self.index.sizes[np.maximum(classes, 0)], 0)
+            chunk = {"row": np.arange(start, start + len(classes))}
+            if self.ids is not None:
+                chunk["id"] = np.asarray(self.ids[start:start + chunk_rows])
+            class_size = pd.array(sizes, dtype="Int64")
+            class_size[~valid] = pd.NA
+            chunk["class_size"] = class_size
+            chunk["risk"] = np.where(valid, 1 / np.maximum(sizes, 1), np.nan)
+            chunk["unique"] = valid & (sizes == 1)
+            chunk["identifying_qids"] = self._names(np.where(valid, self.identifying[np.maximum(classes, 0)], 0))
+            yield pd.DataFrame(chunk)
+
+    def ndjson(self, chunk_rows=100_000):
+        for chunk in self.chunks(chunk_rows):
+            yield chunk.to_json(orient="records", lines=True).rstrip("\n").encode() + b"\n"
+
+    def csv(self, chunk_rows=100_000):
+        for i, chunk in enumerate(self.chunks(chunk_rows)):
+            chunk["identifying_qids"] = chunk["identifying_qids"].map("|".join)
+            yield chunk.to_csv(index=False, header=i == 0).encode()
+
+    def parquet(self, chunk_rows=100_000):
+        """One Parquet row group per chunk; needs pyarrow."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        sink = _DrainableSink()
+        writer = None
+        for chunk in self.chunks(chunk_rows):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(sink, table.schema)
+            writer.write_table(table)
+            yield sink.drain()
+        if writer is not None:
+            writer.close()
+            yield sink.drain()
+
+    def stream(self, fmt="ndjson", chunk_rows=100_000):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt} (expected one of {sorted(EXPORT_FORMATS)})")
+        if fmt == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ValueError("Parquet export needs pyarrow; use ndjson or csv.")
+        return getattr(self, fmt)(chunk_rows)
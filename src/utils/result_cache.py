@@ -0,0 +1,134 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+CACHE_FORMAT = 1
+
+
+def _json_default(value):
+    # numpy scalars and arrays
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+class ResultCache:
+    """
+    Content-addressed cache of evaluation results.
+    Keys hash the uploaded bytes together with every option that changes the result,
+    so a re-submitted file is answered without recomputation. Entries are evicted
+    least-recently-used beyond `max_entries` and expire after `ttl_seconds`; with a
+    `directory` they are also written there as JSON and survive restarts.
+    Per-file intermediate artifacts (column profiles, equivalence class indexes) are
+    kept in memory for the last `max_artifacts` files, so a request that differs only
+    in its options reuses them.
+    """
+    def __init__(self, max_entries=128, ttl_seconds=None, directory=None, max_artifacts=4):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.directory = directory
+        self.max_artifacts = max_artifacts
+        self._entries = OrderedDict()
+        self._artifacts = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._prune_disk()
+
+    @staticmethod
+    def key(content_digest, options):
+        """Cache key for a file digest and the options of the request."""
+        payload = json.dumps({"format": CACHE_FORMAT, "content": content_digest, "options": options},
+                             sort_keys=True, default=_json_default)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _expired(self, created):
+        return self.ttl_seconds is not None and time.time() - created > self.ttl_seconds
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """Cached result for `key`, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self.directory:
+                entry = self._load(key)
+                if entry is not None:
+                    self._entries[key] = entry
+            if entry is not None and self._expired(entry[0]):
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+    def put(self, key, result):
+        with self._lock:
+            entry = (time.time(), copy.deepcopy(result))
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            if self.directory:
+                self._store(key, entry)
+            while len(self._entries) > self.max_entries:
+                oldest, _ = self._entries.popitem(last=False)
+                if self.directory:
+                    self._remove(oldest)
+
+    def artifacts(self, content_digest):
+        """Mutable dict of intermediate artifacts for one file content."""
+        with self._lock:
+            artifacts = self._artifacts.setdefault(content_digest, {})
+            self._artifacts.move_to_end(content_digest)
+            while len(self._artifacts) > self.max_artifacts:
+                self._artifacts.popitem(last=False)
+            return artifacts
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+            self._artifacts.clear()
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        if self.directory:
+            self._remove(key)
+
+    def _load(self, key):
+        try:
+            with open(self._path(key)) as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return payload["created"], payload["result"]
+
+    def _store(self, key, entry):
+        # written to a temporary file first so readers never see a partial entry
+        tmp = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"created": entry[0], "result": entry[1]}, f, default=_json_default)
+        os.replace(tmp, self._path(key))
+
+    def _prune_disk(self):
+        """Keep the newest `max_entries` entries left on disk by earlier runs."""
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".json")]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        for path in paths[self.max_entries:]:
+            os.remove(path)
+
+    def _remove(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
@@ -0,0 +1,80 @@
+import os
+import re
+import threading
+
+CHART_DIR = "src/charts"
+_KEY = re.compile(r"^[0-9a-f]{64}$")
+
+
+def render_risk_chart(risk_scores, out_path, beta, alpha):
+    """Bar chart of the re-identification risk per attribute with the QID (beta) and SA (alpha) bands."""
+    # imported here so the server never loads matplotlib unless a chart is asked for
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    plt.figure(figsize=(10, 5))
+    plt.bar(risk_scores.keys(), risk_scores.values(), color='skyblue')
+    plt.axhline(beta[0], color='orange', linestyle='--', label='QID threshold min')
+    plt.axhline(beta[1], color='orange', linestyle='--', label='QID threshold max')
+    plt.axhline(alpha[0], color='red', linestyle='--', label='SA threshold min')
+    plt.axhline(alpha[1], color='red', linestyle='--', label='SA threshold max')
+    plt.xticks(rotation=45)
+    plt.ylabel("Re-identification Risk Score")
+    plt.title("Privacy Risk Scores per Attribute")
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig(out_path)
+    plt.close()
+    return out_path
+
+
+class ChartCache:
+    """
+    Risk charts rendered on demand and kept on disk under the result cache key they
+    were drawn from. At most `max_files` charts are kept; the least recently served
+    ones are deleted first.
+    """
+    def __init__(self, directory=os.path.join(CHART_DIR, "cache"), max_files=64):
+        self.directory = directory
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def valid_key(key):
+        return bool(_KEY.match(key))
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.png")
+
+    def cached(self, key):
+        """Path of the chart already rendered for `key`, or None."""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def render(self, key, risk_scores, beta, alpha):
+        """Render and keep the chart of `key`; returns its path."""
+        path = self.path(key)
+        os.makedirs(self.directory, exist_ok=True)
+        # rendered under a temporary name so a concurrent request never serves half a file
+        tmp = f"{path}.{threading.get_ident()}.tmp.png"
+        render_risk_chart(risk_scores, tmp, beta, alpha)
+        os.replace(tmp, path)
+        self._evict()
+        return path
+
+    def _evict(self):
+        with self._lock:
+            charts = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                      if self.valid_key(name[:-len(".png")]) and name.endswith(".png")]
+            charts.sort(key=os.path.getmtime, reverse=True)
+            for chart in charts[self.max_files:]:
+                try:
+                    os.remove(chart)
+                except OSError:
+                    pass
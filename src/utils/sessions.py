@@ -0,0 +1,515 @@
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from src.utils.algorithmic_attribute_classification import AttributeClassification, QID_SEARCH_K
+from src.utils.column_profile import ColumnProfile, DatasetProfile
+from src.utils.encoded import EncodedDataset, narrow_codes
+from src.utils.equivalence_classes import SAContingency
+from src.utils.pipeline import compute_privacy_metrics
+
+
+SESSION_FORMAT = 2
+DRIFT_THRESHOLD = 0.05
+
+
+def _grow(array, size):
+    """`array` with room for at least `size` rows along its first axis (capacity doubles)."""
+    if len(array) >= size:
+        return array
+    grown = np.zeros((max(size, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def _row_keys(rows):
+    """One hashable key per row of an integer array."""
+    rows = np.ascontiguousarray(rows)
+    return rows.view(f"V{rows.shape[1] * rows.itemsize}").ravel().tolist()
+
+
+def _ids(table, keys):
+    """Ids of `keys` in `table` (key -> id); new keys are numbered in order of arrival."""
+    return np.fromiter((table.setdefault(key, len(table)) for key in keys), dtype=np.int64, count=len(keys))
+
+
+class SessionClasses:
+    """
+    Equivalence classes of a session's records over its QIDs, kept as count state and
+    updated batch by batch; compute_privacy_metrics reads it as an EquivalenceClassIndex.
+    rows: distinct combinations of the QID and SA codes, with `weights` records each
+    sizes: records per class (rows with a missing QID are in no class)
+    contingency(sa): class x value counts, one entry per (class, value) seen
+    A batch only adds to the rows, classes and entries it touches. Codes are the
+    session's; numeric SAs are read in value order, which is only recomputed after
+    their dictionary grew.
+    """
+    def __init__(self, dictionaries, columns, qids, sas):
+        self.qids = list(qids)
+        self.sas = list(sas)
+        self.dictionaries = dictionaries
+        self.columns = list(dict.fromkeys(self.qids + self.sas))
+        self.positions = [columns.index(col) for col in self.columns]
+        self.n_rows = 0
+        self.row_ids = {}
+        self.class_ids = {}
+        self._codes = {col: np.zeros(0, dtype=np.int64) for col in self.columns}
+        self._weights = np.zeros(0, dtype=np.int64)
+        self._sizes = np.zeros(0, dtype=np.int64)
+        self.entry_ids = {sa: {} for sa in self.sas}
+        self._entries = {sa: np.zeros((0, 3), dtype=np.int64) for sa in self.sas}  # class, value, records
+        self._totals = {sa: np.zeros(0, dtype=np.int64) for sa in self.sas}
+        self._orders = {}
+        self._ranked = {}
+        self._snapshot()
+
+    @property
+    def n_classes(self):
+        return len(self.class_ids)
+
+    def add(self, records, counts):
+        """Fold in distinct session records (rows of codes of every column) and their counts."""
+        rows, inverse = np.unique(records[:, self.positions], axis=0, return_inverse=True)
+        weights = np.bincount(inverse.ravel(), weights=counts, minlength=len(rows)).astype(np.int64)
+        self.n_rows += int(weights.sum())
+
+        ids = _ids(self.row_ids, _row_keys(rows))
+        self._weights = _grow(self._weights, len(self.row_ids))
+        for j, col in enumerate(self.columns):
+            self._codes[col] = _grow(self._codes[col], len(self.row_ids))
+            self._codes[col][ids] = rows[:, j]
+        self._weights[ids] += weights
+
+        q = len(self.qids)
+        complete = (rows[:, :q] >= 0).all(axis=1)
+        classes = np.full(len(rows), -1, dtype=np.int64)
+        classes[complete] = _ids(self.class_ids, _row_keys(rows[complete, :q]))
+        self._sizes = _grow(self._sizes, self.n_classes)
+        np.add.at(self._sizes, classes[complete], weights[complete])
+
+        for sa in self.sas:
+            values = rows[:, self.columns.index(sa)]
+            seen = complete & (values >= 0)
+            keys = list(zip(classes[seen].tolist(), values[seen].tolist()))
+            entries = _grow(self._entries[sa], len(self.entry_ids[sa]) + len(keys))
+            entry = _ids(self.entry_ids[sa], keys)
+            entries[entry, 0] = classes[seen]
+            entries[entry, 1] = values[seen]
+            np.add.at(entries[:, 2], entry, weights[seen])
+            self._entries[sa] = entries
+            self._totals[sa] = _grow(self._totals[sa], self.n_classes)
+            np.add.at(self._totals[sa], classes[seen], weights[seen])
+        self._snapshot()
+        return self
+
+    def _order(self, col):
+        """(uniques, rank of each session code or None) of a column, rebuilt when its dictionary grew."""
+        size = len(self.dictionaries[col])
+        cached = self._orders.get(col)
+        if cached is None or cached[0] != size:
+            uniques, rank = pd.Index(list(self.dictionaries[col])), None
+            if col in self.sas and pd.api.types.is_numeric_dtype(uniques.dtype):
+                order = np.argsort(uniques.to_numpy(), kind="stable")
+                rank = np.empty(len(order), dtype=np.int64)
+                rank[order] = np.arange(len(order))
+                uniques = uniques[order]
+            cached = self._orders[col] = (size, uniques, rank)
+        return cached[1], cached[2]
+
+    def _column_codes(self, col, rank):
+        """Row codes of a column, in value order when `rank` is given (only new rows are mapped again)."""
+        n = len(self.row_ids)
+        codes = self._codes[col][:n]
+        if rank is None:
+            return codes
+        cached = self._ranked.get(col)
+        if cached is None or cached[0] != len(rank):
+            start, ranked = 0, np.zeros(n, dtype=np.int64)
+        else:
+            start, ranked = cached[1], _grow(cached[2], n)
+        part = codes[start:]
+        ranked[start:n] = np.where(part >= 0, rank[np.maximum(part, 0)] if len(rank) else -1, -1)
+        self._ranked[col] = (len(rank), n, ranked)
+        return ranked[:n]
+
+    def _snapshot(self):
+        """The EquivalenceClassIndex attributes read by the metrics."""
+        self.weights = self._weights[:len(self.row_ids)]
+        self.sizes = self._sizes[:self.n_classes]
+        self.uniques, self.codes = {}, {}
+        for col in self.columns:
+            self.uniques[col], rank = self._order(col)
+            self.codes[col] = self._column_codes(col, rank)
+        self._contingency = {}
+
+    def contingency(self, sa):
+        if sa not in self._contingency:
+            entries = self._entries[sa][:len(self.entry_ids[sa])]
+            _, rank = self._order(sa)
+            values = entries[:, 1] if rank is None else rank[entries[:, 1]]
+            self._contingency[sa] = SAContingency(
+                entries[:, 0], values, entries[:, 2], self.n_classes, len(self.uniques[sa]),
+                class_totals=self._totals[sa][:self.n_classes],
+            )
+        return self._contingency[sa]
+
+
+class DatasetSession:
+    """
+    Append-only dataset whose metrics are refreshed from count state, never from past rows.
+    The state is an incremental dictionary encoding of the records:
+    dictionaries: per column, value -> code (codes in order of first appearance)
+    value_counts / missing: records per code, and records with a missing value
+    records: every distinct record as a row of codes, with `weights` records each
+    classes: the equivalence classes over the classified QIDs and SAs (SessionClasses)
+    A batch is factorized on its own, and only its new values, distinct records,
+    classes and class x SA counts are added; past values are never hashed again and
+    the metrics are read from the class state. The attribute classification (and the
+    QID search over the distinct records) is only redone when the re-identification
+    risk of some column has moved more than `drift_threshold` since it was last classified.
+    Each append leaves `last_delta`: the batch's new values, distinct records and
+    counts and the refreshed session fields, which `replay` folds into a stored copy.
+    """
+    def __init__(self, filename, drift_threshold=DRIFT_THRESHOLD):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.drift_threshold = drift_threshold
+        self.columns = None
+        self.n_rows = 0
+        self.dictionaries = {}
+        self.value_counts = {}
+        self.missing = {}
+        self.record_ids = {}
+        self.records = np.zeros((0, 0), dtype=np.int32)
+        self.weights = np.zeros(0, dtype=np.int64)
+        self.n_records = 0
+        self.classes = None
+        self.attributes = None
+        self.classified_risk = {}
+        self.batches = 0
+        self.reclassifications = 0
+        self.updated = time.time()
+        self.result = None
+        self.last_delta = None
+        self.lock = threading.Lock()
+
+    # fields an append sets after folding in the records, carried by its delta
+    REFRESHED = ("attributes", "classified_risk", "reclassifications", "batches", "updated", "result")
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"], state["last_delta"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.last_delta = None
+        self.lock = threading.Lock()
+
+    def _start(self, columns):
+        self.columns = list(columns)
+        self.dictionaries = {col: {} for col in self.columns}
+        self.value_counts = {col: np.zeros(0, dtype=np.int64) for col in self.columns}
+        self.missing = {col: 0 for col in self.columns}
+        self.records = np.zeros((0, len(self.columns)), dtype=np.int32)
+
+    def _encode(self, col, values):
+        """(global codes of a batch column, its new values); new values extend the column's dictionary."""
+        dictionary = self.dictionaries[col]
+        size = len(dictionary)
+        local_codes, local_values = pd.factorize(values)
+        mapping = np.fromiter(
+            (dictionary.setdefault(value, len(dictionary)) for value in local_values),
+            dtype=np.int64, count=len(local_values),
+        )
+        codes = np.where(local_codes >= 0, mapping[local_codes] if len(mapping) else -1, -1)
+        return codes, [value for value, code in zip(local_values, mapping) if code >= size]
+
+    def _fold(self, distinct, counts, rows):
+        """Add distinct records (rows of codes) with their counts to the value, record and class counts."""
+        for i, col in enumerate(self.columns):
+            codes = distinct[:, i]
+            present = codes >= 0
+            size = len(self.dictionaries[col])
+            value_counts = _grow(self.value_counts[col], size)
+            value_counts[:size] += np.bincount(codes[present], weights=counts[present], minlength=size).astype(np.int64)
+            self.value_counts[col] = value_counts
+            self.missing[col] += int(counts[~present].sum())
+
+        ids = _ids(self.record_ids, _row_keys(distinct))
+        new = ids >= self.n_records
+        self.n_records = len(self.record_ids)
+        self.records = _grow(self.records, self.n_records)
+        self.weights = _grow(self.weights, self.n_records)
+        self.records[ids[new]] = distinct[new]
+        self.weights[ids] += counts
+        if self.classes is not None:
+            self.classes.add(distinct, counts)
+        self.n_rows += rows
+
+    def append(self, batch):
+        """Fold a batch of new records into the state and return the refreshed metrics."""
+        if self.columns is None:
+            self._start(batch.columns)
+        elif list(batch.columns) != self.columns:
+            raise ValueError(f"Batch columns {list(batch.columns)} do not match the session's {self.columns}.")
+
+        encoded = [self._encode(col, batch[col]) for col in self.columns]
+        codes = np.column_stack([codes for codes, _ in encoded]).astype(np.int32)
+        distinct, counts = np.unique(codes, axis=0, return_counts=True)
+        self._fold(distinct, counts, len(batch))
+
+        self.batches += 1
+        self.updated = time.time()
+        self.result = self.refresh()
+        self.last_delta = {
+            "columns": self.columns,
+            "values": {col: values for col, (_, values) in zip(self.columns, encoded)},
+            "records": distinct,
+            "counts": counts,
+            "rows": len(batch),
+            "refreshed": {name: getattr(self, name) for name in self.REFRESHED},
+        }
+        return self.result
+
+    def replay(self, delta):
+        """Fold in an append recorded as `last_delta` by a copy of this session."""
+        if self.columns is None:
+            self._start(delta["columns"])
+        for col, values in delta["values"].items():
+            dictionary = self.dictionaries[col]
+            for value in values:
+                dictionary[value] = len(dictionary)
+        self._fold(delta["records"], delta["counts"], delta["rows"])
+        self.__dict__.update(delta["refreshed"])
+
+    def encoded(self):
+        """The distinct records as an EncodedDataset; numeric dictionaries are put in value order."""
+        codes, dictionaries = {}, {}
+        for i, col in enumerate(self.columns):
+            values = pd.Index(list(self.dictionaries[col]))
+            column_codes = self.records[:self.n_records, i]
+            if pd.api.types.is_numeric_dtype(values.dtype):
+                order = np.argsort(values.to_numpy(), kind="stable")
+                rank = np.empty(len(order), dtype=np.int64)
+                rank[order] = np.arange(len(order))
+                column_codes = np.where(column_codes >= 0, rank[column_codes] if len(rank) else -1, -1)
+                values = values[order]
+            codes[col] = narrow_codes(column_codes, len(values))
+            dictionaries[col] = values
+        return EncodedDataset(codes, dictionaries, self.n_records)
+
+    def profiles(self):
+        return DatasetProfile(
+            (col, ColumnProfile(col, self.value_counts[col], self.missing[col])) for col in self.columns
+        )
+
+    def drift(self, profiles):
+        """Largest change of a column's re-identification risk since the last classification."""
+        if not self.classified_risk:
+            return float("inf")
+        return max(abs(profiles[col].g_distinct_risk - risk) for col, risk in self.classified_risk.items())
+
+    def class_state(self):
+        """The class state over the classified QIDs and SAs, rebuilt from the distinct records when they change."""
+        qids, sas = self.attributes.get("QIDs", []), self.attributes.get("SAs", [])
+        if not qids or not sas:
+            self.classes = None
+        elif self.classes is None or (self.classes.qids, self.classes.sas) != (list(qids), list(sas)):
+            self.classes = SessionClasses(self.dictionaries, self.columns, qids, sas)
+            self.classes.add(self.records[:self.n_records], self.weights[:self.n_records])
+        return self.classes
+
+    def refresh(self):
+        profiles = self.profiles()
+        drift = self.drift(profiles)
+        reclassified = drift > self.drift_threshold
+        if reclassified:
+            self.attributes = self.reclassify(profiles)
+        classes = self.class_state()
+        indexes = {} if classes is None else {(tuple(classes.qids), tuple(classes.sas)): classes}
+        # the metrics read the class state and the profiles; the frame only names the columns
+        result = compute_privacy_metrics(
+            pd.DataFrame(columns=self.columns), dict(self.attributes),
+            weights=None if classes is None else classes.weights, row_counts=self.weights[:self.n_records],
+            indexes=indexes, profiles=profiles,
+        )
+        result["session"] = {
+            "session_id": self.id,
+            "rows": self.n_rows,
+            "distinct_records": self.n_records,
+            "batches": self.batches,
+            "drift": None if drift == float("inf") else round(drift, 4),
+            "drift_threshold": self.drift_threshold,
+            "reclassified": reclassified,
+            "reclassifications": self.reclassifications,
+        }
+        return result
+
+    def reclassify(self, profiles):
+        """Classify the attributes again and rerun the QID search on the distinct records."""
+        table, weights = self.encoded().frame(), self.weights[:self.n_records]
+        classifier = AttributeClassification(table, self.filename, profiles=profiles)
+        classifier.classify_attributes()
+        attributes = classifier.get_classification()
+        if classifier.qids:
+            classifier.use_class_counts(table, weights)
+            attributes["QIDs"] = classifier.identify_optimal_qid_dimension(k=QID_SEARCH_K)
+        self.classified_risk = dict(classifier.risk_scores)
+        self.reclassifications += 1
+        return attributes
+
+
+class SessionStore:
+    """
+    Dataset sessions by id. At most `max_sessions` are kept in memory, least recently
+    used dropped first, and sessions without an append for `ttl_seconds` expire.
+    With a `directory` every session is kept there across restarts (and reloaded once
+    dropped from memory) as a pickled snapshot plus a log of its appends: an append
+    writes its delta (see DatasetSession.replay), so it costs the size of the batch,
+    and the snapshot is rewritten once the log has grown past it. Without a directory
+    a session dropped from memory is gone.
+    """
+    def __init__(self, directory=None, max_sessions=64, ttl_seconds=None):
+        self.directory = directory
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.sessions = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._expire()
+
+    def _path(self, session_id, suffix=".session"):
+        return os.path.join(self.directory, f"{os.path.basename(session_id)}{suffix}")
+
+    def _expired(self, updated):
+        return self.ttl_seconds is not None and time.time() - updated > self.ttl_seconds
+
+    def create(self, filename, drift_threshold=DRIFT_THRESHOLD):
+        session = DatasetSession(filename, drift_threshold)
+        with self._lock:
+            self._expire()
+            self._keep(session)
+        return session
+
+    def get(self, session_id):
+        """The session, loaded from disk when needed, or None."""
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None and self.directory:
+                session = self._load(session_id)
+            if session is not None and self._expired(session.updated):
+                self._drop(session_id)
+                return None
+            if session is not None:
+                self._keep(session)
+            return session
+
+    def append(self, session, batch):
+        with session.lock:
+            result = session.append(batch)
+            if self.directory:
+                self._store(session)
+        with self._lock:
+            if session.id in self.sessions:
+                self.sessions.move_to_end(session.id)
+        return result
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._drop(session_id)
+
+    def _keep(self, session):
+        self.sessions[session.id] = session
+        self.sessions.move_to_end(session.id)
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+
+    def _drop(self, session_id):
+        session = self.sessions.pop(session_id, None)
+        if self.directory:
+            for suffix in (".session", ".log"):
+                try:
+                    os.remove(self._path(session_id, suffix))
+                except OSError:
+                    pass
+        return session
+
+    def _expire(self):
+        """Drop the sessions, in memory and on disk, whose last append is older than `ttl_seconds`."""
+        if self.ttl_seconds is None:
+            return
+        for session_id, session in list(self.sessions.items()):
+            if self._expired(session.updated):
+                self._drop(session_id)
+        if self.directory:
+            ids = {os.path.splitext(name)[0] for name in os.listdir(self.directory)
+                   if name.endswith((".session", ".log"))}
+            for session_id in ids:
+                if self._expired(self._last_write(session_id)):
+                    self._drop(session_id)
+
+    def _size(self, session_id, suffix=".session"):
+        path = self._path(session_id, suffix)
+        return os.path.getsize(path) if os.path.exists(path) else None
+
+    def _last_write(self, session_id):
+        return max(os.path.getmtime(self._path(session_id, suffix)) for suffix in (".session", ".log")
+                   if self._size(session_id, suffix) is not None)
+
+    def _load(self, session_id):
+        """The snapshot with the logged appends replayed, or None."""
+        try:
+            with open(self._path(session_id), "rb") as f:
+                payload = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if payload.get("format") != SESSION_FORMAT:
+            return None
+        session = payload["session"]
+        complete = True
+        try:
+            with open(self._path(session_id, ".log"), "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                while f.tell() < size:
+                    try:
+                        delta = pickle.load(f)
+                    except (pickle.UnpicklingError, EOFError, ValueError):
+                        complete = False  # an append cut short by a crash
+                        break
+                    # appends logged before the snapshot was rewritten are already in it
+                    if delta["refreshed"]["batches"] > session.batches:
+                        session.replay(delta)
+        except FileNotFoundError:
+            pass
+        if not complete:
+            self._snapshot(session)
+        return session
+
+    def _store(self, session):
+        """Log the session's last append, or rewrite its snapshot when the log outgrew it."""
+        snapshot, log = self._size(session.id), self._size(session.id, ".log") or 0
+        if snapshot is None or session.last_delta is None or log > snapshot:
+            self._snapshot(session)
+            return
+        with open(self._path(session.id, ".log"), "ab") as f:
+            f.write(pickle.dumps(session.last_delta, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _snapshot(self, session):
+        # written to a temporary file first so a crash never leaves a partial snapshot; the log
+        # is removed after, and appends it still holds are skipped on load (see _load)
+        tmp = f"{self._path(session.id)}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump({"format": SESSION_FORMAT, "session": session}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(session.id))
+        try:
+            os.remove(self._path(session.id, ".log"))
+        except FileNotFoundError:
+            pass
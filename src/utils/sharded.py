@@ -0,0 +1,49 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial, reduce
+
+from src.utils.chunked import (
+    CountState, class_columns, classify_state, count_classes, count_columns, metrics_from_state,
+)
+
+
+def _column_state(path, chunk_rows):
+    return count_columns(path, chunk_rows).to_bytes()
+
+
+def _class_state(path, columns, chunk_rows):
+    return count_classes(path, columns, chunk_rows).to_bytes()
+
+
+def merge_states(payloads):
+    """Reduce serialized shard states into one state."""
+    return reduce(CountState.merge, map(CountState.from_bytes, payloads), CountState())
+
+
+def evaluate_shards(paths, n_jobs=None, chunk_rows=100_000, filename=None):
+    """
+    Map-reduce the /calcul pipeline over CSV shards of one dataset.
+    Round 1 gathers column counts from every shard to classify the attributes;
+    round 2 gathers class counts over the chosen QID/SA columns. Workers only
+    exchange serialized CountState payloads, so the same rounds can run on
+    other machines and be merged here.
+    """
+    paths = list(paths)
+    filename = filename or os.path.basename(paths[0])
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        state = merge_states(executor.map(partial(_column_state, chunk_rows=chunk_rows), paths))
+        print(f"Counted {state.n_rows} rows across {len(paths)} shards.")
+
+        classifier, attributes = classify_state(state, filename)
+        columns = class_columns(classifier)
+        if columns:
+            state.merge(merge_states(executor.map(partial(_class_state, columns=columns, chunk_rows=chunk_rows), paths)))
+
+    return metrics_from_state(state, classifier, attributes)
+
+
+if __name__ == "__main__":
+    SHARDS = sys.argv[1:] or ["./data/test/healthcare_dataset.csv"]
+
+    print(evaluate_shards(SHARDS))
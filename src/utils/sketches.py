@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+
+# rows hashed and counted at a time: the transient arrays stay a few MiB, the size of the summaries
+SLICE_ROWS = 1 << 16
+
+
+def _leading_zeros(words):
+    """Leading zero bits of each uint64 word (64 for zero)."""
+    words = words.copy()
+    zeros = np.zeros(len(words), dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        top_clear = words < np.uint64(1) << np.uint64(64 - shift)
+        zeros[top_clear] += shift
+        words[top_clear] <<= np.uint64(shift)
+    zeros[words == 0] = 64
+    return zeros
+
+
+class HyperLogLog:
+    """
+    Cardinality sketch with 2^precision one-byte registers.
+    Standard error of the estimate is 1.04 / sqrt(2^precision).
+    """
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def update(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        rank = np.minimum(_leading_zeros(hashes << np.uint64(self.precision)), 64 - self.precision) + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def relative_error(self):
+        return 1.04 / np.sqrt(self.m)
+
+    def estimate(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m ** 2 / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        empty = int((self.registers == 0).sum())
+        if estimate <= 2.5 * self.m and empty:
+            estimate = self.m * np.log(self.m / empty)  # linear counting for small cardinalities
+        return float(estimate)
+
+
+class HeavyHitters:
+    """
+    Misra-Gries frequency summary with at most `capacity` counters.
+    A tracked count is at most `error` below the true count, and an untracked
+    value occurs at most `error` times; `error` never exceeds n / (capacity + 1).
+    """
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype=np.int64)
+        self.error = 0
+
+    def _reduce(self, counts):
+        """Keep at most `capacity` counters by subtracting the (capacity + 1)-th largest count."""
+        if len(counts) > self.capacity:
+            cut = int(counts.nlargest(self.capacity + 1).iloc[-1])
+            counts = counts[counts > cut] - cut
+            self.error += cut
+        return counts
+
+    def update(self, counts):
+        """Fold in exact counts of a slice (or another summary's counts)."""
+        if not len(counts):
+            return self
+        # summaries merge: the slice is reduced on its own, so only small summaries are regrouped
+        counts = self._reduce(counts)
+        combined = counts if not len(self.counts) else pd.concat([self.counts, counts]).groupby(level=0).sum()
+        self.counts = self._reduce(combined).astype(np.int64)
+        return self
+
+    def merge(self, other):
+        self.error += other.error
+        return self.update(other.counts)
+
+
+class ColumnSketch:
+    """
+    Fixed-memory summary of one column: exact row and missing counts, a HyperLogLog
+    for the number of distinct values and a heavy-hitter summary for frequencies.
+    Estimates come with bounds: HyperLogLog at `sigmas` standard errors, frequency
+    bounds deterministic. Columns whose distinct values all fit in the heavy-hitter
+    summary are summarized exactly. Series are read SLICE_ROWS rows at a time.
+    """
+    def __init__(self, precision=14, capacity=1024, sigmas=3):
+        self.n = 0
+        self.nulls = 0
+        self.sigmas = sigmas
+        self.hll = HyperLogLog(precision)
+        self.heavy = HeavyHitters(capacity)
+
+    @classmethod
+    def from_series(cls, series, slice_rows=SLICE_ROWS, **options):
+        sketch = cls(**options)
+        for start in range(0, len(series), slice_rows):
+            sketch.update(series.iloc[start:start + slice_rows])
+        return sketch
+
+    def update(self, series):
+        missing = series.isna()
+        values = series[~missing]
+        self.n += len(series)
+        self.nulls += int(missing.sum())
+        self.hll.update(pd.util.hash_pandas_object(values, index=False).to_numpy())
+        self.heavy.update(values.value_counts())
+        return self
+
+    def merge(self, other):
+        self.n += other.n
+        self.nulls += other.nulls
+        self.hll.merge(other.hll)
+        self.heavy.merge(other.heavy)
+        return self
+
+    @property
+    def exact(self):
+        return self.heavy.error == 0
+
+    def distinct(self):
+        """(estimate, low, high) of the number of distinct non-missing values."""
+        if self.exact:
+            d = len(self.heavy.counts)
+            return d, d, d
+        # there are at least as many values as tracked counters and at most one per row
+        tracked, present = len(self.heavy.counts), self.n - self.nulls
+        estimate = self.hll.estimate()
+        spread = self.sigmas * self.hll.relative_error() * estimate
+        return tuple(float(min(max(d, tracked), present)) for d in (estimate, estimate - spread, estimate + spread))
+
+    def g_distinct_risk(self):
+        """(estimate, low, high) of (distinct values + missing cells) / rows."""
+        if self.n == 0:
+            return 0.0, 0.0, 0.0
+        return tuple(float((d + self.nulls) / self.n) for d in self.distinct())
+
+    def _probabilities(self):
+        present = self.n - self.nulls
+        return self.heavy.counts.to_numpy() / present if present else np.zeros(0)
+
+    def min_entropy(self):
+        """(estimate, low, high) of -log2(p_max)."""
+        present = self.n - self.nulls
+        if not present:
+            return 0.0, 0.0, 0.0
+        top = int(self.heavy.counts.max()) if len(self.heavy.counts) else 0
+        p_high = min((top + self.heavy.error) / present, 1.0)
+        # the most frequent value occurs at least once, even when no counter is left
+        p_low = max(top, 1) / present
+        p_estimate = (p_low + p_high) / 2
+        return float(-np.log2(p_estimate)), float(-np.log2(p_high)), float(-np.log2(p_low))
+
+    def max_entropy(self):
+        """(estimate, low, high) of log2(distinct values)."""
+        return tuple(float(np.log2(d)) if d > 0 else 0.0 for d in self.distinct())
+
+    def entropy(self):
+        """
+        (estimate, low, high) of the Shannon entropy in bits.
+        Tracked values contribute their own terms and the remaining mass is spread
+        evenly over the remaining distinct values; the bounds use
+        min-entropy <= H <= log2(distinct).
+        """
+        p = self._probabilities()
+        p = p[p > 0]
+        tracked = float(-np.sum(p * np.log2(p)))
+        if self.exact:
+            return tracked, tracked, tracked
+        d_estimate, _, _ = self.distinct()
+        residual = max(1.0 - p.sum(), 0.0)
+        rest = max(d_estimate - len(p), 1.0)
+        estimate = tracked + (residual * np.log2(rest / residual) if residual > 0 else 0.0)
+        low = self.min_entropy()[1]
+        high = self.max_entropy()[2]
+        return float(np.clip(estimate, low, high)), low, high
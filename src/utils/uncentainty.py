@@ -1,32 +1,63 @@
 import numpy as np
 import pandas as pd
 from src.utils.algorithmic_attribute_classification import AttributeClassification
-
-import numpy as np
-import pandas as pd
+from src.utils.column_profile import ColumnProfile
+from src.utils.sketches import ColumnSketch
 
 class Uncertainty:
-
-    def __init__(self, data, SAs):
+    """
+    Entropy-based uncertainty of the sensitive attributes, read from column profiles.
+    `profiles` (a DatasetProfile) shares the profiles already built for classification;
+    other columns are profiled once here, from the `index` codes when available.
+    With `approximate` the profiles are sketch estimates and their (low, high)
+    bounds are collected in `error_bounds`.
+    """
+
+    def __init__(self, data, SAs, weights=None, approximate=False, index=None, profiles=None):
         self.data = data
         self.SAs = SAs
+        self.weights = weights
+        self.index = index
+        self.profiles = profiles
+        self.approximate = approximate and weights is None
+        self.error_bounds = {}
+        self._profiles = {}
+
+    def profile(self, series):
+        """Profile of a column, counted at most once."""
+        name = series.name
+        if self.profiles is not None and name in self.profiles:
+            profile = self.profiles[name]
+        elif name in self._profiles:
+            profile = self._profiles[name]
+        else:
+            if self.approximate:
+                profile = ColumnProfile.from_sketch(name, ColumnSketch.from_series(series))
+            elif self.index is not None and name in self.index.codes:
+                profile = ColumnProfile.from_codes(name, self.index.codes[name], self.index.weights)
+            else:
+                profile = ColumnProfile.from_series(series, self.weights)
+            self._profiles[name] = profile
+        if profile.bounds is not None:
+            self.error_bounds[name] = {m: list(profile.bounds[m]) for m in ("entropy", "min_entropy", "max_entropy")}
+        return profile
 
     def entropy(self, series):
-        counts = series.value_counts(normalize=True)
-        return -np.sum(counts * np.log2(counts))
+        return self.profile(series).entropy
 
     def max_entropy(self, series):
-        n = series.nunique()
-        return np.log2(n) if n > 0 else 0
+        return self.profile(series).max_entropy
 
     def normalized_entropy(self, series):
-        h = self.entropy(series)
-        h_max = self.max_entropy(series)
-        return h / h_max if h_max != 0 else 0
+        return self.profile(series).normalized_entropy
 
     def min_entropy(self, series):
-        p_max = series.value_counts(normalize=True).max()
-        return -np.log2(p_max) if p_max > 0 else 0
+        return self.profile(series).min_entropy
+
+    def measures(self, series):
+        """(entropy, min entropy, normalized entropy) of a column."""
+        profile = self.profile(series)
+        return profile.entropy, profile.min_entropy, profile.normalized_entropy
 
     def uncertainty_calculate_all(self):
         if not self.SAs:
@@ -38,10 +69,10 @@ class Uncertainty:
         normalized_entropy_list = []
 
         for sa in self.SAs:
-            series = self.data[sa]
-            entropy_list.append(self.entropy(series))
-            min_entropy_list.append(self.min_entropy(series))
-            normalized_entropy_list.append(self.normalized_entropy(series))
+            entropy, min_entropy, normalized_entropy = self.measures(self.data[sa])
+            entropy_list.append(entropy)
+            min_entropy_list.append(min_entropy)
+            normalized_entropy_list.append(normalized_entropy)
 
         avg_entropy = np.mean(entropy_list)
         avg_min_entropy = np.mean(min_entropy_list)
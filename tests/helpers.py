@@ -0,0 +1,35 @@
+import json
+import math
+
+from benchmarks.synthetic import synthetic_health_dataset
+
+
+def small_dataset(rows=2_000, seed=0):
+    """A synthetic dataset small enough for the tests, with QIDs and SAs to classify."""
+    return synthetic_health_dataset(rows, columns=8, cardinality=6, qids=3, sas=2, seed=seed)
+
+
+def as_json(result):
+    """A result as the API would return it (numpy values as plain numbers)."""
+    return json.loads(json.dumps(result, default=lambda value: value.tolist() if hasattr(value, "tolist") else str(value)))
+
+
+def assert_same_result(expected, actual, path="", rel_tol=1e-9):
+    """Recursive equality of two results, floats up to `rel_tol`."""
+    expected, actual = as_json(expected), as_json(actual)
+    _compare(expected, actual, path, rel_tol)
+
+
+def _compare(expected, actual, path, rel_tol):
+    if isinstance(expected, dict):
+        assert isinstance(actual, dict) and set(expected) == set(actual), f"{path}: keys {set(expected) ^ set(actual)}"
+        for key in expected:
+            _compare(expected[key], actual[key], f"{path}/{key}", rel_tol)
+    elif isinstance(expected, list):
+        assert isinstance(actual, list) and len(expected) == len(actual), f"{path}: {expected} != {actual}"
+        for i, (left, right) in enumerate(zip(expected, actual)):
+            _compare(left, right, f"{path}[{i}]", rel_tol)
+    elif isinstance(expected, float) or isinstance(actual, float):
+        assert math.isclose(expected, actual, rel_tol=rel_tol, abs_tol=1e-12), f"{path}: {expected} != {actual}"
+    else:
+        assert expected == actual, f"{path}: {expected} != {actual}"
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from src.utils.batch import dataset_tasks, main
+from src.utils.encoded import EncodedDataset
+from src.utils.pipeline import compute_privacy_metrics, evaluate_dataframe
+from tests.helpers import assert_same_result, small_dataset
+
+QIDS = ["Gender", "Blood Type"]
+SAS = ["Medical Condition"]
+
+
+@pytest.fixture(scope="module")
+def datasets(tmp_path_factory):
+    """{name: DataFrame} written under a directory, with a manifest naming them relatively."""
+    directory = tmp_path_factory.mktemp("batch")
+    (directory / "nested").mkdir()
+    frames = {"a.csv": small_dataset(rows=600, seed=1), "nested/b.csv.gz": small_dataset(rows=400, seed=2)}
+    for name, df in frames.items():
+        df.to_csv(directory / name, index=False)
+    (directory / "notes.txt").write_text("not a dataset")
+    manifest = directory / "manifest.jsonl"
+    manifest.write_text("\n".join([
+        "# scored with classification",
+        "a.csv",
+        "",
+        json.dumps({"path": "nested/b.csv.gz", "qids": QIDS, "sas": SAS}),
+        "missing.csv",
+    ]) + "\n")
+    return directory, frames
+
+
+def read_records(path):
+    with open(path) as f:
+        return {record["path"]: record for record in map(json.loads, f)}
+
+
+def test_manifest_records_match_in_process_results(datasets, tmp_path):
+    directory, frames = datasets
+    output = tmp_path / "results.jsonl"
+    assert main([str(directory / "manifest.jsonl"), "-o", str(output), "--workers", "2"]) == 1
+
+    records = read_records(output)
+    assert set(records) == {str(directory / name) for name in ("a.csv", "nested/b.csv.gz", "missing.csv")}
+    a = records[str(directory / "a.csv")]
+    assert a["status"] == "ok" and a["rows"] == 600
+    assert_same_result(evaluate_dataframe(frames["a.csv"], "a.csv"), a["result"])
+    assert [stage["stage"] for stage in a["timing"]["stages"]][:2] == ["read", "classification"]
+
+    b = records[str(directory / "nested/b.csv.gz")]
+    df = frames["nested/b.csv.gz"][QIDS + SAS]
+    expected = compute_privacy_metrics(df, {"QIDs": QIDS, "SAs": SAS}, encoded=EncodedDataset.from_frame(df))
+    assert b["status"] == "ok"
+    assert_same_result(expected, b["result"])
+
+    missing = records[str(directory / "missing.csv")]
+    assert missing["status"] == "error" and missing["error"].startswith("FileNotFoundError")
+
+
+def test_directory_source_with_shared_attributes(datasets, tmp_path):
+    directory, frames = datasets
+    assert [task["path"] for task in dataset_tasks(str(directory))] == [
+        str(directory / "a.csv"), str(directory / "nested" / "b.csv.gz")]
+
+    output = tmp_path / "results.jsonl"
+    argv = [str(directory), "-o", str(output), "--workers", "1", "--qids", ",".join(QIDS), "--sas", ",".join(SAS)]
+    assert main(argv) == 0
+    records = read_records(output)
+    for name, df in frames.items():
+        df = df[QIDS + SAS]
+        expected = compute_privacy_metrics(df, {"QIDs": QIDS, "SAs": SAS}, encoded=EncodedDataset.from_frame(df))
+        assert_same_result(expected, records[str(directory / name)]["result"])
+
+
+def test_qids_need_sas(datasets):
+    with pytest.raises(SystemExit):
+        main([str(datasets[0]), "--qids", "Gender"])
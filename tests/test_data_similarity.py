@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.data_similarity import DataSimilarity
+from src.utils.equivalence_classes import EquivalenceClassIndex
+from tests.helpers import small_dataset
+
+QIDS = ["Gender", "Blood Type", "Insurance Provider"]
+
+
+@pytest.fixture(scope="module")
+def df():
+    """Low-cardinality QIDs, categorical and numeric SAs, with missing values in both."""
+    df = small_dataset()
+    rng = np.random.default_rng(3)
+    for col in QIDS + ["Medical Condition", "Billing Amount", "Age"]:
+        df.loc[rng.random(len(df)) < 0.05, col] = np.nan
+    return df
+
+
+def reference_t_closeness(df, qids, sa):
+    """Max over classes of the ordered EMD (numeric SA) or variational distance to the global SA distribution."""
+    values = np.sort(df[sa].dropna().unique())
+    global_p = df[sa].value_counts(normalize=True).reindex(values, fill_value=0).to_numpy()
+    numeric = pd.api.types.is_numeric_dtype(df[sa])
+    distances = []
+    for _, rows in df.groupby(qids, dropna=True):
+        present = rows[sa].dropna()
+        if not len(present):
+            continue
+        q = present.value_counts(normalize=True).reindex(values, fill_value=0).to_numpy()
+        if numeric:
+            distances.append(np.abs(np.cumsum(q - global_p)).sum() / (len(values) - 1) if len(values) > 1 else 0.0)
+        else:
+            distances.append(0.5 * np.abs(q - global_p).sum())
+    return max(distances)
+
+
+@pytest.mark.parametrize("sa", ["Medical Condition", "Billing Amount", "Age"])
+@pytest.mark.parametrize("qids", [QIDS[:1], QIDS[:2], QIDS])
+def test_t_closeness_matches_reference(df, qids, sa):
+    similarity = DataSimilarity(df, qids, sa)
+    assert similarity.t_closeness() == pytest.approx(reference_t_closeness(df, qids, sa), rel=1e-9, abs=1e-12)
+
+
+def test_t_closeness_of_weighted_rows(df):
+    # one row per distinct combination with its record count gives the same distances
+    columns = QIDS[:2] + ["Age"]
+    counts = df[columns].value_counts(dropna=False).reset_index(name="count")
+    index = EquivalenceClassIndex(counts, QIDS[:2], ["Age"], weights=counts["count"].to_numpy())
+    weighted = DataSimilarity(counts, QIDS[:2], "Age", index=index)
+    assert weighted.t_closeness() == pytest.approx(DataSimilarity(df, QIDS[:2], "Age").t_closeness(), rel=1e-9)
+
+
+def test_t_closeness_without_qids(df):
+    assert DataSimilarity(df, [], "Age").t_closeness() == 0
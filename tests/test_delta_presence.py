@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.adversary_success import AdversarySuccessMetrics
+from src.utils.equivalence_classes import EquivalenceClassIndex
+from tests.helpers import small_dataset
+
+QIDS = ["Gender", "Blood Type", "Insurance Provider"]
+
+
+@pytest.fixture(scope="module")
+def frames():
+    """(published, population): a sample of the population plus records it does not hold."""
+    rng = np.random.default_rng(7)
+    population = small_dataset(rows=3_000, seed=1)
+    population.loc[rng.random(len(population)) < 0.03, "Blood Type"] = np.nan
+    published = population.sample(frac=0.3, random_state=2)
+    outsiders = small_dataset(rows=50, seed=2).assign(Gender="Gender unknown")
+    return pd.concat([published, outsiders], ignore_index=True), population
+
+
+def reference(published, population):
+    """delta-presence figures from a merge of the per-class record counts."""
+    counts = pd.merge(
+        published.groupby(QIDS, dropna=False).size().rename("published").reset_index(),
+        population.groupby(QIDS, dropna=False).size().rename("population").reset_index(),
+        on=QIDS, how="left",
+    )
+    found = counts[counts["population"].notna()]
+    deltas = found["published"] / found["population"]
+    return {
+        "delta_presence": round(found["published"].sum() / len(published), 4),
+        "delta_min": round(float(deltas.min()), 4),
+        "delta_max": round(float(deltas.max()), 4),
+        "delta_mean": round(float(deltas.mean()), 4),
+        "shared_records": int(found["published"].sum()),
+        "published_records": len(published),
+        "population_records": len(population),
+        "equivalence_classes": len(counts),
+        "classes_missing_from_population": int(counts["population"].isna().sum()),
+    }
+
+
+def test_population_frame_matches_merge(frames):
+    published, population = frames
+    result = AdversarySuccessMetrics(published, QIDS).delta_presence_population(population, chunk_rows=250)
+    assert result == reference(published, population)
+    assert result["classes_missing_from_population"] > 0
+
+
+def test_population_file_matches_merge(frames, tmp_path):
+    published, population = frames
+    path = tmp_path / "population.csv"
+    population.to_csv(path, index=False)
+    result = AdversarySuccessMetrics(published, QIDS).delta_presence_population(str(path), chunk_rows=700)
+    assert result == reference(published, population)
+
+
+def test_weighted_rows_match_records(frames):
+    published, population = frames
+    distinct = published[QIDS].value_counts(dropna=False).reset_index(name="count")
+    index = EquivalenceClassIndex(distinct, QIDS, weights=distinct["count"].to_numpy())
+    result = AdversarySuccessMetrics(distinct[QIDS], QIDS, index=index).delta_presence_population(population)
+    assert result == reference(published, population)
+
+
+def test_population_without_qids_is_rejected(frames):
+    published, population = frames
+    with pytest.raises(ValueError):
+        AdversarySuccessMetrics(published, QIDS).delta_presence_population(population.drop(columns="Gender"))
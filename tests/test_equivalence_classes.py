@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from src.utils.encoded import EncodedDataset
+from src.utils.equivalence_classes import EquivalenceClassIndex
+from src.utils.pipeline import compute_privacy_metrics
+from tests.helpers import assert_same_result
+
+
+def categorical_frame():
+    """One categorical QID and one categorical SA, each with categories no record uses."""
+    return pd.DataFrame({
+        "Zip Code": pd.Categorical(["a", "a", "b", "b", None, "b"], categories=["c", "a", "b", "d"]),
+        "Diagnosis": pd.Categorical(["x", "y", "x", "y", "x", None], categories=["x", "y", "z"]),
+    })
+
+
+def test_unused_categories_are_not_classes():
+    df = categorical_frame()
+    encoded = EncodedDataset.from_frame(df)
+    assert list(encoded.dictionaries["Zip Code"]) == ["a", "b"]
+    index = EquivalenceClassIndex(df, ["Zip Code"], ["Diagnosis"], encoded=encoded)
+    assert index.sizes.tolist() == [2, 3]
+
+
+def test_index_compacts_sparse_dictionaries():
+    codes = {"Zip Code": np.array([1, 1, 3, 3, -1, 3], dtype=np.int8)}
+    encoded = EncodedDataset(codes, {"Zip Code": pd.Index(["c", "a", "b", "d"])}, 6)
+    index = EquivalenceClassIndex(None, ["Zip Code"], encoded=encoded, weights=np.ones(6))
+    assert index.sizes.tolist() == [2, 3]
+    assert index.group.tolist() == [0, 0, 1, 1, -1, 1]
+
+
+def test_categorical_metrics_match_plain_columns():
+    df = categorical_frame()
+    attributes = {"QIDs": ["Zip Code"], "SAs": ["Diagnosis"]}
+    expected = compute_privacy_metrics(df.astype(object), attributes)
+    actual = compute_privacy_metrics(df, attributes, encoded=EncodedDataset.from_frame(df))
+    assert actual["k_anonymity"] == 2
+    assert_same_result(expected, actual)
@@ -0,0 +1,62 @@
+import itertools
+
+import pytest
+
+from src.utils.generalization import GeneralizationWhatIf, Hierarchy
+from src.utils.pipeline import evaluate_generalizations
+from tests.helpers import small_dataset
+
+QIDS = ["Age", "Zip Code", "Admission Date"]
+SAS = ["Medical Condition", "Billing Amount"]
+HIERARCHIES = {
+    "Age": Hierarchy.from_spec("Age", {"type": "interval", "widths": [50, 200, 500]}),
+    "Zip Code": Hierarchy.from_spec("Zip Code", {"type": "prefix", "keep": [4, 3]}),
+    "Admission Date": Hierarchy.from_spec("Admission Date", {"type": "date", "levels": ["month", "year"]}),
+}
+
+
+@pytest.fixture(scope="module")
+def df():
+    return small_dataset()
+
+
+def dominance_walk(what_if, k):
+    """Reference search: every vector by total height, skipping those above a k-anonymous one."""
+    heights = [what_if.hierarchies[col].height for col in what_if.qids]
+    nodes = sorted(itertools.product(*(range(height + 1) for height in heights)), key=lambda node: (sum(node), node))
+    found, evaluated = [], 0
+    for node in nodes:
+        if any(all(a >= b for a, b in zip(node, other)) for other in found):
+            continue
+        evaluated += 1
+        if what_if.evaluate(dict(zip(what_if.qids, node)))["k_anonymity"] >= k:
+            found.append(node)
+    return sorted(found), evaluated
+
+
+@pytest.mark.parametrize("k", [2, 5, 20])
+def test_minimal_levels_match_dominance_walk(df, k):
+    what_if = GeneralizationWhatIf(df, QIDS, SAS, HIERARCHIES)
+    frontier = what_if.minimal_levels(k)
+    levels = sorted(tuple(result["levels"][col] for col in QIDS) for result in frontier)
+    expected, evaluated = dominance_walk(GeneralizationWhatIf(df, QIDS, SAS, HIERARCHIES), k)
+    assert levels == expected
+    assert what_if.evaluated == evaluated
+    assert not what_if.truncated
+    assert all(result["k_anonymity"] >= k for result in frontier)
+    assert [result["loss"] for result in frontier] == sorted(result["loss"] for result in frontier)
+
+
+def test_budget_truncates_search(df):
+    what_if = GeneralizationWhatIf(df, QIDS, SAS, HIERARCHIES)
+    what_if.minimal_levels(20, max_nodes=3)
+    assert what_if.evaluated == 3
+    assert what_if.truncated
+
+
+def test_generalizations_search_given_qids(df):
+    result = evaluate_generalizations(df, "health.csv", HIERARCHIES, k=5, qids=QIDS[:2], max_nodes=2)
+    assert result["QIDs"] == QIDS[:2]
+    assert set(result["optimal_qid_dimension"]) <= set(QIDS[:2])
+    assert result["evaluated"] == 2
+    assert result["truncated"]
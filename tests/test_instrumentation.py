@@ -0,0 +1,106 @@
+import re
+import time
+
+import pytest
+
+from src.utils.instrumentation import DURATION_BUCKETS, MetricsRegistry, StageTrace
+from tests.helpers import small_dataset
+
+SAMPLE = re.compile(r'^([a-z_]+)(\{[^}]*\})? (\S+)$')
+
+
+def parse_exposition(text):
+    """({(name, labels): value}, {name: type}) of Prometheus exposition text, checking its layout."""
+    samples, types, helped = {}, {}, set()
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            helped.add(line.split()[2])
+        elif line.startswith("# TYPE "):
+            _, _, name, kind = line.split()
+            assert name in helped and name not in types
+            types[name] = kind
+        else:
+            match = SAMPLE.match(line)
+            assert match, line
+            name, labels, value = match.groups()
+            assert (name, labels) not in samples
+            samples[(name, labels or "")] = float(value)
+    return samples, types
+
+
+def test_counters_and_histograms():
+    registry = MetricsRegistry(prefix="test")
+    values = [0.003, 0.02, 0.02, 0.7, 400]
+    for value in values:
+        registry.observe("duration_seconds", "Durations.", value, DURATION_BUCKETS, path="/calcul")
+    registry.inc("requests_total", "Requests.", path="/calcul")
+    registry.inc("requests_total", "Requests.", 2, path="/jobs")
+    samples, types = parse_exposition(registry.render([("up", "gauge", "Up.", 1), ("unknown", "gauge", "-", None)]))
+
+    assert types == {"test_requests_total": "counter", "test_duration_seconds": "histogram", "test_up": "gauge"}
+    assert samples[("test_requests_total", '{path="/calcul"}')] == 1
+    assert samples[("test_requests_total", '{path="/jobs"}')] == 2
+    for bound in DURATION_BUCKETS:
+        le = repr(bound) if not float(bound).is_integer() else str(int(bound))
+        expected = sum(value <= bound for value in values)
+        assert samples[("test_duration_seconds_bucket", f'{{path="/calcul",le="{le}"}}')] == expected
+    assert samples[("test_duration_seconds_bucket", '{path="/calcul",le="+Inf"}')] == len(values)
+    assert samples[("test_duration_seconds_count", '{path="/calcul"}')] == len(values)
+    assert samples[("test_duration_seconds_sum", '{path="/calcul"}')] == pytest.approx(sum(values))
+    assert samples[("test_up", "")] == 1
+
+
+def test_stage_trace_reports_each_stage():
+    registry = MetricsRegistry(prefix="test")
+    trace = StageTrace(registry, rows=10)
+    trace("read")
+    trace.note(classes=3)
+    trace("score")
+    trace.stop()
+    with trace.stage("parse", thread_cpu=False):
+        time.sleep(0.01)
+        trace.add_cpu(0.25)
+
+    assert [stage["stage"] for stage in trace.stages] == ["read", "score", "parse"]
+    assert trace.stages[0]["rows"] == 10 and trace.stages[1]["classes"] == 3
+    # a stage started without its thread's CPU only reports the CPU time added to it
+    assert trace.stages[2]["cpu_seconds"] == 0.25
+    assert trace.stages[2]["wall_seconds"] >= 0.01
+    summary = trace.summary()
+    assert summary["cpu_seconds"] == pytest.approx(sum(stage["cpu_seconds"] for stage in trace.stages), abs=1e-6)
+
+    samples, _ = parse_exposition(registry.render())
+    assert samples[("test_stage_cpu_seconds_total", '{stage="parse"}')] == 0.25
+    assert samples[("test_stage_rows_total", '{stage="read"}')] == 10
+    assert samples[("test_stage_duration_seconds_count", '{stage="score"}')] == 1
+
+
+def test_metrics_endpoint_after_evaluations():
+    from fastapi.testclient import TestClient
+    from src.main import RESULT_CACHE, app
+
+    files = {"file": ("synthetic.csv", small_dataset(rows=500).to_csv(index=False).encode(), "text/csv")}
+    RESULT_CACHE.clear()
+    with TestClient(app) as client:
+        before, _ = parse_exposition(client.get("/metrics").text)
+        first = client.post("/calcul", files=files, params={"timing": True}).json()
+        client.post("/calcul", files=files)
+        response = client.get("/metrics")
+    RESULT_CACHE.clear()
+
+    assert response.headers["content-type"].startswith("text/plain")
+    samples, types = parse_exposition(response.text)
+
+    def delta(name, labels):
+        return samples.get((name, labels), 0) - before.get((name, labels), 0)
+
+    assert types["privacy_engine_stage_duration_seconds"] == "histogram"
+    assert delta("privacy_engine_evaluations_total", '{cached="false"}') == 1
+    assert delta("privacy_engine_evaluations_total", '{cached="true"}') == 1
+    assert delta("privacy_engine_request_duration_seconds_count",
+                 '{method="POST",path="/calcul",status="200"}') == 2
+    for stage in first["timing"]["stages"]:
+        assert delta("privacy_engine_stage_duration_seconds_count", f'{{stage="{stage["stage"]}"}}') >= 1
+    assert delta("privacy_engine_stage_rows_total", '{stage="parse"}') == 1_000
+    parse = next(stage for stage in first["timing"]["stages"] if stage["stage"] == "parse")
+    assert parse["cpu_seconds"] > 0 and parse["rows"] == 500
@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+from src.utils.encoded import EncodedDataset
+from src.utils.jobs import JobCancelled, JobManager, QueueFullError, _run_job
+from src.utils.pipeline import STAGES, evaluate_dataframe
+from tests.helpers import assert_same_result, small_dataset
+
+TIMEOUT = 120
+
+
+def wait_until_done(get, job_id):
+    deadline = time.time() + TIMEOUT
+    while time.time() < deadline:
+        job = get(job_id)
+        if job["status"] in ("done", "failed", "cancelled"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish in {TIMEOUT}s")
+
+
+@pytest.fixture(scope="module")
+def manager():
+    manager = JobManager(max_workers=1, max_queued=1)
+    manager.start()
+    yield manager
+    manager.shutdown()
+
+
+def test_job_result_matches_in_process_evaluation(manager):
+    df = small_dataset(rows=1_000)
+    results = []
+    job = manager.submit(df, "synthetic.csv", on_result=results.append)
+    status = wait_until_done(lambda job_id: manager.get(job_id).to_dict(), job.id)
+    assert status["status"] == "done"
+    assert status["progress"] == {"stage": STAGES[-1], "completed_stages": len(STAGES), "total_stages": len(STAGES)}
+    assert_same_result(evaluate_dataframe(df, "synthetic.csv"), manager.get(job.id).result)
+    assert results == [manager.get(job.id).result]
+
+
+def test_queue_depth_and_cancellation(manager):
+    df = small_dataset(rows=1_000)
+    running = manager.submit(df, "a.csv")
+    queued = manager.submit(df, "b.csv")
+    with pytest.raises(QueueFullError):
+        manager.submit(df, "c.csv")
+    # a job the pool has not started is cancelled at once, a started one at its next stage
+    assert manager.cancel(queued.id).status in ("cancelled", "cancelling")
+    get = lambda job_id: manager.get(job_id).to_dict()
+    assert wait_until_done(get, queued.id)["status"] == "cancelled"
+    assert wait_until_done(get, running.id)["status"] == "done"
+    assert manager.get("unknown") is None
+
+
+def test_running_job_stops_at_next_stage():
+    df = small_dataset(rows=200)
+    shared = EncodedDataset.from_frame(df).share()
+    progress, cancelled = {}, {"job": True}
+    try:
+        with pytest.raises(JobCancelled):
+            _run_job("job", shared, "synthetic.csv", False, None, progress, cancelled)
+    finally:
+        shared.release()
+    assert "job" not in progress
+
+
+@pytest.fixture(scope="module")
+def client():
+    from fastapi.testclient import TestClient
+    from src.main import RESULT_CACHE, app
+
+    RESULT_CACHE.clear()
+    with TestClient(app) as client:
+        yield client
+    RESULT_CACHE.clear()
+
+
+def test_job_api_matches_calcul(client):
+    from src.main import RESULT_CACHE
+
+    files = {"file": ("synthetic.csv", small_dataset(rows=800).to_csv(index=False).encode(), "text/csv")}
+    response = client.post("/jobs", files=files)
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    status = wait_until_done(lambda job_id: client.get(f"/jobs/{job_id}").json(), job_id)
+    assert status["status"] == "done"
+    result = client.get(f"/jobs/{job_id}/result").json()
+
+    RESULT_CACHE.clear()
+    expected = client.post("/calcul", files=files).json()
+    expected.pop("chart")
+    assert_same_result(expected, result)
+    assert client.get("/jobs/unknown").status_code == 404
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import threading
+
+from src.utils.llm_attribute_classification import (
+    ColumnClassCache, DetectIdentifiers, LLMAttributeClassifier, StubBackend,
+)
+
+REQUESTS = [["age", "zip", "diagnosis"], ["Age", "name", "salary"], ["zip", "blood", "email"], ["gender", "income"]]
+
+
+def classifier(backend, cache=None, **options):
+    options = {"batch_window": 0.02, **options}
+    return LLMAttributeClassifier(backend, cache or ColumnClassCache(), **options)
+
+
+def classify_together(clf, requests):
+    async def run():
+        return await asyncio.gather(*(clf.classify(names) for names in requests))
+    return asyncio.run(run())
+
+
+def test_concurrent_requests_share_prompts():
+    backend = StubBackend(delay=0.01)
+    results = classify_together(classifier(backend), REQUESTS)
+    assert backend.calls == 1
+    assert results[0] == {"personal_identifiers": [], "quasi_identifiers": ["age", "zip"],
+                          "sensitive_attributes": ["diagnosis"], "neither": []}
+    # names are classified case-insensitively, each once
+    assert results[1]["quasi_identifiers"] == ["Age"]
+    assert results[2]["neither"] == ["blood"]
+
+
+def test_batches_bounded_by_max_batch():
+    backend = StubBackend()
+    classify_together(classifier(backend, max_batch=3), REQUESTS)
+    distinct = {name.lower() for names in REQUESTS for name in names}
+    assert backend.calls == -(-len(distinct) // 3)
+
+
+def test_warm_cache_makes_no_calls():
+    backend = StubBackend()
+    clf = classifier(backend)
+    first = classify_together(clf, REQUESTS)
+    calls = backend.calls
+    assert classify_together(clf, REQUESTS) == first
+    assert backend.calls == calls
+
+
+def test_cache_persists_and_evicts(tmp_path):
+    path = str(tmp_path / "classes.json")
+    backend = StubBackend()
+    classify_together(classifier(backend, ColumnClassCache(path=path)), REQUESTS)
+    restarted = StubBackend()
+    classify_together(classifier(restarted, ColumnClassCache(path=path)), REQUESTS)
+    assert restarted.calls == 0
+
+    cache = ColumnClassCache(max_entries=2, path=path)
+    cache.update({"age": "quasi_identifiers", "name": "personal_identifiers", "income": "sensitive_attributes"})
+    assert cache.get("AGE") is None and cache.get("Income") == "sensitive_attributes"
+    with open(path) as f:
+        assert set(json.load(f)) == {"name", "income"}
+
+
+def test_backend_errors_are_reported():
+    class Slow:
+        async def complete(self, prompt):
+            await asyncio.sleep(1)
+            return "{}"
+
+    class Garbled:
+        async def complete(self, prompt):
+            return "not json at all"
+
+    timed_out = DetectIdentifiers(classifier(Slow(), timeout=0.05)).detect_identifiers(["age"])
+    assert "did not answer in time" in timed_out[0]["error"]
+    garbled = DetectIdentifiers(classifier(Garbled())).detect_identifiers(["age"])
+    assert garbled[0]["error"].startswith("Failed to parse response")
+
+
+def test_cache_written_off_the_event_loop(tmp_path, monkeypatch):
+    path = str(tmp_path / "classes.json")
+    cache = ColumnClassCache(path=path)
+    writers = []
+    save = cache.save
+    monkeypatch.setattr(cache, "save", lambda: (writers.append(threading.get_ident()), save()))
+    result, *_ = DetectIdentifiers(classifier(StubBackend(), cache)).detect_identifiers(["age", "diagnosis"])
+    assert result["quasi_identifiers"] == ["age"]
+    assert writers and threading.get_ident() not in writers
+    with open(path) as f:
+        assert json.load(f) == {"age": "quasi_identifiers", "diagnosis": "sensitive_attributes"}
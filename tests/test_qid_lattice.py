@@ -0,0 +1,77 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from src.utils.qid_lattice import QIDLatticeSearch
+from tests.helpers import small_dataset
+
+QIDS = ["Age", "Zip Code", "Admission Date", "Gender", "Blood Type", "Insurance Provider"]
+K = 3
+
+
+@pytest.fixture(scope="module")
+def df():
+    df = small_dataset()
+    df.loc[np.random.default_rng(5).random(len(df)) < 0.02, "Blood Type"] = np.nan
+    return df
+
+
+@pytest.fixture(scope="module")
+def entropies(df):
+    return {col: float(-(p * np.log2(p)).sum()) for col, p in
+            ((col, df[col].value_counts(normalize=True)) for col in QIDS)}
+
+
+def reference_scores(df, entropies):
+    """(PG, NUE) of every k-anonymous subset, grouping each subset from scratch."""
+    n = len(df)
+    original = (~df[QIDS].duplicated(keep=False)).sum() / n
+    scores = {}
+    for size in range(1, len(QIDS) + 1):
+        for members in itertools.combinations(range(len(QIDS)), size):
+            cols = [QIDS[i] for i in members]
+            sizes = df.groupby(cols, dropna=True).size()
+            if not len(sizes) or sizes.min() < K:
+                continue
+            uniqueness = (~df[cols].duplicated(keep=False)).sum() / n
+            scores[members] = (original - uniqueness, sum(entropies[c] for c in cols) / len(cols))
+    return scores
+
+
+def reference_best(scores):
+    best_pg, best_nue, best = -np.inf, -np.inf, None
+    for members in sorted(scores, key=lambda m: (len(m), m)):
+        pg, nue = scores[members]
+        if pg > best_pg and nue > best_nue:
+            best_pg, best_nue, best = pg, nue, [QIDS[i] for i in members]
+    return best
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_search_matches_every_subset(df, entropies, n_jobs):
+    scores = reference_scores(df, entropies)
+    search = QIDLatticeSearch(df, QIDS, entropies, k=K, n_jobs=n_jobs)
+    best, _, _ = search.run()
+    assert set(search.scores) == set(scores)
+    for members, (pg, nue) in scores.items():
+        assert search.scores[members] == pytest.approx((pg, nue), rel=1e-9)
+    assert best == reference_best(scores)
+    # failing subsets prune their supersets, so fewer sets are grouped than exist
+    assert search.pruned > 0
+    assert search.evaluated < 2 ** len(QIDS) - 1
+    assert not search.exhausted
+
+
+@pytest.mark.parametrize("n_jobs", [1, 4])
+def test_budget_is_shared_across_workers(df, entropies, n_jobs):
+    search = QIDLatticeSearch(df, QIDS, entropies, k=K, max_subsets=10, n_jobs=n_jobs)
+    search.run()
+    assert search.evaluated == 10
+    assert search.exhausted
+
+
+def test_deadline_stops_search(df, entropies):
+    search = QIDLatticeSearch(df, QIDS, entropies, k=K, max_seconds=0)
+    assert search.run()[0] is None
+    assert search.evaluated == 0 and search.exhausted
@@ -0,0 +1,91 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.equivalence_classes import EquivalenceClassIndex
+from src.utils.record_risk import RecordRiskExport
+from tests.helpers import small_dataset
+
+QIDS = ["Gender", "Blood Type", "Insurance Provider", "Age"]
+
+
+@pytest.fixture(scope="module")
+def df():
+    df = small_dataset(rows=1_500)
+    df.loc[np.random.default_rng(4).random(len(df)) < 0.05, "Blood Type"] = np.nan
+    df["Record ID"] = [f"r{i}" for i in range(len(df))]
+    return df
+
+
+def reference(df, qids):
+    """Class size of every record and, for unique records, the QIDs that make it unique."""
+    def class_sizes(cols):
+        if not cols:
+            return pd.Series(len(df), index=df.index)
+        complete = df[cols].notna().all(axis=1)
+        return df[complete].groupby(cols)[cols[0]].transform("size").reindex(df.index)
+
+    sizes = class_sizes(qids)
+    shared = {qid: class_sizes([col for col in qids if col != qid]) > 1 for qid in qids}
+    identifying = [[qid for qid in qids if shared[qid][row]] if size == 1 else [] for row, size in sizes.items()]
+    return sizes, identifying
+
+
+@pytest.mark.parametrize("qids", [QIDS, ["Billing Amount"], ["Age", "Zip Code"]])
+def test_records_match_reference(df, qids):
+    export = RecordRiskExport(EquivalenceClassIndex(df, qids), ids=df["Record ID"])
+    records = pd.concat(export.chunks(), ignore_index=True)
+    sizes, identifying = reference(df, qids)
+
+    assert records["row"].tolist() == list(range(len(df)))
+    assert records["id"].tolist() == df["Record ID"].tolist()
+    assert records["class_size"].isna().tolist() == sizes.isna().tolist()
+    known = sizes.notna().to_numpy()
+    assert records["class_size"][known].astype(int).tolist() == sizes[known].astype(int).tolist()
+    assert np.allclose(records["risk"][known], 1 / sizes[known])
+    assert records["risk"][~known].isna().all()
+    assert records["unique"].tolist() == (sizes == 1).tolist()
+    assert records["identifying_qids"].tolist() == identifying
+    assert records["unique"].any()
+
+
+def test_chunks_cover_every_record_once(df):
+    export = RecordRiskExport(EquivalenceClassIndex(df, QIDS), ids=df["Record ID"])
+    whole = pd.concat(export.chunks(), ignore_index=True)
+    for chunk_rows in (1, 7, 500, len(df), 10 * len(df)):
+        chunks = list(export.chunks(chunk_rows))
+        assert [len(chunk) for chunk in chunks[:-1]] == [chunk_rows] * (len(chunks) - 1)
+        pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), whole)
+
+
+def test_text_formats_split_at_chunks(df):
+    export = RecordRiskExport(EquivalenceClassIndex(df, QIDS), ids=df["Record ID"])
+    whole = pd.concat(export.chunks(), ignore_index=True)
+
+    lines = b"".join(export.stream("ndjson", chunk_rows=400)).decode().splitlines()
+    assert [json.loads(line)["row"] for line in lines] == list(range(len(df)))
+    assert [json.loads(line)["identifying_qids"] for line in lines] == whole["identifying_qids"].tolist()
+
+    text = b"".join(export.stream("csv", chunk_rows=400)).decode()
+    assert text.count("row,id,class_size") == 1
+    parsed = pd.read_csv(io.StringIO(text), keep_default_na=False)
+    assert parsed["row"].tolist() == list(range(len(df)))
+    assert parsed["identifying_qids"].tolist() == whole["identifying_qids"].map("|".join).tolist()
+
+    with pytest.raises(ValueError):
+        export.stream("xml")
+
+
+def test_weighted_rows_match_records(df):
+    distinct = df[QIDS].value_counts(dropna=False).reset_index(name="count")
+    weighted = RecordRiskExport(EquivalenceClassIndex(distinct, QIDS, weights=distinct["count"].to_numpy()))
+    records = RecordRiskExport(EquivalenceClassIndex(df, QIDS))
+    by_values = pd.concat(records.chunks(), ignore_index=True).join(df[QIDS])
+    expected = by_values.drop_duplicates(QIDS).set_index(QIDS)
+    actual = pd.concat(weighted.chunks(), ignore_index=True).join(distinct[QIDS]).set_index(QIDS)
+    actual = actual.loc[expected.index]
+    assert actual["class_size"].tolist() == expected["class_size"].tolist()
+    assert actual["identifying_qids"].tolist() == expected["identifying_qids"].tolist()
@@ -0,0 +1,104 @@
+import pytest
+
+from src.utils import result_cache
+from src.utils.result_cache import ResultCache
+from tests.helpers import small_dataset
+
+RESULT = {"k_anonymity": {"k": 3}, "QIDs": ["Age", "Zip Code"]}
+
+
+def test_key_covers_content_and_options():
+    key = ResultCache.key("abc", {"approximate": False, "population": None})
+    assert key == ResultCache.key("abc", {"population": None, "approximate": False})
+    assert key != ResultCache.key("abd", {"approximate": False, "population": None})
+    assert key != ResultCache.key("abc", {"approximate": True, "population": None})
+    assert key != ResultCache.key("abc", {"approximate": False, "population": {"upload": "def"}})
+
+
+def test_hits_misses_and_copies():
+    cache = ResultCache()
+    assert cache.get("a") is None
+    cache.put("a", RESULT)
+    result = cache.get("a")
+    assert result == RESULT
+    result["QIDs"].append("Gender")
+    assert cache.get("a") == RESULT
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", {"n": 1})
+    cache.put("b", {"n": 2})
+    cache.get("a")
+    cache.put("c", {"n": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"n": 1}
+    assert cache.get("c") == {"n": 3}
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, "time", lambda: now[0])
+    cache = ResultCache(ttl_seconds=60)
+    cache.put("a", RESULT)
+    now[0] += 59
+    assert cache.get("a") == RESULT
+    now[0] += 2
+    assert cache.get("a") is None
+
+
+def test_entries_survive_restarts(tmp_path):
+    cache = ResultCache(directory=str(tmp_path))
+    cache.put("a", RESULT)
+    assert ResultCache(directory=str(tmp_path)).get("a") == RESULT
+    cache.clear()
+    assert ResultCache(directory=str(tmp_path)).get("a") is None
+
+
+def test_disk_is_pruned_to_max_entries(tmp_path):
+    cache = ResultCache(max_entries=5, directory=str(tmp_path))
+    for i in range(5):
+        cache.put(str(i), {"n": i})
+    ResultCache(max_entries=2, directory=str(tmp_path))
+    assert len(list(tmp_path.glob("*.json"))) == 2
+
+
+def test_artifacts_are_kept_for_the_last_files():
+    cache = ResultCache(max_artifacts=2)
+    cache.artifacts("a")["encoded"] = "a"
+    cache.artifacts("b")
+    cache.artifacts("a")
+    cache.artifacts("c")
+    assert cache.artifacts("a") == {"encoded": "a"}
+    assert cache.artifacts("b") == {}
+
+
+@pytest.fixture(scope="module")
+def client():
+    from fastapi.testclient import TestClient
+    from src.main import RESULT_CACHE, app
+
+    RESULT_CACHE.clear()
+    with TestClient(app) as client:
+        yield client
+    RESULT_CACHE.clear()
+
+
+def test_resubmitted_upload_is_served_from_the_cache(client):
+    csv = small_dataset(rows=500).to_csv(index=False).encode()
+
+    def post(**params):
+        response = client.post("/calcul", params=dict(params, timing=True),
+                               files={"file": ("synthetic.csv", csv, "text/csv")})
+        response.raise_for_status()
+        result = response.json()
+        return result, result.pop("timing")["cached"]
+
+    first, cached = post()
+    assert not cached
+    second, cached = post()
+    assert cached
+    assert second == first
+    _, cached = post(approximate=True)
+    assert not cached
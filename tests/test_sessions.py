@@ -0,0 +1,147 @@
+import contextlib
+import io
+import pickle
+
+import numpy as np
+import pytest
+
+from src.utils import sessions
+from src.utils.ingest import encode_chunk
+from src.utils.pipeline import compute_privacy_metrics, evaluate_dataframe
+from src.utils.sessions import DatasetSession, SessionStore
+from tests.helpers import assert_same_result, small_dataset
+
+BATCHES = 4
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    """A dataset with missing QID and SA values, in the order its batches arrive."""
+    df = small_dataset(rows=2_400)
+    rng = np.random.default_rng(1)
+    df.loc[rng.choice(len(df), 40, replace=False), "Zip Code"] = None
+    df.loc[rng.choice(len(df), 40, replace=False), "Billing Amount"] = np.nan
+    return df
+
+
+def batches(df, parts=BATCHES):
+    """(rows so far, the batch as an upload parses it) for each batch."""
+    step = -(-len(df) // parts)
+    for end in range(step, len(df) + step, step):
+        yield df.iloc[:end], encode_chunk(df.iloc[end - step:end].copy())
+
+
+def append(session, batch):
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = session.append(batch)
+    return result, result.pop("session")
+
+
+def test_classes_follow_a_full_recompute(dataset):
+    # classified once: every later batch only updates the class state
+    session = DatasetSession("synthetic.csv", drift_threshold=10.0)
+    for seen, batch in batches(dataset):
+        result, info = append(session, batch)
+        expected = compute_privacy_metrics(seen, dict(session.attributes))
+        assert_same_result(expected, result)
+    assert info["reclassifications"] == 1
+    assert info["rows"] == len(dataset)
+
+
+def test_reclassified_session_matches_evaluate_dataframe(dataset):
+    session = DatasetSession("synthetic.csv", drift_threshold=0.0)
+    for seen, batch in batches(dataset):
+        result, info = append(session, batch)
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = evaluate_dataframe(seen.reset_index(drop=True), "synthetic.csv")
+        assert_same_result(expected, result)
+        assert info["reclassified"]
+
+
+def test_stored_session_continues_from_disk(dataset, tmp_path):
+    parts = list(batches(dataset))
+    kept = DatasetSession("synthetic.csv", drift_threshold=10.0)
+    store = SessionStore(directory=str(tmp_path))
+    stored = store.create("synthetic.csv", drift_threshold=10.0)
+    for i, (_, batch) in enumerate(parts):
+        if i == len(parts) // 2:
+            stored = SessionStore(directory=str(tmp_path)).get(stored.id)
+        expected, _ = append(kept, batch.copy())
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = store.append(stored, batch)
+        result.pop("session")
+        assert_same_result(expected, result)
+
+
+def test_batch_columns_must_match(dataset):
+    session = DatasetSession("synthetic.csv")
+    append(session, dataset.iloc[:100])
+    with pytest.raises(ValueError):
+        session.append(dataset.iloc[100:200, ::-1])
+
+
+def state(session):
+    """The count state of a session, comparable across copies."""
+    return {
+        "dictionaries": session.dictionaries,
+        "value_counts": {col: counts[:len(session.dictionaries[col])].tolist()
+                         for col, counts in session.value_counts.items()},
+        "missing": session.missing,
+        "records": session.records[:session.n_records].tolist(),
+        "weights": session.weights[:session.n_records].tolist(),
+        "fields": {name: getattr(session, name) for name in DatasetSession.REFRESHED if name != "result"},
+    }
+
+
+def test_appends_are_logged_and_replayed(dataset, tmp_path):
+    store = SessionStore(directory=str(tmp_path))
+    session = store.create("synthetic.csv", drift_threshold=0.02)
+    snapshots = []
+    for _, batch in batches(dataset, parts=12):
+        with contextlib.redirect_stdout(io.StringIO()):
+            store.append(session, batch)
+        snapshots.append(pickle.loads((tmp_path / f"{session.id}.session").read_bytes())["session"].batches)
+        loaded = SessionStore(directory=str(tmp_path)).get(session.id)
+        assert state(loaded) == state(session)
+        assert_same_result(session.result, loaded.result)
+    # the snapshot is only rewritten once the log has outgrown it
+    assert snapshots[0] == 1 and 1 < len(set(snapshots)) < len(snapshots)
+
+
+def test_append_cut_short_is_dropped(dataset, tmp_path):
+    store = SessionStore(directory=str(tmp_path))
+    session = store.create("synthetic.csv", drift_threshold=10.0)
+    kept = DatasetSession("synthetic.csv", drift_threshold=10.0)
+    parts = [batch for _, batch in batches(dataset)]
+    for batch in parts:
+        with contextlib.redirect_stdout(io.StringIO()):
+            store.append(session, batch)
+    for batch in parts[:-1]:
+        append(kept, batch.copy())
+    log = tmp_path / f"{session.id}.log"
+    log.write_bytes(log.read_bytes()[:-10])
+
+    loaded = SessionStore(directory=str(tmp_path)).get(session.id)
+    assert loaded.batches == len(parts) - 1
+    assert state(loaded)["records"] == state(kept)["records"]
+    assert not log.exists()
+    assert SessionStore(directory=str(tmp_path)).get(session.id).batches == len(parts) - 1
+
+
+def test_sessions_are_evicted_and_expire(dataset, tmp_path, monkeypatch):
+    memory = SessionStore(max_sessions=2)
+    ids = [memory.create("synthetic.csv").id for _ in range(3)]
+    assert memory.get(ids[0]) is None and memory.get(ids[2]) is not None
+
+    now = [1000.0]
+    monkeypatch.setattr(sessions.time, "time", lambda: now[0])
+    store = SessionStore(directory=str(tmp_path), max_sessions=1, ttl_seconds=60)
+    first, second = store.create("a.csv"), store.create("b.csv")
+    for session in (first, second):
+        with contextlib.redirect_stdout(io.StringIO()):
+            store.append(session, dataset.iloc[:50])
+    # dropped from memory, reloaded from disk
+    assert first.id not in store.sessions and store.get(first.id).n_rows == 50
+    now[0] += 61
+    assert store.get(second.id) is None
+    assert not list(tmp_path.glob(f"{second.id}.*"))
@@ -0,0 +1,107 @@
+import random
+
+import pandas as pd
+import pytest
+
+from src.utils.chunked import CountState, classify_state, class_columns, count_classes, count_columns, metrics_from_state
+from src.utils.pipeline import evaluate_dataframe
+from src.utils.sharded import evaluate_shards, merge_states
+from tests.helpers import assert_same_result, small_dataset
+
+SHARDS = 4
+CHUNK_ROWS = 150
+
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    """(full CSV, shard CSVs) of one dataset split into uneven shards."""
+    directory = tmp_path_factory.mktemp("shards")
+    df = small_dataset()
+    full = directory / "full.csv"
+    df.to_csv(full, index=False)
+    bounds = [0, 300, 900, 1000, len(df)]
+    shards = []
+    for i in range(SHARDS):
+        path = directory / f"part{i}.csv"
+        df.iloc[bounds[i]:bounds[i + 1]].to_csv(path, index=False)
+        shards.append(str(path))
+    return str(full), shards
+
+
+@pytest.fixture(scope="module")
+def expected(dataset):
+    full, _ = dataset
+    return evaluate_dataframe(pd.read_csv(full), "full.csv")
+
+
+def _sorted_counts(counts):
+    return counts.sort_index(key=lambda index: index.astype(str))
+
+
+def _sorted_table(table):
+    table = table.astype({col: str for col in table.columns if col != "__records__"})
+    return table.sort_values(list(table.columns)).reset_index(drop=True)
+
+
+def assert_same_state(left, right):
+    assert left.n_rows == right.n_rows
+    assert left.class_columns == right.class_columns
+    assert set(left.value_counts) == set(right.value_counts)
+    for col in left.value_counts:
+        pd.testing.assert_series_equal(_sorted_counts(left.value_counts[col]), _sorted_counts(right.value_counts[col]),
+                                       check_names=False)
+    pd.testing.assert_series_equal(_sorted_counts(left.row_counts), _sorted_counts(right.row_counts), check_names=False)
+    if left.class_counts is None or right.class_counts is None:
+        assert left.class_counts is None and right.class_counts is None
+    else:
+        pd.testing.assert_frame_equal(_sorted_table(left.class_counts), _sorted_table(right.class_counts))
+
+
+def _shard_states(shards, columns=None):
+    if columns is None:
+        return [count_columns(path, CHUNK_ROWS).to_bytes() for path in shards]
+    return [count_classes(path, columns, CHUNK_ROWS).to_bytes() for path in shards]
+
+
+def test_state_bytes_round_trip(dataset):
+    full, _ = dataset
+    state = count_columns(full, CHUNK_ROWS)
+    count_classes(full, list(pd.read_csv(full, nrows=0).columns[:3]), CHUNK_ROWS, state=state)
+    assert_same_state(state, CountState.from_bytes(state.to_bytes()))
+
+
+def test_from_bytes_rejects_other_formats():
+    with pytest.raises(ValueError):
+        CountState.from_bytes(b"\x80\x05}\x94(\x8c\x06format\x94K\x00u.")
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_shuffled_shard_merge_matches_evaluate_dataframe(dataset, expected, seed):
+    full, shards = dataset
+    order = random.Random(seed).sample(shards, len(shards))
+
+    state = merge_states(_shard_states(order))
+    assert_same_state(state, count_columns(full, CHUNK_ROWS))
+
+    classifier, attributes = classify_state(state, "full.csv")
+    columns = class_columns(classifier)
+    payloads = _shard_states(order, columns)
+    random.Random(seed + 100).shuffle(payloads)
+    state.merge(merge_states(payloads))
+
+    assert_same_result(expected, metrics_from_state(state, classifier, attributes))
+
+
+def test_evaluate_shards_matches_evaluate_dataframe(dataset, expected):
+    _, shards = dataset
+    result = evaluate_shards(shards[::-1], n_jobs=2, chunk_rows=CHUNK_ROWS, filename="full.csv")
+    assert_same_result(expected, result)
+
+
+def test_merge_rejects_different_class_columns(dataset):
+    _, shards = dataset
+    columns = list(pd.read_csv(shards[0], nrows=0).columns)
+    left = count_classes(shards[0], columns[:2], CHUNK_ROWS)
+    right = count_classes(shards[1], columns[1:3], CHUNK_ROWS)
+    with pytest.raises(ValueError):
+        left.merge(right)
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.column_profile import DatasetProfile
+from src.utils.sketches import ColumnSketch
+
+ROWS = 200_000
+STATISTICS = ("distinct", "entropy", "min_entropy", "max_entropy", "g_distinct_risk")
+
+
+@pytest.fixture(scope="module")
+def profiles():
+    """(approximate, exact) profiles of columns with more distinct values than the sketch tracks."""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "all_distinct": np.arange(ROWS),
+        "uniform": rng.integers(0, 5_000, ROWS),
+        "skewed": rng.zipf(1.3, ROWS) % 100_000,
+        "with_missing": np.where(rng.random(ROWS) < 0.2, np.nan, rng.integers(0, 20_000, ROWS)),
+    })
+    return DatasetProfile.from_frame(df, approximate=True), DatasetProfile.from_frame(df)
+
+
+@pytest.mark.parametrize("column", ["all_distinct", "uniform", "skewed", "with_missing"])
+@pytest.mark.parametrize("statistic", STATISTICS)
+def test_bounds_contain_exact_value(profiles, column, statistic):
+    approximate, exact = profiles
+    low, high = approximate[column].bounds[statistic]
+    value = getattr(exact[column], statistic)
+    assert low - 1e-9 <= value <= high + 1e-9
+    assert low - 1e-9 <= getattr(approximate[column], statistic) <= high + 1e-9
+
+
+def test_small_columns_are_exact():
+    series = pd.Series(np.arange(3_000) % 700, name="codes")
+    sketch = ColumnSketch.from_series(series, slice_rows=1_000)
+    assert sketch.exact
+    assert sketch.distinct() == (700, 700, 700)
+    estimate, low, high = sketch.min_entropy()
+    assert estimate == low == high == pytest.approx(np.log2(3_000 / 5))
+
+
+def test_sliced_and_merged_sketches_agree():
+    series = pd.Series(np.random.default_rng(1).zipf(1.5, 50_000) % 10_000, name="skewed")
+    whole = ColumnSketch.from_series(series, capacity=128)
+    parts = [ColumnSketch.from_series(series.iloc[i:i + 10_000], capacity=128) for i in range(0, len(series), 10_000)]
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+    counts = series.value_counts()
+    for sketch in (whole, merged):
+        assert sketch.heavy.error <= len(series) / 129
+        tracked = sketch.heavy.counts
+        assert (tracked <= counts[tracked.index]).all()
+        assert (counts[tracked.index] <= tracked + sketch.heavy.error).all()
+        assert (sketch.hll.registers == whole.hll.registers).all()